@@ -1,6 +1,8 @@
 from PyQt5.QtCore import QCoreApplication, QTimer
 
-from database.database import get_all_nodes, get_steps_table_size, fetch_data_from_database
+from database.database import get_all_nodes, fetch_steps_after, fetch_steps_before, iterate_batch_keys, \
+    are_steps_ordered, fetch_steps_by_position, get_animation_length, are_packets_interpolated, \
+    fetch_interpolated_steps_after, get_interpolated_step_key, read_snapshot
 from network_elements.elements import Node
 from step.step_enum import StepType
 from utils.calcUtils import calculate_direction
@@ -13,6 +15,15 @@ class AnimationApi:
         self.database_iteration_current = None
         self.database_iteration_len = None
         self.database_length = None
+        # Iteration index -> keys (time, step_id) of the first and the last step of fetched batches
+        self.database_batch_keys = {}
+        # Steps table is ordered by time (batches are fetched by step_id range), None when not checked yet
+        self.database_steps_ordered = None
+        # Packets are stored as one row and their substeps are interpolated, None when not checked yet
+        self.database_packets_interpolated = None
+        # Steps before this position are committed while the steps are still processed (progressive playback),
+        # None when all steps are processed
+        self.database_committed_length = None
         self.transmission_max_step = 11
         self.wireless_packet_max_step = 19
         self.wired_packet_max_step = 19
@@ -48,7 +59,9 @@ class AnimationApi:
         if self.data and self.data.content or self.use_database:
             if self.use_database:
                 nodes = get_all_nodes()
-                self.database_length = get_steps_table_size()
+                self.database_length = get_animation_length(self.packet_steps())
+                if self.database_committed_length is not None:
+                    self.database_length = min(self.database_length, self.database_committed_length)
                 if self.database_length != 0:
                     self.database_iteration_len = self.database_length // self.animation_batch_database
                     self.database_remaining_len = self.database_length % self.animation_batch_database
@@ -121,9 +134,96 @@ class AnimationApi:
 
     def fetch_data_from_database_if_necessary(self, iteration_index):
         if iteration_index != self.database_iteration_current or self.substeps is None:
-            self.substeps = fetch_data_from_database(iteration_index, self.animation_batch_database)
+            with read_snapshot():
+                self.substeps = self.fetch_database_batch(iteration_index)
             self.database_iteration_current = iteration_index
 
+    def fetch_database_batch(self, iteration_index):
+        """
+        Fetches the batch by step_id range when the steps table is ordered by time. Otherwise the batch is sought
+        from the keys of its neighbouring batches, so moving forward or backward costs the same for every batch,
+        and the order table is walked only when jumping to a batch far from the fetched ones (see seek_batch_keys).
+        """
+        batch_size = self.animation_batch_database
+        # order_steps renumbers the steps at the end of progressive processing, the version is read again in the
+        # snapshot of every batch until then and the keys of the fetched batches are dropped when it changes
+        if self.database_steps_ordered is None or (self.database_committed_length is not None
+                                                   and not self.database_steps_ordered):
+            self.database_steps_ordered = are_steps_ordered()
+            if self.database_steps_ordered:
+                self.database_batch_keys = {}
+        if self.database_steps_ordered:
+            steps, _, _ = fetch_steps_by_position(iteration_index * batch_size, batch_size)
+            return steps
+        if self.database_packets_interpolated is None:
+            self.database_packets_interpolated = are_packets_interpolated()
+        if self.database_packets_interpolated:
+            return self.fetch_interpolated_batch(iteration_index)
+
+        previous_keys = self.database_batch_keys.get(iteration_index - 1)
+        next_keys = self.database_batch_keys.get(iteration_index + 1)
+        if iteration_index == 0:
+            steps, first_key, last_key = fetch_steps_after(None, batch_size)
+        elif previous_keys is not None:
+            steps, first_key, last_key = fetch_steps_after(previous_keys[1], batch_size)
+        elif next_keys is not None:
+            steps, first_key, last_key = fetch_steps_before(next_keys[0], batch_size)
+        elif (previous_keys := self.seek_batch_keys(iteration_index - 1)) is not None:
+            steps, first_key, last_key = fetch_steps_after(previous_keys[1], batch_size)
+        else:
+            return []
+
+        if steps:
+            self.database_batch_keys[iteration_index] = (first_key, last_key)
+        return steps
+
+    def seek_batch_keys(self, iteration_index):
+        """
+        Returns keys of the batch at iteration_index, None when there are fewer batches. The order table is walked
+        from the last key of the nearest fetched batch before it and keys of the batches passed are kept, so
+        jumping back near them later does not walk again.
+        """
+        start_index = max((index for index in self.database_batch_keys if index < iteration_index), default=None)
+        key = None if start_index is None else self.database_batch_keys[start_index][1]
+        first_index = 0 if start_index is None else start_index + 1
+        for index, keys in enumerate(iterate_batch_keys(key, self.animation_batch_database), first_index):
+            self.database_batch_keys[index] = keys
+            if index == iteration_index:
+                return keys
+        return None
+
+    def fetch_interpolated_batch(self, iteration_index):
+        """
+        Substeps of interpolated packets are generated only forward, so the batch follows the last key
+        of the nearest fetched batch before it (or the start) and the steps between them are only counted.
+        """
+        batch_size = self.animation_batch_database
+        packet_steps = self.packet_steps()
+        if iteration_index - 1 in self.database_batch_keys:
+            key = self.database_batch_keys[iteration_index - 1][1]
+        elif iteration_index:
+            # Key of the last step of the previous batch
+            key = get_interpolated_step_key(iteration_index * batch_size, packet_steps)
+            if key is None:
+                return []
+        else:
+            key = None
+
+        steps, first_key, last_key = fetch_interpolated_steps_after(key, batch_size, packet_steps)
+        if steps:
+            self.database_batch_keys[iteration_index] = (first_key, last_key)
+        return steps
+
+    def packet_steps(self):
+        """Step type -> number of substeps of its packets."""
+        return {1: self.wired_packet_max_step + 1, 3: self.wireless_packet_max_step + 1}
+
+    def reset_database_batches(self):
+        self.database_batch_keys = {}
+        self.database_steps_ordered = None
+        self.database_packets_interpolated = None
+        self.database_iteration_current = None
+
     def update_control_callback(self, step):
         if self.control_update_callback:
             if self.use_database:
@@ -158,6 +258,9 @@ class AnimationApi:
         return steps_executed >= self.steps_per_event
 
     def check_and_handle_animation_end(self):
+        if self.database_committed_length is not None:
+            # Animation waits for the next committed steps
+            return
         if self.current_step == self.database_length:
             self.bottom_dock_widget.log("Animation finished (using database).")
         elif not self.use_database and self.current_step == len(self.substeps):
@@ -181,7 +284,7 @@ class AnimationApi:
 
     def handle_broadcast(self, step):
         broadcast_id = step.broadcast_id
-        x, y, z = float(step.loc_x), float(step.loc_y), float(step.loc_z)
+        x, y, z = step.loc_x, step.loc_y, step.loc_z
         normal = (1, 0, 0)
         direction = calculate_direction(normal)
         if step.step_number == 0:
@@ -200,7 +303,7 @@ class AnimationApi:
 
     def handle_packet_step(self, step):
         packet_id = step.packet_id
-        x, y, z = float(step.loc_x), float(step.loc_y), float(step.loc_z)
+        x, y, z = step.loc_x, step.loc_y, step.loc_z
         if step.step_number == 0:
             self.renderer_api.create_packet(x, y, z, packet_id=packet_id)
             if step.meta_info:
@@ -326,14 +429,28 @@ class AnimationApi:
 
     def update_steps_constants(self, wired_packet_max_step, wireless_packet_max_step, transmission_max_step,
                                use_database, animation_batch):
+        packet_steps = self.packet_steps()
         self.wired_packet_max_step = wired_packet_max_step - 1
         self.wireless_packet_max_step = wireless_packet_max_step - 1
         self.transmission_max_step = transmission_max_step - 1
         self.use_database = use_database
+        if animation_batch != self.animation_batch_database or packet_steps != self.packet_steps():
+            self.reset_database_batches()
         self.animation_batch_database = animation_batch
 
+        # Substeps of interpolated packets are generated with the new number of steps, nothing is processed again
+        if packet_steps != self.packet_steps() and self.use_database and self.database_length is not None \
+                and are_packets_interpolated():
+            self.database_length = get_animation_length(self.packet_steps())
+            self.database_iteration_len = self.database_length // self.animation_batch_database
+            self.database_remaining_len = self.database_length % self.animation_batch_database
+            if self.max_steps_callback:
+                self.max_steps_callback(self.database_length)
+
     def set_substeps(self, substeps):
         self.substeps = substeps
+        # Steps of another trace, batches are fetched again
+        self.reset_database_batches()
         if self.max_steps_callback:
             if self.use_database:
                 self.max_steps_callback(self.database_length)
@@ -354,3 +471,54 @@ class AnimationApi:
 
 
 
+
+    def extend_database_length(self, database_length):
+        """Called when steps of a followed file were appended to the database."""
+        if self.database_length is not None and database_length <= self.database_length:
+            return
+        self.database_length = database_length
+        self.database_iteration_len = self.database_length // self.animation_batch_database
+        self.database_remaining_len = self.database_length % self.animation_batch_database
+        # Appended steps can fall between already fetched ones, so the batch boundaries are not valid anymore
+        self.database_batch_keys = {}
+        self.database_steps_ordered = None
+        self.database_packets_interpolated = None
+
+        # Last fetched batch was not full, it has to be fetched again with the new steps
+        if self.substeps is not None and len(self.substeps) < self.animation_batch_database:
+            self.substeps = None
+        if self.max_steps_callback:
+            self.max_steps_callback(self.database_length)
+
+    def start_progressive(self):
+        """Called when steps processing starts, only committed steps are played until it ends."""
+        self.database_committed_length = 0
+        self.reset_database_batches()
+
+    def extend_committed_length(self, database_length):
+        """
+        Called when steps were committed up to a new watermark during progressive processing.
+
+        Steps before the previous length do not change anymore, so only the batch reaching past it is fetched again.
+        """
+        previous_length = self.database_committed_length or 0
+        if database_length <= previous_length:
+            return
+        self.database_committed_length = database_length
+        self.database_length = database_length
+        self.database_iteration_len = self.database_length // self.animation_batch_database
+        self.database_remaining_len = self.database_length % self.animation_batch_database
+        self.database_batch_keys = {index: keys for index, keys in self.database_batch_keys.items()
+                                    if (index + 1) * self.animation_batch_database <= previous_length}
+        if self.database_iteration_current is not None \
+                and (self.database_iteration_current + 1) * self.animation_batch_database > previous_length:
+            self.substeps = None
+        if self.max_steps_callback:
+            self.max_steps_callback(self.database_length)
+
+    def finish_progressive(self):
+        """Called when steps processing ended, all steps can be played."""
+        self.database_committed_length = None
+        self.database_length = get_animation_length(self.packet_steps())
+        self.database_iteration_len = self.database_length // self.animation_batch_database
+        self.database_remaining_len = self.database_length % self.animation_batch_database
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from database.database import set_page_size, create_step_tables
+
+"""
+Catalog of database files with processed steps, one file per trace and step settings.
+
+Entry is keyed by the trace identity (see ParseCache) and the settings of StepProcessor which change the steps,
+so switching back to a trace and settings already processed only opens its file. Files hold only the steps,
+the parsed elements are read from the file of the trace (see ParseCache) attached to them. Several traces stay
+ready side by side, least recently used files are removed when there are more than max_entries of them.
+"""
+
+catalog_dir = "trace_databases"
+index_file_name = "index.json"
+default_max_entries = 8
+
+
+def settings_key(settings):
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=8)
+    return digest.hexdigest()
+
+
+class DatabaseCatalog:
+    def __init__(self, directory=catalog_dir, max_entries=default_max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.index_path = os.path.join(directory, index_file_name)
+        self.entries = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(temporary_path, self.index_path)
+
+    @staticmethod
+    def entry_key(trace_key, settings):
+        return f"{trace_key}.{settings_key(settings)}"
+
+    def lookup(self, trace_key, settings):
+        """
+        Returns (database file, elements file) of the steps processed with the settings, None when there are none.
+        """
+        key = self.entry_key(trace_key, settings)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        # Elements of the trace could be removed from the parse cache meanwhile
+        if not os.path.exists(entry.get('elements', '')):
+            self.remove_entry(key)
+            self.save_index()
+            return None
+        if not os.path.exists(entry['file']):
+            self.entries.pop(key)
+            self.save_index()
+            return None
+        entry['last_used'] = time.time()
+        self.save_index()
+        return entry['file'], entry['elements']
+
+    def prepare(self, trace_key, settings):
+        """
+        Creates an empty database file for the steps of the settings and returns its path.
+        The file is added to the catalog by add when its steps are processed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        database_file = os.path.join(self.directory, self.entry_key(trace_key, settings) + '.db')
+        if os.path.exists(database_file):
+            os.remove(database_file)
+        conn = sqlite3.connect(database_file)
+        cursor = conn.cursor()
+        set_page_size(cursor)
+        create_step_tables(cursor)
+        conn.commit()
+        conn.close()
+        return database_file
+
+    def add(self, trace_key, settings, database_file, elements_file):
+        key = self.entry_key(trace_key, settings)
+        self.entries[key] = {'file': database_file, 'elements': elements_file, 'trace': trace_key,
+                             'settings': settings, 'last_used': time.time()}
+
+        # Remove least recently used files, the added one is in use
+        while len(self.entries) > self.max_entries:
+            self.remove_entry(min((entry_key for entry_key in self.entries if entry_key != key),
+                                  key=lambda entry_key: self.entries[entry_key]['last_used']))
+        self.save_index()
+
+    def invalidate(self, database_file):
+        """Forgets entries of database_file when its steps are changed outside the catalog, the file is kept."""
+        keys = [key for key, entry in self.entries.items()
+                if os.path.abspath(entry['file']) == os.path.abspath(database_file)]
+        for key in keys:
+            self.entries.pop(key)
+        if keys:
+            self.save_index()
+
+    def remove_entry(self, key):
+        entry = self.entries.pop(key)
+        if os.path.exists(entry['file']):
+            os.remove(entry['file'])
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+
+"""
+Long-lived database connections, one per thread.
+
+Opening a connection reads the schema again and starts with an empty page cache, so the functions
+called for every fetched batch reuse the connection of their thread instead. Read connections are
+opened read-only with memory mapped io and a bigger page cache. Connections are kept in thread-local
+storage, a thread closes its own when its run ends, so a new thread never gets the connection of a
+finished one. All connections are closed when the application quits or another trace is opened.
+
+Processed steps of a trace can be kept in another file than its parsed elements (see DatabaseCatalog), the
+file of the elements is then attached to every connection as schema elements.
+"""
+
+# Bytes of the database file mapped to memory by read connections
+mmap_size = 256 * 1024 * 1024
+# Page cache of read connections, negative value is in KiB
+cache_size = -64 * 1024
+
+
+class ConnectionManager:
+    def __init__(self, path, elements_path=None):
+        self.path = path
+        self.elements_path = elements_path
+        # read only -> connection of the current thread, every thread sees only its own connections
+        self.local = threading.local()
+        # Connections of all threads, they are closed together when the database is replaced
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def get_connection(self, read_only=False):
+        thread_connections = self.thread_connections()
+        conn = thread_connections.get(read_only)
+        if conn is None:
+            conn = self.open_connection(read_only)
+            thread_connections[read_only] = conn
+            with self.lock:
+                self.connections.add(conn)
+        return conn
+
+    def thread_connections(self):
+        thread_connections = getattr(self.local, 'connections', None)
+        if thread_connections is None:
+            thread_connections = self.local.connections = {}
+        return thread_connections
+
+    def open_connection(self, read_only):
+        if not read_only:
+            # Connection is used only by its thread, it is closed from the main thread
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.elements_path is not None:
+                conn.execute("ATTACH DATABASE ? AS elements", (self.elements_path,))
+            return conn
+
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        if self.elements_path is not None:
+            conn.execute("ATTACH DATABASE ? AS elements", (f"file:{self.elements_path}?mode=ro",))
+        # mmap_size without schema name applies to the attached elements as well
+        conn.execute(f"PRAGMA mmap_size = {mmap_size}")
+        conn.execute(f"PRAGMA cache_size = {cache_size}")
+        return conn
+
+    def close_thread(self):
+        """Closes connections of the current thread, called when the thread finishes its work."""
+        thread_connections = self.thread_connections()
+        with self.lock:
+            self.connections.difference_update(thread_connections.values())
+        for conn in thread_connections.values():
+            conn.close()
+        thread_connections.clear()
+
+    def close_all(self):
+        """
+        Closes connections of all threads, next call of get_connection opens a new one. Used only on shutdown and
+        when the main thread switches to another database, other threads must not be using theirs.
+        """
+        with self.lock:
+            connections = list(self.connections)
+            self.connections.clear()
+            # Closed connections are forgotten by all threads
+            self.local = threading.local()
+        for conn in connections:
+            conn.close()
@@ -1,17 +1,129 @@
+import heapq
+import math
+import os
 import sqlite3
 import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
 
+import numpy as np
+
+from database.connection import ConnectionManager
+from database.step_decoder import step_row_factories, step_from_row
 from network_elements.elements import (
     Address, Anim, Ip, IpV6, Link, Ncs, Node, NonP2pLinkProperties,
     NodeUpdate, WiredPacket, Broadcaster, Resource, WirelessPacketReception
 )
+from step.interpolation import packet_substep, substep_time
 from step.step import WiredPacketStep, NodeUpdateStep, WirelessPacketReceptionStep
-from step.step_enum import NodeUpdateType
 
-db_path = "elements.db"
+# Parsers write to the working database, processed steps of a trace are kept in its file of DatabaseCatalog
+# with the file of its elements attached
+working_db_path = "elements.db"
+db_path = working_db_path
+elements_db_path = None
+connections = ConnectionManager(db_path)
+
+
+def get_read_connection():
+    """Returns the read-only connection of the current thread."""
+    return connections.get_connection(read_only=True)
+
+
+def get_write_connection():
+    """Returns the connection of the current thread used for writes."""
+    return connections.get_connection()
 
 
-def create_tables(cursor, conn):
+def close_connections():
+    """Closes connections of all threads, called on shutdown and before another trace is opened."""
+    connections.close_all()
+    leave_wal_journal()
+
+
+def close_thread_connections():
+    """Closes connections of the current thread, called at the end of run of every thread using the database."""
+    connections.close_thread()
+
+
+def set_database_path(path, elements_path=None):
+    """
+    Closes connections to the current database file, functions of this module use the file at path afterwards.
+    Elements are read from elements_path when they are kept in another file than the steps.
+    """
+    global db_path, elements_db_path, connections
+    close_connections()
+    db_path = path
+    elements_db_path = elements_path
+    connections = ConnectionManager(path, elements_path)
+
+
+def get_database_path():
+    return db_path
+
+
+def get_elements_path():
+    """Returns the file of the parsed elements, it is the database file unless the steps are kept apart."""
+    return elements_db_path or db_path
+
+
+def set_worker_database_path(path):
+    """
+    Same as set_database_path in a worker process. Journal mode of the database belongs to the process
+    which opened it, it is not changed here.
+    """
+    global db_path, elements_db_path, connections
+    connections.close_all()
+    db_path = path
+    elements_db_path = None
+    connections = ConnectionManager(path)
+
+
+def use_wal_journal():
+    """Readers of the database in WAL mode are not blocked by writes, so steps can be played while processed."""
+    cursor = get_write_connection().cursor()
+    # Attached elements are only read, they keep their journal
+    cursor.execute("PRAGMA main.journal_mode = WAL")
+    cursor.close()
+
+
+def leave_wal_journal():
+    """
+    Moves the content of the WAL back to the database file, so the file can be copied (parse cache) and written
+    by the parsers with their own journal. Journal mode can be changed only when no other connection is open.
+    """
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+
+def set_bulk_write_pragmas(cursor):
+    cursor.execute("PRAGMA synchronous = OFF")
+    # Database in WAL mode is read while it is written, it keeps its journal
+    cursor.execute("PRAGMA main.journal_mode")
+    if cursor.fetchone()[0] != 'wal':
+        cursor.execute("PRAGMA main.journal_mode = MEMORY")
+
+
+@contextmanager
+def read_snapshot():
+    """Statements of the block in the current thread read one snapshot even when the steps are written meanwhile."""
+    conn = get_read_connection()
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.commit()
+
+
+def create_tables(cursor, conn, indexes=True):
+    """Creates the schema, the event indexes are left to finish_bulk_load when indexes is False."""
     create_anim_table = '''
     CREATE TABLE IF NOT EXISTS anim (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -76,7 +188,9 @@ def create_tables(cursor, conn):
     create_address_table = '''
     CREATE TABLE IF NOT EXISTS address (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ip_address TEXT
+        ip_address TEXT,
+        ip_id INTEGER REFERENCES ip (id),
+        ipv6_id INTEGER REFERENCES ipv6 (id)
     )
     '''
 
@@ -84,8 +198,8 @@ def create_tables(cursor, conn):
     CREATE TABLE IF NOT EXISTS ncs (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nc_id INTEGER REFERENCES node (id),
-        n INTEGER,
-        t FLOAT
+        n TEXT,
+        t TEXT
     )
     '''
 
@@ -142,37 +256,6 @@ def create_tables(cursor, conn):
         ld TEXT
     )
     '''
-    create_steps_table = '''
-      CREATE TABLE IF NOT EXISTS steps (
-          step_id INTEGER PRIMARY KEY,
-          step_type INTEGER REFERENCES step_types (id),
-          time FLOAT,
-          packet_id INTEGER,
-          from_id INTEGER REFERENCES node (id),
-          to_id INTEGER REFERENCES node (id),
-          first_byte_transmission_time FLOAT,
-          first_byte_received_time FLOAT,
-          meta_info TEXT,
-          step_number INTEGER,
-          loc_x FLOAT,
-          loc_y FLOAT,
-          loc_z FLOAT,
-          src_loc_x REAL,
-          src_loc_y REAL,
-          src_loc_z REAL,
-          target_loc_x REAL,
-          target_loc_y REAL,
-          target_loc_z REAL,
-          update_type TEXT,
-          node_id INTEGER REFERENCES node (id),
-          description TEXT,
-          red FLOAT,
-          green FLOAT,
-          blue FLOAT,
-          width FLOAT,
-          height FLOAT
-      )
-      '''
     create_step_types_query = '''
         CREATE TABLE IF NOT EXISTS step_types (
             id INTEGER PRIMARY KEY,
@@ -193,104 +276,183 @@ def create_tables(cursor, conn):
     cursor.execute(create_broadcaster_table)
     cursor.execute(create_resource_table)
     cursor.execute(create_link_table)
-    cursor.execute(create_steps_table)
+    create_step_tables(cursor)
     cursor.execute(create_step_types_query)
     insert_initial_step_types(conn, cursor)
-    create_indexes(cursor)
+    if indexes:
+        create_indexes(cursor)
+    else:
+        create_steps_index(cursor)
+
+
+def tables_exist(cursor):
+    # step_types is created last by create_tables, it is in the attached elements of processed steps
+    cursor.execute("SELECT 1 FROM pragma_table_list WHERE type = 'table' AND name = 'step_types'")
+    return cursor.fetchone() is not None
 
 
 def save_to_database(batch):
-    # Connect to the SQLite database
-    conn = sqlite3.connect("elements.db")
+    # Connection of this thread to the SQLite database
+    conn = get_write_connection()
 
     # Create a cursor object to interact with the database
     cursor = conn.cursor()
 
-    set_page_size(cursor)
+    # Create tables once, not for every batch of follow mode
+    if not tables_exist(cursor):
+        set_page_size(cursor)
+        create_tables(cursor, conn)
 
-    # Create tables in the database if they don't exist
-    create_tables(cursor, conn)
+    # Save the elements of the batch grouped by their table
+    insert_elements(cursor, batch)
 
-    # Iterate through the batch and save the elements to the database
-    for item in batch:
-        # Save the element to the appropriate table based on its class
-        if isinstance(item, Anim):
-            cursor.execute("INSERT INTO anim (ver, file_type) VALUES (?, ?)", (item.ver, item.file_type))
-
-        elif isinstance(item, Node):
-            cursor.execute("INSERT INTO node (id, sys_id, loc_x, loc_y, loc_z) VALUES (?, ?, ?, ?, ?)",
-                           (item.id, item.sys_id, item.loc_x, item.loc_y, item.loc_z))
-
-        elif isinstance(item, NodeUpdate):
-            cursor.execute(
-                "INSERT INTO node_update (p, t, id, color_r, color_g, color_b, width, height, coord_x, coord_y, "
-                "coord_z, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (item.p, item.time, item.id, item.r, item.g, item.b, item.w, item.h,
-                 item.x, item.y, item.z, item.descr))
-
-        elif isinstance(item, NonP2pLinkProperties):
-            cursor.execute("INSERT INTO nonp2plinkproperties (id, ip_address, channel_type) VALUES (?, ?, ?)",
-                           (item.id, item.ip_address, item.channel_type))
-
-        elif isinstance(item, Ip):
-            cursor.execute("INSERT INTO ip (n) VALUES (?)", (item.n,))
-            for address in item.addresses:
-                cursor.execute("INSERT INTO address (ip_address) VALUES (?)", (address.address,))
-
-        elif isinstance(item, IpV6):
-            cursor.execute("INSERT INTO ipv6 (n) VALUES (?)", (item.n,))
-            for address in item.addresses:
-                cursor.execute("INSERT INTO address (ip_address) VALUES (?)", (address.address,))
-
-        elif isinstance(item, Address):
-            cursor.execute("INSERT INTO address (ip_address) VALUES (?)", (item.address,))
-
-        elif isinstance(item, Ncs):
-            cursor.execute("INSERT INTO ncs (nc_id, n, t) VALUES (?, ?, ?)", (item.nc_id, item.n, item.t))
-
-        elif isinstance(item, WiredPacket):
-            cursor.execute(
-                "INSERT INTO wired_packet (from_id, fb_tx, lb_tx, meta_info, to_id, fb_rx, lb_rx) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (item.from_id, item.first_byte_transmission_time, item.last_byte_transmission_time, item.meta_info,
-                 item.to_id, item.first_byte_received_time, item.last_byte_received_time))
-
-        elif isinstance(item, WirelessPacketReception):
-            cursor.execute("INSERT INTO wireless_packet_reception (u_id, t_id, fb_rx, lb_rx) VALUES (?, ?, ?, ?)",
-                           (
-                               item.unique_id, item.to_id, item.first_byte_received_time, item.last_byte_received_time))
-
-        elif isinstance(item, Broadcaster):
-            cursor.execute("INSERT INTO broadcaster (u_id, f_id, fb_tx, meta_info) VALUES (?, ?, ?, ?)",
-                           (item.unique_id, item.from_id, item.first_byte_transmission_time, item.meta_info))
-
-        elif isinstance(item, Resource):
-            cursor.execute("INSERT INTO resource (rid, p) VALUES (?, ?)", (item.rid, item.p))
-
-        elif isinstance(item, Link):
-            cursor.execute("INSERT INTO link (from_id, to_id, fd, td, ld) VALUES (?, ?, ?, ?, ?)",
-                           (item.from_id, item.to_id, item.fd, item.td, item.ld))
-        elif isinstance(item, (WiredPacketStep, NodeUpdateStep, WirelessPacketReceptionStep)):
-            cursor.execute(
-                "INSERT INTO steps (step_type, time, packet_id, from_id, to_id, first_byte_transmission_time, "
-                "first_byte_received_time, meta_info, step_number, loc_x, loc_y, loc_z, src_loc_x, src_loc_y, "
-                "src_loc_z, target_loc_x, target_loc_y, target_loc_z, update_type, node_id, description, red, green, "
-                "blue, width, height) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
-                "?, ?)",
-                (item.type.value, item.time, getattr(item, 'packet_id', None), getattr(item, 'from_id', None),
-                 getattr(item, 'to_id', None), getattr(item, 'first_byte_transmission_time', None),
-                 getattr(item, 'first_byte_received_time', None), getattr(item, 'meta_info', None),
-                 getattr(item, 'step_number', None), getattr(item, 'loc_x', None), getattr(item, 'loc_y', None),
-                 getattr(item, 'loc_z', None), getattr(item, 'src_loc_x', None), getattr(item, 'src_loc_y', None),
-                 getattr(item, 'src_loc_z', None), getattr(item, 'target_loc_x', None),
-                 getattr(item, 'target_loc_y', None),
-                 getattr(item, 'target_loc_z', None), getattr(item, 'update_type', None),
-                 getattr(item, 'node_id', None),
-                 getattr(item, 'description', None), getattr(item, 'red', None), getattr(item, 'green', None),
-                 getattr(item, 'blue', None), getattr(item, 'width', None), getattr(item, 'height', None)))
-
-    # Commit the changes and close the connection
+    # Commit the changes, connection stays open for the next batch
     conn.commit()
-    conn.close()
+    cursor.close()
+
+
+# Element class -> (query, row of the element) for elements stored in one table row
+element_insert_queries = {
+    Anim: ("INSERT INTO anim (ver, file_type) VALUES (?, ?)",
+           lambda item: (item.ver, item.file_type)),
+    Node: ("INSERT INTO node (id, sys_id, loc_x, loc_y, loc_z) VALUES (?, ?, ?, ?, ?)",
+           lambda item: (item.id, item.sys_id, item.loc_x, item.loc_y, item.loc_z)),
+    NodeUpdate: ("INSERT INTO node_update (p, t, id, color_r, color_g, color_b, width, height, coord_x, coord_y, "
+                 "coord_z, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 lambda item: (item.p, item.time, item.id, item.r, item.g, item.b, item.w, item.h,
+                               item.x, item.y, item.z, item.descr)),
+    NonP2pLinkProperties: ("INSERT INTO nonp2plinkproperties (id, ip_address, channel_type) VALUES (?, ?, ?)",
+                           lambda item: (item.id, item.ip_address, item.channel_type)),
+    Address: ("INSERT INTO address (ip_address) VALUES (?)",
+              lambda item: (item.address,)),
+    Ncs: ("INSERT INTO ncs (nc_id, n, t) VALUES (?, ?, ?)",
+          lambda item: (item.nc_id, item.n, item.t)),
+    WiredPacket: ("INSERT INTO wired_packet (from_id, fb_tx, lb_tx, meta_info, to_id, fb_rx, lb_rx) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  lambda item: (item.from_id, item.first_byte_transmission_time, item.last_byte_transmission_time,
+                                item.meta_info, item.to_id, item.first_byte_received_time,
+                                item.last_byte_received_time)),
+    Broadcaster: ("INSERT INTO broadcaster (u_id, f_id, fb_tx, meta_info) VALUES (?, ?, ?, ?)",
+                  lambda item: (item.unique_id, item.from_id, item.first_byte_transmission_time, item.meta_info)),
+    Resource: ("INSERT INTO resource (rid, p) VALUES (?, ?)",
+               lambda item: (item.rid, item.p)),
+    Link: ("INSERT INTO link (from_id, to_id, fd, td, ld) VALUES (?, ?, ?, ?, ?)",
+           lambda item: (item.from_id, item.to_id, item.fd, item.td, item.ld)),
+}
+
+# Elements with nested addresses -> (table, column of address referencing it)
+address_parents = {
+    Ip: ('ip', 'ip_id'),
+    IpV6: ('ipv6', 'ipv6_id'),
+}
+
+
+def insert_address_parents(cursor, items, table, parent_column):
+    """
+    Inserts ip / ipv6 elements with their addresses, every address row references its parent.
+
+    Ids of the parents are assigned here, so the addresses can be inserted by one executemany as well.
+    """
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    first_id = cursor.fetchone()[0] + 1
+    cursor.executemany(f"INSERT INTO {table} (id, n) VALUES (?, ?)",
+                       [(parent_id, item.n) for parent_id, item in enumerate(items, first_id)])
+    cursor.executemany(f"INSERT INTO address (ip_address, {parent_column}) VALUES (?, ?)",
+                       [(address.address, parent_id)
+                        for parent_id, item in enumerate(items, first_id) for address in item.addresses])
+
+
+# Broadcasts kept for the join of their receptions, <wpr> elements follow their <pr> closely in the trace
+broadcast_join_size = 4096
+
+
+class BroadcastJoin:
+    """
+    Completes receptions with fb_tx, f_id and meta_info of their broadcast while they are inserted, so the
+    reception rows are written once instead of updated from the broadcaster table after the load.
+
+    NetAnim writes <pr> before its <wpr> receptions. Broadcasts are kept in transmission order and the oldest
+    ones are evicted when there are more than max_size of them, their receptions are done by then. Reception
+    of an evicted broadcast is completed from the broadcaster table.
+    """
+
+    def __init__(self, max_size=broadcast_join_size):
+        self.max_size = max_size
+        # u_id -> (fb_tx, f_id, meta_info)
+        self.broadcasts = OrderedDict()
+
+    def add(self, broadcasts):
+        for broadcast in broadcasts:
+            self.broadcasts[broadcast.unique_id] = (broadcast.first_byte_transmission_time, broadcast.from_id,
+                                                    broadcast.meta_info)
+        while len(self.broadcasts) > self.max_size:
+            self.broadcasts.popitem(last=False)
+
+    def find(self, cursor, unique_id):
+        """Returns (fb_tx, f_id, meta_info) of the broadcast, None when it is not known."""
+        broadcast = self.broadcasts.get(unique_id)
+        if broadcast is None:
+            cursor.execute("SELECT fb_tx, f_id, meta_info FROM broadcaster WHERE u_id = ?", (unique_id,))
+            broadcast = cursor.fetchone()
+        return broadcast
+
+    def reception_row(self, cursor, item):
+        broadcast = self.find(cursor, item.unique_id) or (None, None, None)
+        return (item.unique_id, item.to_id, item.first_byte_received_time, item.last_byte_received_time,
+                *broadcast)
+
+
+def complete_reception(item, broadcasts):
+    """
+    Sets fb_tx, f_id and meta_info of a reception from its broadcast (see BroadcastJoin),
+    returns False when the broadcast is not known.
+    """
+    cursor = get_read_connection().cursor()
+    broadcast = broadcasts.find(cursor, item.unique_id)
+    cursor.close()
+    if broadcast is None:
+        return False
+    item.first_byte_transmission_time, item.from_id, item.meta_info = broadcast
+    return True
+
+
+def insert_receptions(cursor, items, broadcasts):
+    rows = [broadcasts.reception_row(cursor, item) for item in items]
+    cursor.executemany("INSERT INTO wireless_packet_reception (u_id, t_id, fb_rx, lb_rx, fb_tx, f_id, meta_info) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def insert_elements(cursor, batch, broadcasts=None):
+    """
+    Inserts the batch grouped by element type with one executemany per table.
+
+    Receptions are joined with the broadcasts of this and earlier batches, broadcasts is kept by the caller
+    between the batches of one load.
+    """
+    if broadcasts is None:
+        broadcasts = BroadcastJoin()
+    grouped = {}
+    for item in batch:
+        grouped.setdefault(type(item), []).append(item)
+
+    # Broadcasts of the batch are inserted before the receptions joined with them
+    if Broadcaster in grouped:
+        grouped = {Broadcaster: grouped.pop(Broadcaster), **grouped}
+        broadcasts.add(grouped[Broadcaster])
+
+    for element_class, items in grouped.items():
+        if element_class is WirelessPacketReception:
+            insert_receptions(cursor, items, broadcasts)
+            continue
+        if element_class in address_parents:
+            insert_address_parents(cursor, items, *address_parents[element_class])
+            continue
+        insert_query = element_insert_queries.get(element_class)
+        if insert_query is None:
+            print(f'Element can not be saved to database : {element_class.__name__}')
+            continue
+        query, row = insert_query
+        cursor.executemany(query, map(row, items))
 
 
 def process_batch(batch):
@@ -298,8 +460,8 @@ def process_batch(batch):
 
 
 def remove_database():
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_path)
+    # Connection of this thread to the SQLite database
+    conn = get_write_connection()
 
     # Create a cursor object to interact with the database
     cursor = conn.cursor()
@@ -308,6 +470,8 @@ def remove_database():
 
 
 def clear_database(cursor):
+    # Page size is applied only before the first write to a new file, user_version below is one
+    set_page_size(cursor)
     drop_tables = [
         "DROP TABLE IF EXISTS anim",
         "DROP TABLE IF EXISTS node",
@@ -322,79 +486,191 @@ def clear_database(cursor):
         "DROP TABLE IF EXISTS broadcaster",
         "DROP TABLE IF EXISTS resource",
         "DROP TABLE IF EXISTS link",
-        "DROP TABLE IF EXISTS steps",
         "DROP TABLE IF EXISTS step_types",
     ]
 
     for drop_table_query in drop_tables:
         cursor.execute(drop_table_query)
-
-
-def clear_steps():
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    start = time.perf_counter()
-    # Drop the steps table
-    cursor.execute("DROP TABLE IF EXISTS steps")
-
-    # Create the steps table
-    create_steps_table = '''
-        CREATE TABLE IF NOT EXISTS steps (
+    drop_step_tables(cursor)
+    set_steps_version(cursor, 0)
+
+
+# Steps are stored in one narrow table per step type with their columns besides step_id and time.
+# Table steps holds only the type and time of all steps and gives their global order, step_id of a step is the
+# same in both tables. Substeps of one packet share the packet columns, they are stored once in step_packets.
+# With interpolated packets (see insert_packet_rows) the substeps are not stored at all, step_packets keeps
+# the endpoints of every packet and its substeps are computed when they are fetched.
+packet_step_columns = (('packet_ref', 'INTEGER REFERENCES step_packets (packet_ref)'), ('step_number', 'INTEGER'),
+                       ('loc_x', 'REAL'), ('loc_y', 'REAL'), ('loc_z', 'REAL'))
+step_tables = {
+    1: ('wired_packet_steps', WiredPacketStep, packet_step_columns),
+    2: ('node_update_steps', NodeUpdateStep,
+        (('update_type', 'TEXT'), ('node_id', 'INTEGER'), ('description', 'TEXT'), ('red', 'REAL'),
+         ('green', 'REAL'), ('blue', 'REAL'), ('width', 'REAL'), ('height', 'REAL'), ('loc_x', 'REAL'),
+         ('loc_y', 'REAL'), ('loc_z', 'REAL'))),
+    3: ('wireless_packet_reception_steps', WirelessPacketReceptionStep, packet_step_columns),
+}
+
+# Step type -> source of the step rows and their columns after time in the order of the step constructor
+step_selects = {
+    1: ('wired_packet_steps JOIN step_packets USING (packet_ref)',
+        'packet_id, from_id, to_id, first_byte_transmission_time, first_byte_received_time, meta_info, '
+        'step_number, loc_x, loc_y, loc_z'),
+    2: ('node_update_steps',
+        'update_type, node_id, description, red, green, blue, width, height, loc_x, loc_y, loc_z'),
+    3: ('wireless_packet_reception_steps JOIN step_packets USING (packet_ref)',
+        'packet_id, from_id, to_id, first_byte_transmission_time, first_byte_received_time, step_number, '
+        'loc_x, loc_y, loc_z, meta_info'),
+}
+
+def step_column_names(step_type):
+    return ', '.join(name for name, _ in step_tables[step_type][2])
+
+
+def create_step_tables(cursor, suffix=''):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS steps{suffix} (
             step_id INTEGER PRIMARY KEY,
             step_type INTEGER,
-            time REAL,
-            packet_id INTEGER,
+            time REAL
+        )
+        ''')
+    for table, _, columns in step_tables.values():
+        column_definitions = ', '.join(f'{name} {column_type}' for name, column_type in columns)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}{suffix} "
+                       f"(step_id INTEGER PRIMARY KEY, time REAL, {column_definitions})")
+    # Packets are not rewritten when the steps are ordered, so they do not get the suffix
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS step_packets (
+            packet_ref INTEGER PRIMARY KEY,
+            packet_id TEXT,
             from_id INTEGER,
             to_id INTEGER,
             first_byte_transmission_time REAL,
             first_byte_received_time REAL,
             meta_info TEXT,
-            step_number INTEGER,
-            loc_x REAL,
-            loc_y REAL,
-            loc_z REAL,
-            src_loc_x REAL,
-            src_loc_y REAL,
-            src_loc_z REAL,
-            target_loc_x REAL,
-            target_loc_y REAL,
-            target_loc_z REAL,
-            update_type TEXT,
-            node_id INTEGER,
-            description TEXT,
-            red REAL,
-            green REAL,
-            blue REAL,
-            width REAL,
-            height REAL
+            step_type INTEGER,
+            src_x REAL,
+            src_y REAL,
+            src_z REAL,
+            dst_x REAL,
+            dst_y REAL,
+            dst_z REAL
         )
-        '''
-    cursor.execute(create_steps_table)
+        ''')
+
+
+def drop_step_tables(cursor):
+    # Steps of the attached elements are not dropped when the main file has none
+    cursor.execute("DROP TABLE IF EXISTS main.steps")
+    for table, _, _ in step_tables.values():
+        cursor.execute(f"DROP TABLE IF EXISTS main.{table}")
+    cursor.execute("DROP TABLE IF EXISTS main.step_packets")
+
+
+def clear_steps(interpolated_packets=False):
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    # Drop the steps tables
+    drop_step_tables(cursor)
+
+    # Create the steps tables
+    create_step_tables(cursor)
+    create_steps_index(cursor)
+    if interpolated_packets:
+        create_packet_rows_index(cursor)
+    set_steps_version(cursor, packet_rows_version if interpolated_packets else 0)
+    conn.commit()
+    cursor.close()
+
+
+# Values of user_version of the database describing the steps tables, 0 when steps are in insertion order
+# step_id of the steps follows their time order
+steps_ordered_version = 1
+# Packets are stored as one row in step_packets, their substeps are interpolated when fetched
+packet_rows_version = 2
+
+
+def set_steps_version(cursor, version):
+    cursor.execute(f"PRAGMA user_version = {version}")
+
+
+def get_steps_version(cursor):
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def set_steps_ordered(cursor, ordered):
+    # Only node updates are in the order table of interpolated packets, it is always read by time
+    if get_steps_version(cursor) != packet_rows_version:
+        set_steps_version(cursor, steps_ordered_version if ordered else 0)
+
+
+def are_steps_ordered():
+    cursor = get_read_connection().cursor()
+    ordered = get_steps_version(cursor) == steps_ordered_version
+    cursor.close()
+    return ordered
+
+
+def are_packets_interpolated():
+    cursor = get_read_connection().cursor()
+    interpolated = get_steps_version(cursor) == packet_rows_version
+    cursor.close()
+    return interpolated
+
+
+def order_steps():
+    """
+    Rewrites the steps tables in time order, so step_id - 1 is the position of the step in the animation.
+
+    Steps are generated per type and inserted in batches, this is done once when all of them are generated.
+    Afterwards batches of the animation are fetched by step_id range (see fetch_steps_by_position).
+    """
+    conn = get_write_connection()
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS temp.step_order")
+    cursor.execute("CREATE TEMP TABLE step_order (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+    cursor.execute("INSERT INTO step_order SELECT step_id, ROW_NUMBER() OVER (ORDER BY time, step_id) FROM steps")
+
+    tables = [('steps', 'step_type')] + [(table, step_column_names(step_type))
+                                         for step_type, (table, _, _) in step_tables.items()]
+    for table, _ in tables:
+        cursor.execute(f"DROP TABLE IF EXISTS main.{table}_ordered")
+    create_step_tables(cursor, '_ordered')
+    for table, columns in tables:
+        cursor.execute(f"INSERT INTO {table}_ordered (step_id, time, {columns}) "
+                       f"SELECT step_order.new_id, time, {columns} FROM {table} "
+                       f"JOIN step_order ON step_order.old_id = {table}.step_id ORDER BY step_order.new_id")
+    for table, _ in tables:
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_ordered RENAME TO {table}")
+    cursor.execute("DROP TABLE temp.step_order")
+
+    create_steps_index(cursor)
+    set_steps_ordered(cursor, True)
     conn.commit()
-    end = time.perf_counter()
-    print(f"Elapsed time: {end - start}")
     cursor.close()
-    conn.close()
 
 
 def update_wireless_packet_reception_fb_tx():
-    conn = sqlite3.connect(db_path)
+    """
+    Completes receptions which were not joined while they were inserted, a reception written before its
+    broadcast or a database ingested before the join. Complete rows are only read.
+    """
+    conn = get_write_connection()
     cursor = conn.cursor()
-    start = time.perf_counter()
     update_query = '''
         UPDATE wireless_packet_reception
         SET fb_tx = broadcaster.fb_tx,
             f_id = broadcaster.f_id,
             meta_info = broadcaster.meta_info
         FROM broadcaster
-        WHERE wireless_packet_reception.u_id = broadcaster.u_id
+        WHERE wireless_packet_reception.fb_tx IS NULL AND wireless_packet_reception.u_id = broadcaster.u_id
     '''
     cursor.execute(update_query)
     conn.commit()
-    end = time.perf_counter()
-    print(f"Elapsed time: {end - start}")
     cursor.close()
-    conn.close()
 
 
 def insert_initial_step_types(conn, cursor):
@@ -409,24 +685,29 @@ def insert_initial_step_types(conn, cursor):
 
 
 def insert_node_updates_to_steps():
-    conn = sqlite3.connect(db_path)
+    conn = get_write_connection()
     cursor = conn.cursor()
     try:
         start = time.perf_counter()
         # Begin a transaction
         cursor.execute("BEGIN TRANSACTION")
 
-        insert_query = '''
-            INSERT INTO steps (
-                step_type, time, node_id, red, green, blue, width, height,
-                loc_x, loc_y, loc_z, description, update_type
-            )
+        cursor.execute("SELECT COALESCE(MAX(step_id), 0) FROM steps")
+        first_id = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO steps (step_id, step_type, time)
+            SELECT ? + ROW_NUMBER() OVER (ORDER BY update_id), 2, t
+            FROM node_update
+        ''', (first_id,))
+        insert_query = f'''
+            INSERT INTO node_update_steps (step_id, time, {step_column_names(2)})
             SELECT
-                2 as step_type, t as time, id as node_id, color_r as red, color_g as green, color_b as blue, width, height,
-                coord_x as loc_x, coord_y as loc_y, coord_z as loc_z, description, p
+                ? + ROW_NUMBER() OVER (ORDER BY update_id), t, p, id, description, color_r, color_g, color_b,
+                width, height, coord_x, coord_y, coord_z
             FROM node_update
         '''
-        cursor.execute(insert_query)
+        cursor.execute(insert_query, (first_id,))
+        set_steps_ordered(cursor, False)
 
         # Commit the transaction
         conn.commit()
@@ -437,92 +718,91 @@ def insert_node_updates_to_steps():
         print("Error:", e)
         conn.rollback()
     cursor.close()
-    conn.close()
 
 
-def insert_steps_to_database(data, step_type, database_batch_size):
-    conn = sqlite3.connect(db_path)
+def insert_node_update_steps(node_updates):
+    """Same as insert_node_updates_to_steps for given node updates only (used when following a file)."""
+    conn = get_write_connection()
     cursor = conn.cursor()
+    insert_steps(cursor, 2, [(item.time, item.p, item.id, item.descr, item.r, item.g, item.b, item.w, item.h,
+                              item.x, item.y, item.z) for item in node_updates])
+    set_steps_ordered(cursor, False)
+    conn.commit()
+    cursor.close()
 
-    cursor.execute("PRAGMA synchronous = OFF")
-    cursor.execute("PRAGMA journal_mode = MEMORY")
-
-    query = '''
-        INSERT INTO steps (
-            step_type, time, packet_id, from_id, to_id,
-            first_byte_transmission_time, first_byte_received_time, meta_info, step_number,
-            loc_x, loc_y, loc_z, src_loc_x, src_loc_y, src_loc_z, target_loc_x,
-            target_loc_y, target_loc_z , update_type, node_id, description, red, green,
-            blue, width, height
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    '''
-    start = time.perf_counter()
 
-    # Start a transaction
-    cursor.execute('BEGIN TRANSACTION')
+def insert_steps(cursor, step_type, values):
+    """Inserts values of steps of one type (time and the columns of their table) and their order rows."""
+    values = list(values)
+    cursor.execute("SELECT COALESCE(MAX(step_id), 0) FROM steps")
+    first_id = cursor.fetchone()[0] + 1
+    table, _, columns = step_tables[step_type]
+
+    cursor.executemany("INSERT INTO steps (step_id, step_type, time) VALUES (?, ?, ?)",
+                       [(step_id, step_type, row[0]) for step_id, row in enumerate(values, first_id)])
+    placeholders = ', '.join('?' * (len(columns) + 2))
+    cursor.executemany(f"INSERT INTO {table} (step_id, time, {step_column_names(step_type)}) VALUES ({placeholders})",
+                       [(step_id, *row) for step_id, row in enumerate(values, first_id)])
 
-    # Insert the values in batches
-    for batch_values in batched_values(data, step_type, database_batch_size):
-        cursor.executemany(query, batch_values)
-        conn.commit()
 
-    # Commit the transaction
+def insert_packet_substeps(step_type, rows, columns, conn=None):
+    """
+    Inserts packets of one step type, rows as in insert_packet_rows, with their substeps columns generated
+    by packet_substep_columns. Steps are written through conn when it is given (see append_partition_steps).
+    """
+    conn = conn or get_write_connection()
+    cursor = conn.cursor()
+    set_bulk_write_pragmas(cursor)
+    cursor.execute('BEGIN TRANSACTION')
+
+    cursor.execute("SELECT COALESCE(MAX(packet_ref), 0) FROM step_packets")
+    first_ref = cursor.fetchone()[0] + 1
+    cursor.executemany("INSERT INTO step_packets (packet_ref, packet_id, from_id, to_id, first_byte_transmission_time, "
+                       "first_byte_received_time, meta_info) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       [(packet_ref, *row[1:7]) for packet_ref, row in enumerate(rows, first_ref)])
+    # NaN coordinates are stored as NULL
+    insert_steps(cursor, step_type, zip(columns['time'].tolist(), (columns['packet'] + first_ref).tolist(),
+                                        columns['step_number'].tolist(), columns['loc_x'].tolist(),
+                                        columns['loc_y'].tolist(), columns['loc_z'].tolist()))
+    set_steps_ordered(cursor, False)
     conn.commit()
-    end = time.perf_counter()
-    print(f"Elapsed time (batch size: {database_batch_size}): {end - start}")
     cursor.close()
-    conn.close()
 
 
-def batched_values(dataset, step_type, batch_size):
-    batch = []
-    for step in dataset:
-        value = (
-            step_type, safe_getattr(step, 'time'),
-            safe_getattr(step, 'packet_id'),
-            safe_getattr(step, 'from_id'), safe_getattr(step, 'to_id'),
-            safe_getattr(step, 'first_byte_transmission_time'),
-            safe_getattr(step, 'first_byte_received_time'),
-            safe_getattr(step, 'meta_info'), safe_getattr(step, 'step_number'),
-            safe_getattr(step, 'loc_x'), safe_getattr(step, 'loc_y'),
-            safe_getattr(step, 'loc_z'), safe_getattr(step, 'src_loc_x'), safe_getattr(step, 'src_loc_y'),
-            safe_getattr(step, 'src_loc_z'), safe_getattr(step, 'target_loc_x'), safe_getattr(step, 'target_loc_y'),
-            safe_getattr(step, 'target_loc_z'),
-            safe_getattr(step, 'update_type'), safe_getattr(step, 'node_id'),
-            safe_getattr(step, 'description'),
-            safe_getattr(step, 'red'), safe_getattr(step, 'green'), safe_getattr(step, 'blue'),
-            safe_getattr(step, 'width'), safe_getattr(step, 'height')
-        )
-        batch.append(value)
-        if len(batch) == batch_size:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
+def insert_packet_rows(rows, conn=None):
+    """
+    Inserts packets instead of their substeps, rows are (step_type, packet_id, from_id, to_id, start time,
+    end time, meta_info, src_x, src_y, src_z, dst_x, dst_y, dst_z) with the endpoints at the reception time.
+    """
+    conn = conn or get_write_connection()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO step_packets (step_type, packet_id, from_id, to_id, first_byte_transmission_time, "
+                       "first_byte_received_time, meta_info, src_x, src_y, src_z, dst_x, dst_y, dst_z) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    cursor.close()
 
 
 def get_wired_packet_total_records():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM wired_packet")
     total_records = cursor.fetchone()[0]
     cursor.close()
-    conn.close()
     return total_records
 
 
 def get_wireless_packet_total_records():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM wireless_packet_reception")
     total_records = cursor.fetchone()[0]
     cursor.close()
-    conn.close()
     return total_records
 
 
 def get_wired_packet_by_limit_with_offset(batch_size, offset):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(
         f"""
@@ -533,12 +813,11 @@ def get_wired_packet_by_limit_with_offset(batch_size, offset):
     )
     data_raw = cursor.fetchall()
     cursor.close()
-    conn.close()
     return data_raw
 
 
 def get_wireless_packet_by_limit_with_offset(batch_size, offset):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(
         f"""
@@ -549,19 +828,11 @@ def get_wireless_packet_by_limit_with_offset(batch_size, offset):
     )
     data_raw = cursor.fetchall()
     cursor.close()
-    conn.close()
     return data_raw
 
 
-def safe_getattr(obj, attr, default=None):
-    value = getattr(obj, attr, default)
-    if value is not None and not isinstance(value, (str, int, float)):
-        return str(value)
-    return value
-
-
 def get_latest_positions_for_two_ids(node_id_1, node_id_2):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = f"""
         SELECT * FROM node_update
@@ -591,13 +862,12 @@ def get_latest_positions_for_two_ids(node_id_1, node_id_2):
         cursor.execute("SELECT loc_x, loc_y, loc_z FROM node WHERE id=?", (node_id_2,))
         latest_position_2 = cursor.fetchone()
     cursor.close()
-    conn.close()
 
     return latest_position_1, latest_position_2
 
 
 def get_all_nodes():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM node
@@ -605,12 +875,25 @@ def get_all_nodes():
     cursor.execute(query)
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [Node(row[0], row[1], row[2], row[3], row[4]) for row in result]
 
 
+def get_node_position_updates(time_range=None):
+    """
+    Returns (time, id, x, y, z) of position updates in the order they are applied, see merge_events.
+    Only updates with start <= time < end are returned when time_range (start, end) is given.
+    """
+    range_condition, range_parameters = time_range_condition('t', time_range)
+    cursor = get_read_connection().cursor()
+    cursor.execute(f"SELECT t, id, coord_x, coord_y, coord_z FROM node_update WHERE p = 'p' AND {range_condition} "
+                   f"ORDER BY t, rowid", range_parameters)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
 def get_all_node_updates():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM node_update WHERE p='p'
@@ -618,14 +901,13 @@ def get_all_node_updates():
     cursor.execute(query)
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [
         NodeUpdate(row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11], row[12])
         for row in result]
 
 
 def get_all_wired_packets():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wired_packet
@@ -633,12 +915,11 @@ def get_all_wired_packets():
     cursor.execute(query)
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WiredPacket(row[0], row[1], row[2], row[3], row[4], row[5], row[6]) for row in result]
 
 
 def get_all_wireless_packets():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wireless_packet_reception
@@ -646,12 +927,11 @@ def get_all_wireless_packets():
     cursor.execute(query)
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WirelessPacketReception(row[1], row[2], row[3], row[4], row[5], row[6], row[7]) for row in result]
 
 
 def get_wireless_packet_count():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT COUNT(*) FROM wireless_packet_reception
@@ -659,12 +939,11 @@ def get_wireless_packet_count():
     cursor.execute(query)
     count = cursor.fetchone()[0]
     cursor.close()
-    conn.close()
     return count
 
 
 def get_wired_packet_count():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT COUNT(*) FROM wired_packet
@@ -672,12 +951,11 @@ def get_wired_packet_count():
     cursor.execute(query)
     count = cursor.fetchone()[0]
     cursor.close()
-    conn.close()
     return count
 
 
 def get_wired_packets_with_offset(offset, batch_size, node):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wired_packet
@@ -687,12 +965,11 @@ def get_wired_packets_with_offset(offset, batch_size, node):
     cursor.execute(query, (node.id, batch_size, offset))
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WiredPacket(row[0], row[1], row[2], row[3], row[4], row[5], row[6]) for row in result]
 
 
 def get_wireless_packets_with_offset(offset, batch_size, node):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wireless_packet_reception
@@ -702,12 +979,11 @@ def get_wireless_packets_with_offset(offset, batch_size, node):
     cursor.execute(query, (node.id, batch_size, offset))
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WirelessPacketReception(row[1], row[2], row[3], row[4]) for row in result]
 
 
 def get_node_updates(offset, batch_size):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM node_update WHERE p='p' LIMIT ? OFFSET ?
@@ -715,14 +991,13 @@ def get_node_updates(offset, batch_size):
     cursor.execute(query, (batch_size, offset))
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [
         NodeUpdate(row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11], row[12])
         for row in result]
 
 
 def get_wireless_packets(offset, batch_size):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wired_packet LIMIT ? OFFSET ?
@@ -730,12 +1005,11 @@ def get_wireless_packets(offset, batch_size):
     cursor.execute(query, (batch_size, offset))
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WiredPacket(row[1], row[2], row[3], row[4], row[5], row[6], row[7]) for row in result]
 
 
 def get_wired_packets(offset, batch_size):
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM wireless_packet_reception LIMIT ? OFFSET ?
@@ -743,244 +1017,432 @@ def get_wired_packets(offset, batch_size):
     cursor.execute(query, (batch_size, offset))
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [WirelessPacketReception(row[1], row[2], row[3], row[4], row[5], row[6]) for row in result]
 
 
-def get_steps(batch_size, offset):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def fetch_step_rows(condition, parameters, order, limit=None):
+    """
+    Returns (time, step_id, step) of the steps matching condition, from all step tables merged by order.
 
-    query = f"SELECT * FROM steps ORDER BY time LIMIT {batch_size} OFFSET {offset}"
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    Every table is read by its primary key or time index, so only rows of the batch are read. With limit,
+    every table returns at most limit rows and only the first limit rows of the merge are kept.
+    """
+    tables = []
+    limit_clause = "" if limit is None else f" LIMIT {int(limit)}"
+    for step_type, (source, columns) in step_selects.items():
+        cursor = get_read_connection().cursor()
+        # Steps are created by the row factory of their type while fetched
+        cursor.row_factory = step_row_factories[step_type]
+        cursor.execute(f"SELECT step_id, time, {columns} FROM {source} WHERE {condition} ORDER BY {order}"
+                       f"{limit_clause}", parameters)
+        tables.append(cursor.fetchall())
+        cursor.close()
+    # step_id is unique, steps are never compared
+    return list(islice(heapq.merge(*tables, reverse=order.endswith("DESC")), limit))
+
+
+def step_batch(rows):
+    """Returns steps of the rows (see fetch_step_rows) and keys (time, step_id) of the first and the last one."""
+    if not rows:
+        return [], None, None
+    return [row[2] for row in rows], rows[0][:2], rows[-1][:2]
+
+
+def fetch_steps_after(key, batch_size):
+    """
+    Returns the batch of steps following key (time, step_id) in time order, see step_batch.
 
-    steps = []
-
-    for row in rows:
-        step_type = row[1]
-        step = None
-        if step_type == 1:
-            step = WiredPacketStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                meta_info=row[8], step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 2:
-            if row[19]:
-                if row[19] == "p":
-                    update_type = NodeUpdateType.P
-                if row[19] == "d":
-                    update_type = NodeUpdateType.D
-                if row[19] == "s":
-                    update_type = NodeUpdateType.S
-                if row[19] == "i":
-                    update_type = NodeUpdateType.I
-                if row[19] == "c":
-                    update_type = NodeUpdateType.C
-            step = NodeUpdateStep(
-                time=row[2], update_type=update_type, node_id=row[20], description=row[21],
-                red=row[22], green=row[23], blue=row[24], width=row[25], height=row[26],
-                loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 3:
-            step = WirelessPacketReceptionStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12], meta_info=row[8]
-            )
-
-        steps.append(step)
+    Every step table is sought through its time index from key, so every batch costs the same wherever it is.
+    Key None returns the first batch.
+    """
+    if key is None:
+        rows = fetch_step_rows("1", (), "time, step_id", batch_size)
+    else:
+        rows = fetch_step_rows("(time, step_id) > (?, ?)", key, "time, step_id", batch_size)
+    return step_batch(rows)
 
-    conn.close()
-    return steps
 
+def fetch_steps_before(key, batch_size):
+    """Returns the batch of steps preceding key (time, step_id), steps are in time order, see step_batch."""
+    rows = fetch_step_rows("(time, step_id) < (?, ?)", key, "time DESC, step_id DESC", batch_size)
+    return step_batch(rows[::-1])
 
-def fetch_data_from_database(iteration_index, batch_size):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    # Calculate the OFFSET and LIMIT based on the batch size
-    offset = iteration_index * batch_size
+def iterate_batch_keys(key, batch_size):
+    """
+    Yields keys (time, step_id) of the first and the last step of the full batches following key
+    (None for the start).
 
-    query = f"SELECT * FROM steps ORDER BY time LIMIT {batch_size} OFFSET {offset}"
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    The time index of the order table is read in one pass, steps are not decoded.
+    """
+    cursor = get_read_connection().cursor()
+    try:
+        if key is None:
+            cursor.execute("SELECT time, step_id FROM steps ORDER BY time, step_id")
+        else:
+            cursor.execute("SELECT time, step_id FROM steps WHERE (time, step_id) > (?, ?) "
+                           "ORDER BY time, step_id", key)
+        while len(rows := cursor.fetchmany(batch_size)) == batch_size:
+            yield tuple(rows[0]), tuple(rows[-1])
+    finally:
+        cursor.close()
+
+
+def get_step_key(offset):
+    """Returns key (time, step_id) of the step preceding offset (offset > 0), None when the table is shorter."""
+    for _, last_key in iterate_batch_keys(None, offset):
+        return last_key
+    return None
+
+
+def fetch_steps_by_position(position, batch_size):
+    """Returns the batch of steps starting at position of the animation, steps have to be ordered (order_steps)."""
+    return step_batch(fetch_step_rows("step_id > ? AND step_id <= ?", (position, position + batch_size), "step_id"))
+
+
+# Sort key of the steps of interpolated packets is (time, 0, step_id, 0) for node updates
+# and (time, 1, packet_ref, step_number) for packet substeps
+packet_row_columns = ('packet_ref, step_type, packet_id, from_id, to_id, first_byte_transmission_time, '
+                      'first_byte_received_time, meta_info, src_x, src_y, src_z, dst_x, dst_y, dst_z')
+# Rows read at once when the steps are only counted
+interpolated_chunk_size = 65536
+# Relative error allowed for the interpolated times of substeps (see get_packet_reach)
+substep_time_tolerance = 1e-9
+
+
+def iterate_node_update_steps(key, chunk_size):
+    """Yields (sort key, row) of node update steps following the sort key in time order."""
+    source, columns = step_selects[2]
+    if key is None:
+        last = (float('-inf'), 0)
+    elif key[1] < 0:
+        # Key before all steps of its time (see get_interpolated_step_key)
+        last = (key[0], float('-inf'))
+    else:
+        # Node updates go before substeps of the same time
+        last = (key[0], key[2] if key[1] == 0 else float('inf'))
+    while True:
+        cursor = get_read_connection().cursor()
+        cursor.execute(f"SELECT step_id, time, {columns} FROM {source} WHERE (time, step_id) > (?, ?) "
+                       f"ORDER BY time, step_id LIMIT ?", (*last, chunk_size))
+        rows = cursor.fetchall()
+        cursor.close()
+        for row in rows:
+            yield (row[1], 0, row[0], 0), row
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][1], rows[-1][0])
+
+
+def iterate_packet_rows(start_time, chunk_size):
+    """Yields packet rows starting at start_time or later ordered by (start time, packet_ref)."""
+    last = (start_time, 0)
+    while True:
+        cursor = get_read_connection().cursor()
+        cursor.execute(f"SELECT {packet_row_columns} FROM step_packets "
+                       f"WHERE (first_byte_transmission_time, packet_ref) > (?, ?) "
+                       f"ORDER BY first_byte_transmission_time, packet_ref LIMIT ?", (*last, chunk_size))
+        rows = cursor.fetchall()
+        cursor.close()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][5], rows[-1][0])
+
+
+def get_longest_packet_duration():
+    cursor = get_read_connection().cursor()
+    cursor.execute("SELECT MAX(first_byte_received_time - first_byte_transmission_time) FROM step_packets")
+    duration = cursor.fetchone()[0]
+    cursor.close()
+    return duration or 0.0
 
-    steps = []
-
-    for row in rows:
-        step_type = row[1]
-        step = None
-        if step_type == 1:
-            step = WiredPacketStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                meta_info=row[8], step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 2:
-            update_type = None
-            match row[19]:
-                case "p":
-                    update_type = NodeUpdateType.P
-                case "d":
-                    update_type = NodeUpdateType.D
-                case "s":
-                    update_type = NodeUpdateType.S
-                case "i":
-                    update_type = NodeUpdateType.I
-                case "c":
-                    update_type = NodeUpdateType.C
-            step = NodeUpdateStep(
-                time=row[2], update_type=update_type, node_id=row[20], description=row[21],
-                red=row[22], green=row[23], blue=row[24], width=row[25], height=row[26],
-                loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 3:
-            step = WirelessPacketReceptionStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12], meta_info=row[8]
-            )
-
-        steps.append(step)
 
-    conn.close()
-    return steps
+def get_packet_reach(time_value):
+    """
+    Returns how far from time_value the substeps of one packet around it can be. They are between the start and
+    the end of the packet, at most the longest packet duration apart, and rounding of their interpolation moves them
+    by a few ulps of time_value, substep_time_tolerance is far above that.
+    """
+    return get_longest_packet_duration() + abs(time_value) * substep_time_tolerance
 
 
-def get_data_by_batch_size(batch_size):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def iterate_packet_substeps(key, packet_steps, chunk_size):
+    """
+    Yields (sort key, packet row) of substeps following the sort key in time order, packet_steps maps step type
+    to the number of substeps of its packets.
 
-    query = f"SELECT * FROM steps ORDER BY time LIMIT {batch_size}"
-    cursor.execute(query)
-    rows = cursor.fetchall()
+    Packets are read by their start time, a packet joins the merge when no substep of the running packets
+    goes before its first one.
+    """
+    if key is None:
+        start_time = float('-inf')
+    else:
+        # Packets started earlier ended before the key
+        start_time = key[0] - get_packet_reach(key[0])
+    packets = iterate_packet_rows(start_time, chunk_size)
+    packet = next(packets, None)
+    running = []
+    while True:
+        while packet is not None and (not running or (packet[5], 1, packet[0], 0) < running[0][0]):
+            num_steps = packet_steps[packet[1]]
+            for step in range(num_steps):
+                sort_key = (substep_time(packet[5], packet[6], step, num_steps), 1, packet[0], step)
+                if key is None or sort_key > key:
+                    heapq.heappush(running, (sort_key, num_steps, packet))
+                    break
+            packet = next(packets, None)
+        if not running:
+            return
+
+        sort_key, num_steps, row = running[0]
+        yield sort_key, row
+        step = sort_key[3] + 1
+        if step < num_steps:
+            heapq.heapreplace(running, ((substep_time(row[5], row[6], step, num_steps), 1, row[0], step),
+                                        num_steps, row))
+        else:
+            heapq.heappop(running)
+
+
+def iterate_interpolated_steps(key, packet_steps, chunk_size):
+    """Yields (sort key, row) of node updates and packet substeps following the sort key (None from the start)."""
+    return heapq.merge(iterate_node_update_steps(key, chunk_size),
+                       iterate_packet_substeps(key, packet_steps, chunk_size), key=lambda item: item[0])
+
+
+def interpolated_step(sort_key, row, packet_steps):
+    if sort_key[1] == 0:
+        return step_from_row(2, row)
+    return packet_substep(row[1] == 1, packet_steps[row[1]], sort_key[3], row[2], row[3], row[4], row[5], row[6],
+                          row[7], row[8:11], row[11:14])
+
+
+def fetch_interpolated_steps_after(key, batch_size, packet_steps):
+    """Same as fetch_steps_after for interpolated packets, keys are sort keys of the steps."""
+    rows = list(islice(iterate_interpolated_steps(key, packet_steps, batch_size), batch_size))
+    if not rows:
+        return [], None, None
+    return [interpolated_step(sort_key, row, packet_steps) for sort_key, row in rows], rows[0][0], rows[-1][0]
+
+
+def get_interpolated_time_range():
+    """Returns (first, after last) times of the interpolated steps, (None, None) without steps."""
+    cursor = get_read_connection().cursor()
+    cursor.execute("SELECT MIN(time), MAX(time) FROM steps")
+    first, last = cursor.fetchone()
+    cursor.execute("SELECT MIN(first_byte_transmission_time), MAX(first_byte_transmission_time) FROM step_packets")
+    first_start, last_start = cursor.fetchone()
+    cursor.close()
+    if last_start is not None:
+        # No substep goes after the end of the last started packet
+        first = first_start if first is None else min(first, first_start)
+        last_end = last_start + get_packet_reach(last_start)
+        last = last_end if last is None else max(last, last_end)
+    if first is None:
+        return None, None
+    return first, math.nextafter(last, math.inf)
 
-    steps = []
-
-    for row in rows:
-        step_type = row[1]
-        step = None
-        if step_type == 1:
-            step = WiredPacketStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                meta_info=row[8], step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 2:
-            if row[19]:
-                if row[19] == "p":
-                    update_type = NodeUpdateType.P
-                if row[19] == "d":
-                    update_type = NodeUpdateType.D
-                if row[19] == "s":
-                    update_type = NodeUpdateType.S
-                if row[19] == "i":
-                    update_type = NodeUpdateType.I
-                if row[19] == "c":
-                    update_type = NodeUpdateType.C
-            step = NodeUpdateStep(
-                time=row[2], update_type=update_type, node_id=row[20], description=row[21],
-                red=row[22], green=row[23], blue=row[24], width=row[25], height=row[26],
-                loc_x=row[10], loc_y=row[11], loc_z=row[12]
-            )
-
-        elif step_type == 3:
-            step = WirelessPacketReceptionStep(
-                time=row[2], packet_id=row[3], from_id=row[4], to_id=row[5],
-                first_byte_transmission_time=row[6], first_byte_received_time=row[7],
-                step_number=row[9], loc_x=row[10], loc_y=row[11], loc_z=row[12], meta_info=row[8]
-            )
-
-        steps.append(step)
 
-    conn.close()
+def get_interpolated_step_key(position, packet_steps):
+    """
+    Returns the sort key of the step at position (starting from 1) of interpolated packets, None at position 0
+    or past the last step. The time of the step is bisected with count_steps_before until at most
+    interpolated_chunk_size steps are left, so only the steps from there are walked.
+    """
+    if position <= 0:
+        return None
+    low, high = get_interpolated_time_range()
+    if low is None:
+        return None
+    # Steps before low are before the step and steps before high include it
+    low_count = count_steps_before(low, packet_steps)
+    high_count = count_steps_before(high, packet_steps)
+    if position > high_count:
+        return None
+    while high_count - low_count > interpolated_chunk_size:
+        middle = (low + high) / 2
+        if not low < middle < high:
+            # All remaining steps have the same time
+            break
+        count = count_steps_before(middle, packet_steps)
+        if count < position:
+            low, low_count = middle, count
+        else:
+            high, high_count = middle, count
+
+    skipped_steps = position - low_count
+    chunk_size = min(skipped_steps, interpolated_chunk_size)
+    steps = iterate_interpolated_steps((low, -1, 0, 0), packet_steps, chunk_size)
+    for step_position, (sort_key, _) in enumerate(steps, 1):
+        if step_position == skipped_steps:
+            return sort_key
+    return None
+
+
+def get_steps(batch_size, offset):
+    if are_steps_ordered():
+        steps, _, _ = fetch_steps_by_position(offset, batch_size)
+        return steps
+    if offset <= 0:
+        key = None
+    elif (key := get_step_key(offset)) is None:
+        return []
+    steps, _, _ = fetch_steps_after(key, batch_size)
+    return steps
+
+
+def fetch_data_from_database(iteration_index, batch_size):
+    # Calculate the offset based on the batch size
+    offset = iteration_index * batch_size
+    return get_steps(batch_size, offset)
+
+
+def get_data_by_batch_size(batch_size):
+    steps, _, _ = fetch_steps_after(None, batch_size)
     return steps
 
 
 def get_total_steps_count():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
 
     query = "SELECT COUNT(*) FROM steps"
     cursor.execute(query)
     count = cursor.fetchone()[0]
 
-    conn.close()
     return count
 
 
-def get_data(offset, batch_size):
-    # SQL query
-    sql_query = '''
-        SELECT 2 AS step_type, t AS time, p AS node_update_type, id, color_r, color_g, color_b, width, height, coord_x, coord_y, coord_z, description, NULL AS from_id, NULL AS to_id, NULL AS fb_tx, NULL AS lb_tx, NULL AS fb_rx, NULL AS lb_rx
-        FROM node_update
-        UNION ALL
-        SELECT 3 AS step_type, fb_rx AS time, NULL AS node_update_type, u_id AS id, NULL AS color_r, NULL AS color_g, meta_info, NULL AS width, NULL AS height, NULL AS coord_x, NULL AS coord_y, NULL AS coord_z, NULL AS description, f_id AS from_id, t_id AS to_id, fb_tx, NULL AS lb_tx, fb_rx, lb_rx
-        FROM wireless_packet_reception
-        UNION ALL
-        SELECT 1 AS step_type, fb_rx AS time, NULL AS node_update_type, from_id AS id, NULL AS color_r, NULL AS color_g, NULL AS color_b, NULL AS width, NULL AS height, NULL AS coord_x, NULL AS coord_y, NULL AS coord_z, meta_info AS description, from_id, to_id, fb_tx, lb_tx, fb_rx, lb_rx
-        FROM wired_packet
-        ORDER BY time
-        LIMIT ? OFFSET ?
-        '''
+# Tables of the events processed to steps -> (time column, columns in constructor order, element class),
+# in the order events with the same time are merged
+event_tables = {
+    'node_update': ('t', 'p, t, id, color_r, color_g, color_b, width, height, coord_x, coord_y, coord_z, description',
+                    NodeUpdate),
+    'wireless_packet_reception': ('fb_rx', 'u_id, t_id, fb_rx, lb_rx, fb_tx, f_id, meta_info',
+                                  WirelessPacketReception),
+    'wired_packet': ('fb_rx', 'from_id, fb_tx, lb_tx, meta_info, to_id, fb_rx, lb_rx', WiredPacket),
+}
 
-    # Execute the query and fetch the results
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(sql_query, (batch_size, offset))
-    results = cursor.fetchall()
-
-    # Create a list of objects using the fetched results
-    objects = []
-    for row in results:
-        step_type = row[0]
-        obj = None
-        if step_type == 2:
-            obj = NodeUpdate(row[2], row[1], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11],
-                             row[12])
-        elif step_type == 3:
-            obj = WirelessPacketReception(row[3], row[14], row[17], row[18], row[15], row[13], row[6])
-        elif step_type == 1:
-            obj = WiredPacket(row[13], row[15], row[16], row[12], row[14], row[17], row[18])
-        if obj is not None:
-            objects.append(obj)
-
-    # Close the cursor and the connection
+
+def time_range_condition(time_column, time_range):
+    """Returns (condition, parameters) selecting rows with start <= time < end of time_range, None selects all."""
+    if time_range is None:
+        return "1", ()
+    return f"{time_column} >= ? AND {time_column} < ?", tuple(time_range)
+
+
+def iterate_table_events(table, chunk_size, time_range=None):
+    """
+    Yields (time, element) of one event table in time order, only events in time_range when it is given.
+
+    Rows are read through the time index in chunks sought from the last (time, rowid), so no statement
+    stays open between the chunks and the steps can be written while the table is read.
+    """
+    time_column, columns, element_class = event_tables[table]
+    range_condition, range_parameters = time_range_condition(time_column, time_range)
+    cursor = get_read_connection().cursor()
+    query = f"SELECT {time_column}, rowid, {columns} FROM {table} WHERE {range_condition}"
+    order = f" ORDER BY {time_column}, rowid LIMIT ?"
+    cursor.execute(query + order, (*range_parameters, chunk_size))
+    while rows := cursor.fetchall():
+        for row in rows:
+            yield row[0], element_class(*row[2:])
+        last = rows[-1]
+        cursor.execute(query + f" AND ({time_column}, rowid) > (?, ?)" + order,
+                       (*range_parameters, last[0], last[1], chunk_size))
     cursor.close()
-    conn.close()
 
-    return objects
 
+# Packet event tables in the order of event_tables
+packet_event_tables = [table for table in event_tables if table != 'node_update']
 
-def get_data_length():
-    sql_query = '''
-        SELECT COUNT(*) FROM (
-            SELECT t AS time
-            FROM node_update
-            UNION ALL
-            SELECT fb_rx AS time
-            FROM wireless_packet_reception
-            UNION ALL
-            SELECT fb_rx AS time
-            FROM wired_packet
-        ) AS total_rows
-    '''
 
-    conn = sqlite3.connect(db_path)
+def merge_events(chunk_size):
+    """
+    Yields node updates, wireless packet receptions and wired packets in time order.
+
+    Every table is already ordered by its time index, so they are merged with a heap in one pass
+    instead of sorting their union for every batch.
+    """
+    tables = [iterate_table_events(table, chunk_size) for table in event_tables]
+    for _, item in heapq.merge(*tables, key=lambda event: event[0]):
+        yield item
+
+
+def merge_packet_events(chunk_size, time_range):
+    """Yields packets received in time_range (start, end) in time order, same as merge_events."""
+    tables = [iterate_table_events(table, chunk_size, time_range) for table in packet_event_tables]
+    for _, item in heapq.merge(*tables, key=lambda event: event[0]):
+        yield item
+
+
+def get_packet_time_cuts(parts, samples_per_part=256):
+    """
+    Returns times cutting the packets by their reception time into about equal parts (less when many packets
+    are received at the same time), the times are quantiles of a sample of rows.
+    """
+    cursor = get_read_connection().cursor()
+    times = []
+    for table in packet_event_tables:
+        time_column = event_tables[table][0]
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        sample_step = max(1, cursor.fetchone()[0] // (parts * samples_per_part))
+        cursor.execute(f"SELECT {time_column} FROM {table} WHERE {time_column} IS NOT NULL AND rowid % ? = 0",
+                       (sample_step,))
+        times.extend(row[0] for row in cursor.fetchall())
+    cursor.close()
+    if not times:
+        return []
+    return np.unique(np.quantile(times, np.arange(1, parts) / parts)).tolist()
+
+
+# Partition of steps generated in a worker, step_packets columns in the order of create_step_tables
+step_packet_columns = ('packet_id, from_id, to_id, first_byte_transmission_time, first_byte_received_time, meta_info, '
+                       'step_type, src_x, src_y, src_z, dst_x, dst_y, dst_z')
+
+
+def append_partition_steps(partition_path):
+    """
+    Appends steps and packets of a partition database (see step.packet_rows.generate_partition) after the steps
+    of the current database. Their ids are shifted after the ids already used, so partitions appended in time
+    order keep the steps in the order they would be generated in one process.
+    """
+    conn = get_write_connection()
     cursor = conn.cursor()
-    cursor.execute(sql_query)
-    result = cursor.fetchone()
-    total_length = result[0] if result is not None else 0
+    set_bulk_write_pragmas(cursor)
+    cursor.execute("ATTACH DATABASE ? AS partition", (partition_path,))
+    try:
+        cursor.execute('BEGIN TRANSACTION')
+        cursor.execute("SELECT COALESCE(MAX(step_id), 0) FROM steps")
+        step_offset = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(packet_ref), 0) FROM step_packets")
+        packet_offset = cursor.fetchone()[0]
+
+        cursor.execute(f"INSERT INTO step_packets (packet_ref, {step_packet_columns}) "
+                       f"SELECT packet_ref + ?, {step_packet_columns} FROM partition.step_packets ORDER BY packet_ref",
+                       (packet_offset,))
+        cursor.execute("INSERT INTO steps (step_id, step_type, time) "
+                       "SELECT step_id + ?, step_type, time FROM partition.steps ORDER BY step_id", (step_offset,))
+        for step_type in (1, 3):
+            table = step_tables[step_type][0]
+            cursor.execute(f"INSERT INTO {table} (step_id, time, {step_column_names(step_type)}) "
+                           f"SELECT step_id + ?, time, packet_ref + ?, step_number, loc_x, loc_y, loc_z "
+                           f"FROM partition.{table} ORDER BY step_id", (step_offset, packet_offset))
+        set_steps_ordered(cursor, False)
+        conn.commit()
+    finally:
+        cursor.execute("DETACH DATABASE partition")
+        cursor.close()
 
+
+def get_data_length():
+    total_length = 0
+    cursor = get_read_connection().cursor()
+    for table in event_tables:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        total_length += cursor.fetchone()[0]
     cursor.close()
-    conn.close()
 
     return total_length
 
@@ -990,20 +1452,73 @@ def get_steps_table_size():
         SELECT COUNT(*) FROM steps
     '''
 
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(sql_query)
     result = cursor.fetchone()
     total_length = result[0] if result is not None else 0
 
     cursor.close()
-    conn.close()
 
     return total_length
 
 
+def get_animation_length(packet_steps):
+    """Returns the number of steps, substeps of interpolated packets are counted with packet_steps (type -> count)."""
+    length = get_steps_table_size()
+    if not are_packets_interpolated():
+        return length
+
+    cursor = get_read_connection().cursor()
+    cursor.execute("SELECT step_type, COUNT(*) FROM step_packets GROUP BY step_type")
+    for step_type, count in cursor.fetchall():
+        length += count * packet_steps[step_type]
+    cursor.close()
+    return length
+
+
+def get_longest_event_duration():
+    """Returns the longest time between the transmission and the reception of a packet event."""
+    cursor = get_read_connection().cursor()
+    duration = 0.0
+    for table in ('wired_packet', 'wireless_packet_reception'):
+        cursor.execute(f"SELECT MAX(fb_rx - fb_tx) FROM {table}")
+        duration = max(duration, cursor.fetchone()[0] or 0.0)
+    cursor.close()
+    return duration
+
+
+def count_steps_before(time_limit, packet_steps):
+    """
+    Returns the number of steps before time_limit, they are the first steps of the animation.
+    Substeps of interpolated packets are counted with packet_steps (see get_animation_length).
+    """
+    cursor = get_read_connection().cursor()
+    cursor.execute("SELECT COUNT(*) FROM steps WHERE time < ?", (time_limit,))
+    count = cursor.fetchone()[0]
+
+    if get_steps_version(cursor) == packet_rows_version:
+        # All substeps of packets ended long before the limit are counted, substeps of the others one by one
+        reach = get_packet_reach(time_limit)
+        ended_before = time_limit - reach
+        for step_type, num_steps in packet_steps.items():
+            cursor.execute("SELECT COUNT(*) FROM step_packets WHERE step_type = ? AND first_byte_received_time < ?",
+                           (step_type, ended_before))
+            count += cursor.fetchone()[0] * num_steps
+        # Packets not ended then started at most the reach earlier
+        cursor.execute("SELECT step_type, first_byte_transmission_time, first_byte_received_time FROM step_packets "
+                       "WHERE first_byte_transmission_time >= ? AND first_byte_transmission_time < ? "
+                       "AND first_byte_received_time >= ?", (ended_before - reach, time_limit, ended_before))
+        for step_type, start_time, end_time in cursor.fetchall():
+            num_steps = packet_steps[step_type]
+            count += sum(1 for step in range(num_steps) if substep_time(start_time, end_time, step, num_steps)
+                         < time_limit)
+    cursor.close()
+    return count
+
+
 def get_all_nonp2plinkproperties():
-    conn = sqlite3.connect(db_path)
+    conn = get_read_connection()
     cursor = conn.cursor()
     query = """
     SELECT * FROM nonp2plinkproperties
@@ -1011,7 +1526,6 @@ def get_all_nonp2plinkproperties():
     cursor.execute(query)
     result = cursor.fetchall()
     cursor.close()
-    conn.close()
     return [NonP2pLinkProperties(row[1], row[2], row[3]) for row in result]
 
 
@@ -1019,8 +1533,60 @@ def set_page_size(cursor):
     cursor.execute("PRAGMA page_size = 16384")
 
 
+# Indexes of the parsed elements read by step processing, index name -> (table, column)
+event_indexes = {
+    'idx_node_update_time': ('node_update', 't'),
+    'idx_wired_packet_fb_rx': ('wired_packet', 'fb_rx'),
+    'idx_wireless_packet_reception_fb_rx': ('wireless_packet_reception', 'fb_rx'),
+}
+
+# Pragmas of the connection loading a whole trace: the file is rebuilt when the load fails, so no fsync and
+# no journal on disk, bigger page cache (KiB) and temporary b-trees of the index builds in memory
+bulk_load_pragmas = (
+    "PRAGMA synchronous = OFF",
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
 def create_indexes(cursor):
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_node_update_time ON node_update (t)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_wired_packet_fb_rx ON wired_packet (fb_rx)')
-    cursor.execute(
-        'CREATE INDEX IF NOT EXISTS idx_wireless_packet_reception_fb_rx ON wireless_packet_reception (fb_rx)')
+    for index, (table, column) in event_indexes.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({column})')
+    create_steps_index(cursor)
+
+
+def begin_bulk_load(cursor):
+    """
+    Prepares the connection for inserting all elements of a trace. Event indexes are dropped, one sorted build
+    in finish_bulk_load is much cheaper than updating them for every inserted row.
+    """
+    for pragma in bulk_load_pragmas:
+        cursor.execute(pragma)
+    for index in event_indexes:
+        cursor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+def finish_bulk_load(cursor):
+    """Builds the event indexes after the load and collects their statistics for the query planner."""
+    create_indexes(cursor)
+    # Only the loaded tables, statistics of the still empty step tables would mislead the planner later
+    for table in dict.fromkeys(table for table, _ in event_indexes.values()):
+        cursor.execute(f'ANALYZE {table}')
+
+
+def create_steps_index(cursor):
+    # Rowid (step_id) is part of every index entry, so the indexes order the steps by (time, step_id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_steps_time ON steps (time)')
+    for table, _, _ in step_tables.values():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table} (time)')
+
+
+def create_packet_rows_index(cursor):
+    # Interpolated packets are read by start time, the longest one gives how far back a running packet can start
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_step_packets_start ON step_packets (first_byte_transmission_time)')
+    # Packets ended before a time are counted by type (see count_steps_before)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_step_packets_end '
+                   'ON step_packets (step_type, first_byte_received_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_step_packets_duration '
+                   'ON step_packets (first_byte_received_time - first_byte_transmission_time)')
@@ -0,0 +1,66 @@
+import time
+
+from database import database
+from database.writer import DatabaseWriter
+
+"""
+Bounded queue of batches submitted by the parsers to the single database writer.
+
+Parser waits when queue_depth batches are not yet taken by the writer, so at most queue_depth pickled
+batches are held in memory no matter how fast the file is parsed.
+"""
+
+default_queue_depth = 4
+
+
+class IngestQueue:
+    def __init__(self, queue_depth=default_queue_depth, status_callback=None):
+        self.writer = DatabaseWriter(database.db_path, max(1, queue_depth))
+        self.status_callback = status_callback
+        self.start_time = None
+        self.submitted_elements = 0
+        self.wait_time = 0.0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        self.writer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Writer is stopped without commit when parsing failed
+        if exc_type is not None:
+            self.writer.terminate()
+
+    def submit(self, batch):
+        wait_start = time.perf_counter()
+        self.writer.put(batch)
+        self.wait_time += time.perf_counter() - wait_start
+        self.submitted_elements += len(batch)
+        self.report()
+
+    def join(self):
+        """Waits until all submitted batches are written and committed."""
+        self.writer.close()
+        self.report()
+
+    @property
+    def written_elements(self):
+        return self.writer.written_elements.value
+
+    @property
+    def lag(self):
+        """Number of parsed elements which are not written to the database yet."""
+        return self.submitted_elements - self.written_elements
+
+    @property
+    def throughput(self):
+        """Written elements per second."""
+        elapsed = time.perf_counter() - self.start_time
+        return self.written_elements / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        if self.status_callback is None:
+            return
+        self.status_callback(self.written_elements, self.submitted_elements, time.perf_counter() - self.start_time,
+                             f"Ingest {self.throughput:.0f} elements/s, lag {self.lag} elements, "
+                             f"parser waited {self.wait_time:.1f} s:")
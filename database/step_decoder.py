@@ -0,0 +1,46 @@
+from step.step import WiredPacketStep, NodeUpdateStep, WirelessPacketReceptionStep
+from step.step_enum import NodeUpdateType
+
+"""
+Decoding of the rows of the step tables.
+
+Rows are (step_id, time, columns in the order of the step constructor). Every step type has its own row factory,
+it is set on the cursor, so steps are created while the rows are fetched, without dispatching on the type
+or copying every row to a list first.
+"""
+
+# Node update type is stored as the p attribute of <nu>
+update_type_codes = {
+    NodeUpdateType.P: 'p',
+    NodeUpdateType.D: 'd',
+    NodeUpdateType.S: 's',
+    NodeUpdateType.I: 'i',
+    NodeUpdateType.C: 'c',
+}
+update_types = {code: update_type for update_type, code in update_type_codes.items()}
+
+
+def wired_packet_row(cursor, row):
+    return row[1], row[0], WiredPacketStep(*row[1:])
+
+
+def node_update_row(cursor, row):
+    return row[1], row[0], NodeUpdateStep(row[1], update_types.get(row[2]), *row[3:])
+
+
+def wireless_packet_reception_row(cursor, row):
+    return row[1], row[0], WirelessPacketReceptionStep(*row[1:])
+
+
+# Step type -> row factory returning (time, step_id, step), the sort key of the step is its first two items
+step_row_factories = {
+    1: wired_packet_row,
+    2: node_update_row,
+    3: wireless_packet_reception_row,
+}
+
+
+def step_from_row(step_type, row):
+    """Returns the step of row (step_id, time, columns of the step type...)."""
+    return step_row_factories[step_type](None, row)[2]
+
@@ -0,0 +1,71 @@
+import multiprocessing
+import queue
+import sqlite3
+
+from database.database import create_tables, insert_elements, set_page_size, begin_bulk_load, finish_bulk_load, \
+    BroadcastJoin
+
+"""
+Single writer of the parsed elements.
+
+Parsers put batches to a bounded queue and one writer process inserts them through one long-lived
+connection inside one transaction, so the writes do not wait for each other on the database lock.
+The event indexes are built once all elements are inserted.
+"""
+
+# Seconds between checks that the writer is still running while the queue is full
+put_timeout = 1.0
+
+
+def write_batches(path, batches, written_elements):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    set_page_size(cursor)
+    create_tables(cursor, conn, indexes=False)
+    begin_bulk_load(cursor)
+
+    broadcasts = BroadcastJoin()
+    cursor.execute("BEGIN TRANSACTION")
+    while (batch := batches.get()) is not None:
+        insert_elements(cursor, batch, broadcasts)
+        with written_elements.get_lock():
+            written_elements.value += len(batch)
+    finish_bulk_load(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+class DatabaseWriter:
+    def __init__(self, path, queue_depth):
+        self.batches = multiprocessing.Queue(maxsize=queue_depth)
+        self.written_elements = multiprocessing.Value('q', 0)
+        self.process = multiprocessing.Process(target=write_batches,
+                                               args=(path, self.batches, self.written_elements), daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def put(self, batch):
+        """Blocks while the queue is full."""
+        while True:
+            try:
+                self.batches.put(batch, timeout=put_timeout)
+                return
+            except queue.Full:
+                self.check_alive()
+
+    def check_alive(self):
+        if not self.process.is_alive():
+            raise RuntimeError(f"Database writer stopped with exit code {self.process.exitcode}")
+
+    def close(self):
+        """Waits until all batches are written and committed."""
+        self.put(None)
+        self.process.join()
+        if self.process.exitcode != 0:
+            raise RuntimeError(f"Database writer stopped with exit code {self.process.exitcode}")
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join()
@@ -21,8 +21,11 @@ from database.database import get_steps, get_all_nodes, get_all_nonp2plinkproper
 from interactors.interactors import CustomInteractorStyle, KeyPressInteractor
 from network_elements.elements import Node, NonP2pLinkProperties
 from parsers.json.json_parser import JsonParser
+from parsers.json.streaming_json_parser import StreamingJsonParser
 from parsers.parser import ParserAPI
 from parsers.xml.dom import DomXmlParser
+from parsers.xml.line_tokenizer import LineTokenizerXmlParser
+from parsers.xml.parallel_tree_element import ParallelElementTreeXmlParser
 from parsers.xml.tree_element import ElementTreeXmlParser
 from step.step_processor import StepProcessor
 from utils.manage import get_objects_by_type
@@ -79,16 +82,22 @@ class Environment(QMainWindow):
         # Initialize ParserAPI and register parsers
         self.parser_api = ParserAPI()
         element_tree_parser = ElementTreeXmlParser(bottom_dock_widget=self.bottom_dock_widget)
+        parallel_element_tree_parser = ParallelElementTreeXmlParser(bottom_dock_widget=self.bottom_dock_widget)
+        line_tokenizer_parser = LineTokenizerXmlParser(bottom_dock_widget=self.bottom_dock_widget)
         dom_parser = DomXmlParser(bottom_dock_widget=self.bottom_dock_widget)
         dom_parser.parsed_data_signal.connect(self.set_parsed_data)
 
         json_parser = JsonParser(bottom_dock_widget=self.bottom_dock_widget)
         json_parser.parsed_data_signal.connect(self.set_parsed_data)
+        streaming_json_parser = StreamingJsonParser(bottom_dock_widget=self.bottom_dock_widget)
 
         self.parser_api.register_parser('xml', element_tree_parser,
                                         "ElementTreeXmlParser")
+        self.parser_api.register_parser('xml', parallel_element_tree_parser, "ParallelElementTreeXmlParser")
+        self.parser_api.register_parser('xml', line_tokenizer_parser, "LineTokenizerXmlParser")
         self.parser_api.register_parser('xml', dom_parser, "DomXmlParser")
         self.parser_api.register_parser('json', json_parser, "JsonParser")
+        self.parser_api.register_parser('json', streaming_json_parser, "StreamingJsonParser")
 
         # Initialize EnvironmentRenderingApi
         self.vtk_api = EnvironmentRenderingApi()
@@ -100,6 +109,22 @@ class Environment(QMainWindow):
         # Initialize AnimationAPI
         self.animation_api = AnimationApi(self.vtk_api, self.bottom_dock_widget)
 
+        # Ingest throughput and lag of the database parsers
+        for parser in (element_tree_parser, parallel_element_tree_parser, line_tokenizer_parser,
+                       streaming_json_parser):
+            parser.update_status.connect(self.on_status_update)
+        # Progress of hashing a trace for the parse cache
+        self.parser_api.parse_cache_worker.update_status.connect(self.on_status_update)
+        # Trace opened from the parse cache is opened with its processed steps
+        self.parser_api.set_processed_steps_callback(self.step_processor.open_processed_steps)
+
+        # Steps of followed file are generated as new elements are parsed, in the parser thread
+        element_tree_parser.elements_appended.connect(self.step_processor.process_appended_elements,
+                                                      Qt.DirectConnection)
+        self.step_processor.steps_appended.connect(self.on_steps_appended)
+        # Steps are played while they are processed
+        self.step_processor.steps_committed.connect(self.on_steps_committed)
+
         self.interactor_style = CustomInteractorStyle()
 
         # Initialize StackedWidget
@@ -115,6 +140,7 @@ class Environment(QMainWindow):
         self.settings_view_widget.set_animation_settings_callback(self.animation_api.update_steps_constants)
         self.settings_view_widget.set_parser_change_callback(self.parser_api.set_active_parser)
         self.settings_view_widget.set_parser_batch_size_callback(self.parser_api.set_batch_size)
+        self.settings_view_widget.set_parser_queue_depth_callback(self.parser_api.set_queue_depth)
         self.manage_custom_view_widget = ManageCustomView(self)
 
         # Add views to the stacked widget
@@ -150,6 +176,8 @@ class Environment(QMainWindow):
         run_menu.addAction("Process data", self.process_data)
         run_menu.addAction("Start animation", self.run_animation)
         run_menu.addAction("Parse && Process && Start animation ", self.parse_process_run)
+        run_menu.addAction("Follow file", self.follow_file)
+        run_menu.addAction("Stop following", self.parser_api.stop_following)
 
         # Help menu
         help_menu = QMenu("Help", self)
@@ -237,8 +265,9 @@ class Environment(QMainWindow):
         """Open a file and process its contents."""
         options = QFileDialog.Options()
         options |= QFileDialog.ReadOnly
-        self.file_path, _ = QFileDialog.getOpenFileName(self, "Open File", "", "Xml Files (*.xml);;Json "
-                                                                               "Files (*.json)",
+        self.file_path, _ = QFileDialog.getOpenFileName(self, "Open File", "",
+                                                        "Xml Files (*.xml *.xml.gz *.xml.bz2 *.xml.xz);;"
+                                                        "Json Files (*.json *.json.gz *.json.bz2 *.json.xz)",
                                                         options=options)
         self.bottom_dock_widget.log(f"File opened: {self.file_path}")
         # reset everything - to avoid issues when opening second file
@@ -256,6 +285,7 @@ class Environment(QMainWindow):
     def reset_when_file_open(self):
         save_to_database([])
         self.animation_api.substeps = []
+        self.animation_api.reset_database_batches()
         self.step_processor.substeps = self.step_processor.substeps = {step_type: [] for step_type in
                                                                        self.step_processor.step_types}
         self.animation_api.data = None
@@ -265,6 +295,10 @@ class Environment(QMainWindow):
     def process_data(self):
         if self.step_processor.optimized_parser:
             self.step_processor.data = None
+            # Catalog file of the steps is selected in the main thread before processing starts
+            self.step_processor.select_database(self.parser_api.trace_key)
+            if self.step_processor.progressive:
+                self.animation_api.start_progressive()
             self.step_processor.data_processed.connect(self.on_data_processed)
             self.step_processor.update_status.connect(self.on_status_update)
             self.step_processor.start()
@@ -282,6 +316,8 @@ class Environment(QMainWindow):
 
     def on_data_processed(self, result):
         if self.step_processor.optimized_parser:
+            if self.animation_api.database_committed_length is not None:
+                self.animation_api.finish_progressive()
             self.animation_api.set_substeps(get_steps(self.settings_view_widget.parser_batch_size_spinbox.value(), 0))
             self.left_dock_widget.clear_widgets()
             self.left_dock_widget.update_list_widget(get_all_nodes(), get_all_nonp2plinkproperties())
@@ -321,6 +357,36 @@ class Environment(QMainWindow):
         else:
             self.bottom_dock_widget.log("No data to animate.")
 
+    def follow_file(self):
+        """Animates a trace while it is still written, steps are added as the file grows."""
+        if not self.file_path:
+            self.bottom_dock_widget.log("File path is wrong.")
+            return
+        self.reset_when_file_open()
+        self.left_dock_widget.clear_widgets()
+        self.animation_api.use_database = True
+        self.step_processor.start_following()
+        try:
+            self.parser_api.parse_file(self.file_path, follow=True)
+        except ValueError as e:
+            self.bottom_dock_widget.log(str(e))
+
+    def on_steps_appended(self, database_length):
+        if not self.animation_api.animation_started:
+            self.left_dock_widget.clear_widgets()
+            self.left_dock_widget.update_list_widget(get_all_nodes(), get_all_nonp2plinkproperties())
+            self.animation_api.prepare_animation()
+            self.animation_api.animate_substeps()
+        self.animation_api.extend_database_length(database_length)
+
+    def on_steps_committed(self, database_length):
+        if not self.animation_api.animation_started:
+            self.left_dock_widget.clear_widgets()
+            self.left_dock_widget.update_list_widget(get_all_nodes(), get_all_nonp2plinkproperties())
+            self.animation_api.prepare_animation()
+            self.animation_api.animate_substeps()
+        self.animation_api.extend_committed_length(database_length)
+
     def parse_process_run(self):
         self.parse_file()
         self.process_data()
@@ -2,10 +2,12 @@ import sys
 
 from PyQt5.QtWidgets import QApplication
 
+from database.database import close_connections
 from environment import Environment
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(close_connections)
     main_window = Environment()
     main_window.show()
     sys.exit(app.exec_())
@@ -1,2 +1 @@
-__all__ = ['tags']
-
+__all__ = ['schema', 'tags', 'trace']
@@ -0,0 +1,118 @@
+# schema.py
+"""
+This script defines types of attributes of all tags that can be retrieved to visualiser.
+Parsers convert every attribute exactly once when element is parsed, so ids are stored as int
+and times, coordinates and colors as float everywhere else in the application.
+
+When adding new tag, add its attributes here too, attributes which are not listed stay strings.
+"""
+from network_elements.tags import NetworkElementTags, AnimTags, NodeTags, NuTags, NonP2pLinkPropertiesTags, \
+    IpTags, IpV6Tags, NcsTags, PTags, WprTags, PrTags, ResTags, LinkTags
+
+
+def to_int(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def to_float(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def to_str(value):
+    return value
+
+
+attribute_types = {
+    NetworkElementTags.ANIM_TAG.value: {
+        AnimTags.VER_TAG: to_str,
+        AnimTags.FILE_TYPE_TAG: to_str,
+    },
+    NetworkElementTags.NODE_TAG.value: {
+        NodeTags.ID_TAG: to_int,
+        NodeTags.SYS_ID_TAG: to_int,
+        NodeTags.LOC_X_TAG: to_float,
+        NodeTags.LOC_Y_TAG: to_float,
+        NodeTags.LOC_Z_TAG: to_float,
+    },
+    NetworkElementTags.NU_TAG.value: {
+        NuTags.P_TAG: to_str,
+        NuTags.T_TAG: to_float,
+        NuTags.ID_TAG: to_int,
+        NuTags.COLOR_R_TAG: to_float,
+        NuTags.COLOR_G_TAG: to_float,
+        NuTags.COLOR_B_TAG: to_float,
+        NuTags.WIDTH_TAG: to_float,
+        NuTags.HEIGHT_TAG: to_float,
+        NuTags.COORD_X_TAG: to_float,
+        NuTags.COORD_Y_TAG: to_float,
+        NuTags.COORD_Z_TAG: to_float,
+        NuTags.DESCRIPTION_TAG: to_str,
+    },
+    NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value: {
+        NonP2pLinkPropertiesTags.ID_TAG: to_int,
+        NonP2pLinkPropertiesTags.IP_ADDRESS_TAG: to_str,
+        NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG: to_str,
+    },
+    NetworkElementTags.IP_TAG.value: {
+        IpTags.N_TAG: to_int,
+    },
+    NetworkElementTags.IPV6_TAG.value: {
+        IpV6Tags.N_TAG: to_int,
+    },
+    NetworkElementTags.NCS_TAG.value: {
+        NcsTags.NC_ID_TAG: to_int,
+        # Name and value type of a node counter, e.g. n="RemainingEnergy" t="DOUBLE"
+        NcsTags.N_TAG: to_str,
+        NcsTags.T_TAG: to_str,
+    },
+    NetworkElementTags.P_TAG.value: {
+        PTags.FROM_ID_TAG: to_int,
+        PTags.FB_TX_TAG: to_float,
+        PTags.LB_TX_TAG: to_float,
+        PTags.META_INFO_TAG: to_str,
+        PTags.TO_ID_TAG: to_int,
+        PTags.FB_RX_TAG: to_float,
+        PTags.LB_RX_TAG: to_float,
+    },
+    NetworkElementTags.WPR_TAG.value: {
+        WprTags.U_ID_TAG: to_int,
+        WprTags.T_ID_TAG: to_int,
+        WprTags.FB_RX_TAG: to_float,
+        WprTags.LB_RX_TAG: to_float,
+    },
+    NetworkElementTags.PR_TAG.value: {
+        PrTags.U_ID_TAG: to_int,
+        PrTags.F_ID_TAG: to_int,
+        PrTags.FB_TX_TAG: to_float,
+        PrTags.META_INFO_TAG: to_str,
+    },
+    NetworkElementTags.RES_TAG.value: {
+        ResTags.RID_TAG: to_int,
+        ResTags.P_TAG: to_str,
+    },
+    NetworkElementTags.LINK_TAG.value: {
+        LinkTags.FROM_ID_TAG: to_int,
+        LinkTags.TO_ID_TAG: to_int,
+        LinkTags.FD_TAG: to_str,
+        LinkTags.TD_TAG: to_str,
+        LinkTags.LD_TAG: to_str,
+    },
+}
+
+
+def get_decoder(tag, attribute_name):
+    return attribute_types.get(tag, {}).get(attribute_name, to_str)
+
+
+def decode_attribute(tag, attribute_name, value):
+    return get_decoder(tag, attribute_name)(value)
+
+
+def decode_attributes(tag, attributes):
+    """Returns new dictionary with all attributes of the element converted to their types."""
+    types = attribute_types.get(tag, {})
+    return {name: types.get(name, to_str)(value) for name, value in attributes.items()}
@@ -0,0 +1,164 @@
+import numpy as np
+
+from network_elements.elements import Node, NodeUpdate, WiredPacket, Broadcaster, WirelessPacketReception
+
+"""
+Columnar representation of a parsed trace.
+
+Every time dependent element type is kept in one numpy structured array instead of a list of objects.
+Numbers are stored as float64 / int32 (missing value is NaN / -1) and strings are dictionary encoded
+into one string table shared by all columns. Static elements (links, addresses, resources...) are few,
+so they stay as objects.
+"""
+
+chunk_size = 65536
+missing_id = -1
+
+# Element class -> (attribute in constructor order, column type), 's' columns hold codes into the string table
+columnar_elements = {
+    Node: (('id', 'i'), ('sys_id', 'i'), ('loc_x', 'f'), ('loc_y', 'f'), ('loc_z', 'f')),
+    NodeUpdate: (('p', 's'), ('time', 'f'), ('id', 'i'), ('r', 'f'), ('g', 'f'), ('b', 'f'), ('w', 'f'),
+                 ('h', 'f'), ('x', 'f'), ('y', 'f'), ('z', 'f'), ('descr', 's')),
+    WiredPacket: (('from_id', 'i'), ('first_byte_transmission_time', 'f'), ('last_byte_transmission_time', 'f'),
+                  ('meta_info', 's'), ('to_id', 'i'), ('first_byte_received_time', 'f'),
+                  ('last_byte_received_time', 'f')),
+    Broadcaster: (('unique_id', 'i'), ('from_id', 'i'), ('first_byte_transmission_time', 'f'), ('meta_info', 's')),
+    WirelessPacketReception: (('unique_id', 'i'), ('to_id', 'i'), ('first_byte_received_time', 'f'),
+                              ('last_byte_received_time', 'f'), ('first_byte_transmission_time', 'f'),
+                              ('from_id', 'i'), ('meta_info', 's')),
+}
+
+# Column used to order events of every type, same as sorting_key in the step processor
+time_columns = {
+    NodeUpdate: 'time',
+    WiredPacket: 'first_byte_transmission_time',
+    Broadcaster: 'first_byte_transmission_time',
+    WirelessPacketReception: 'first_byte_received_time',
+}
+
+column_dtypes = {'i': np.int32, 'f': np.float64, 's': np.int32}
+
+
+def element_dtype(element_class):
+    return np.dtype([(name, column_dtypes[column_type]) for name, column_type in columnar_elements[element_class]])
+
+
+class StringTable:
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        if value is None:
+            return missing_id
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return None if code < 0 else self.values[code]
+
+
+class ColumnarTrace:
+    """
+    Container filled by the parsers with append / extend and closed with finish.
+
+    Rows are collected in small python chunks and converted to numpy arrays every chunk_size rows,
+    so only one chunk per type is held as python objects at any time.
+    """
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.static_elements = []
+        self.chunks = {element_class: [] for element_class in columnar_elements}
+        self.pending = {element_class: [] for element_class in columnar_elements}
+        self.arrays = {}
+
+    def __len__(self):
+        return (sum(len(self.get_array(element_class)) for element_class in columnar_elements)
+                + len(self.static_elements))
+
+    def append(self, item):
+        columns = columnar_elements.get(type(item))
+        if columns is None:
+            self.static_elements.append(item)
+            return
+
+        row = []
+        for name, column_type in columns:
+            value = getattr(item, name)
+            if column_type == 's':
+                row.append(self.strings.encode(value))
+            elif value is None:
+                row.append(missing_id if column_type == 'i' else np.nan)
+            else:
+                row.append(value)
+
+        pending = self.pending[type(item)]
+        pending.append(tuple(row))
+        if len(pending) >= chunk_size:
+            self.flush(type(item))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def flush(self, element_class):
+        pending = self.pending[element_class]
+        if pending:
+            self.chunks[element_class].append(np.array(pending, dtype=element_dtype(element_class)))
+            self.pending[element_class] = []
+        self.arrays.pop(element_class, None)
+
+    def finish(self):
+        """Converts all remaining rows, has to be called when parser adds the last element."""
+        for element_class in columnar_elements:
+            self.flush(element_class)
+            self.get_array(element_class)
+        return self
+
+    def get_array(self, element_class):
+        array = self.arrays.get(element_class)
+        if array is None:
+            chunks = self.chunks[element_class]
+            array = np.concatenate(chunks) if chunks else np.empty(0, dtype=element_dtype(element_class))
+            # Keep only the concatenated array
+            self.chunks[element_class] = [array] if len(array) else []
+            self.arrays[element_class] = array
+        return array
+
+    def get_objects(self, element_class):
+        """Returns the elements of one type as objects (for consumers working with single elements)."""
+        if element_class not in columnar_elements:
+            return [item for item in self.static_elements if isinstance(item, element_class)]
+
+        columns = self.get_values(self.get_array(element_class), element_class)
+        return [element_class(*row) for row in zip(*columns.values())]
+
+    def get_values(self, array, element_class):
+        """
+        Returns attribute -> list of values of rows of the array (of element_class), with None for missing values
+        and decoded strings, like the attributes of the objects.
+        """
+        columns = {}
+        for name, column_type in columnar_elements[element_class]:
+            values = array[name].tolist()
+            if column_type == 's':
+                values = [self.strings.decode(code) for code in values]
+            elif column_type == 'i':
+                values = [None if value == missing_id else value for value in values]
+            else:
+                values = [None if value != value else value for value in values]
+            columns[name] = values
+        return columns
+
+    def time_order(self, element_class):
+        """
+        Returns the rows of a time dependent element type in time order (stable, missing time is 0),
+        the order in which the step processor processes them.
+        """
+        array = self.get_array(element_class)
+        return np.argsort(np.nan_to_num(array[time_columns[element_class]], nan=0.0), kind='stable')
@@ -5,138 +5,181 @@ from PyQt5.QtCore import QThread, pyqtSignal
 
 from network_elements.elements import Anim, Address, Node, NodeUpdate, NonP2pLinkProperties, Ip, IpV6, WiredPacket, Ncs, \
     Link, Resource, WirelessPacketReception, Broadcaster
+from network_elements.schema import decode_attribute
+from network_elements.trace import ColumnarTrace
 from network_elements.tags import NetworkElementTags, AnimTags, NodeTags, NuTags, NonP2pLinkPropertiesTags, PTags, \
     WprTags, NcsTags, LinkTags, ResTags, PrTags, IpTags, IpV6Tags
+from utils.fileUtils import open_trace
 
 prefix = '@'
 
 
+def decode_json_attributes(tag, element):
+    """Converts attributes (prefixed keys) of json element to their types, nested elements are kept."""
+    return {key: decode_attribute(tag, key[len(prefix):], value) if key.startswith(prefix) else value
+            for key, value in element.items()}
+
+
+def json_parse_node(node):
+    node = decode_json_attributes(NetworkElementTags.NODE_TAG.value, node)
+    return Node(node.get(prefix + NodeTags.ID_TAG),
+                node.get(prefix + NodeTags.SYS_ID_TAG),
+                node.get(prefix + NodeTags.LOC_X_TAG),
+                node.get(prefix + NodeTags.LOC_Y_TAG),
+                node.get(prefix + NodeTags.LOC_Z_TAG)
+                )
+
+
 def json_parse_nodes(data):
-    data_list = []
     for node in data.get(NetworkElementTags.NODE_TAG.value) or []:
-        data_list.append(Node(node.get(prefix + NodeTags.ID_TAG),
-                              node.get(prefix + NodeTags.SYS_ID_TAG),
-                              node.get(prefix + NodeTags.LOC_X_TAG),
-                              node.get(prefix + NodeTags.LOC_Y_TAG),
-                              node.get(prefix + NodeTags.LOC_Z_TAG)
-                              ))
-    return data_list
+        yield json_parse_node(node)
+
+
+def json_parse_nu_element(nu):
+    nu = decode_json_attributes(NetworkElementTags.NU_TAG.value, nu)
+    return NodeUpdate(
+        nu.get(prefix + NuTags.P_TAG),
+        nu.get(prefix + NuTags.T_TAG),
+        nu.get(prefix + NuTags.ID_TAG),
+        nu.get(prefix + NuTags.COLOR_R_TAG),
+        nu.get(prefix + NuTags.COLOR_G_TAG),
+        nu.get(prefix + NuTags.COLOR_B_TAG),
+        nu.get(prefix + NuTags.WIDTH_TAG),
+        nu.get(prefix + NuTags.HEIGHT_TAG),
+        nu.get(prefix + NuTags.COORD_X_TAG),
+        nu.get(prefix + NuTags.COORD_Y_TAG),
+        nu.get(prefix + NuTags.COORD_Z_TAG),
+        nu.get(prefix + NuTags.DESCRIPTION_TAG)
+    )
 
 
 def json_parse_nu(data):
-    data_list = []
     for nu in data.get(NetworkElementTags.NU_TAG.value) or []:
-        data_list.append(NodeUpdate(
-            nu.get(prefix + NuTags.P_TAG),
-            nu.get(prefix + NuTags.T_TAG),
-            nu.get(prefix + NuTags.ID_TAG),
-            nu.get(prefix + NuTags.COLOR_R_TAG),
-            nu.get(prefix + NuTags.COLOR_G_TAG),
-            nu.get(prefix + NuTags.COLOR_B_TAG),
-            nu.get(prefix + NuTags.WIDTH_TAG),
-            nu.get(prefix + NuTags.HEIGHT_TAG),
-            nu.get(prefix + NuTags.COORD_X_TAG),
-            nu.get(prefix + NuTags.COORD_Y_TAG),
-            nu.get(prefix + NuTags.COORD_Z_TAG),
-            nu.get(prefix + NuTags.DESCRIPTION_TAG)
-        ))
-    return data_list
+        yield json_parse_nu_element(nu)
+
+
+def json_parse_non_link_property(non_link_property):
+    non_link_property = decode_json_attributes(NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value, non_link_property)
+    return NonP2pLinkProperties(non_link_property.get(prefix + NonP2pLinkPropertiesTags.ID_TAG),
+                                non_link_property.get(prefix + NonP2pLinkPropertiesTags.IP_ADDRESS_TAG),
+                                non_link_property.get(prefix + NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG)
+                                )
 
 
 def json_parse_non_link_properties(data):
-    data_list = []
     for non_link_property in data.get(NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value) or []:
-        data_list.append(NonP2pLinkProperties(non_link_property.get(prefix + NonP2pLinkPropertiesTags.ID_TAG),
-                                              non_link_property.get(prefix + NonP2pLinkPropertiesTags.IP_ADDRESS_TAG),
-                                              non_link_property.get(prefix + NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG)
-                                              ))
-    return data_list
+        yield json_parse_non_link_property(non_link_property)
+
+
+def json_parse_ip_element(ip):
+    ip = decode_json_attributes(NetworkElementTags.IP_TAG.value, ip)
+    return Ip(ip.get(prefix + IpTags.N_TAG),
+              json_parse_address(ip.get(NetworkElementTags.ADDRESS_TAG.value))
+              )
 
 
 def json_parse_ip(data):
-    data_list = []
     for ip in data.get(NetworkElementTags.IP_TAG.value) or []:
-        data_list.append(Ip(ip.get(prefix + IpTags.N_TAG),
-                            json_parse_address(ip.get(NetworkElementTags.ADDRESS_TAG.value))
-                            ))
-    return data_list
+        yield json_parse_ip_element(ip)
+
+
+def json_parse_ipv_element(ipv):
+    ipv = decode_json_attributes(NetworkElementTags.IPV6_TAG.value, ipv)
+    return IpV6(ipv.get(prefix + IpV6Tags.N_TAG),
+                json_parse_address(ipv.get(NetworkElementTags.ADDRESS_TAG.value))
+                )
 
 
 def json_parse_ipv(data):
-    data_list = []
     for ipv in data.get(NetworkElementTags.IPV6_TAG.value) or []:
-        data_list.append(IpV6(ipv.get(prefix + IpV6Tags.N_TAG),
-                              json_parse_address(ipv.get(NetworkElementTags.ADDRESS_TAG.value))
-                              ))
-    return data_list
+        yield json_parse_ipv_element(ipv)
+
+
+def json_parse_p_element(p):
+    p = decode_json_attributes(NetworkElementTags.P_TAG.value, p)
+    return WiredPacket(p.get(prefix + PTags.FROM_ID_TAG),
+                       p.get(prefix + PTags.FB_TX_TAG),
+                       p.get(prefix + PTags.LB_TX_TAG),
+                       p.get(prefix + PTags.META_INFO_TAG),
+                       p.get(prefix + PTags.TO_ID_TAG),
+                       p.get(prefix + PTags.FB_RX_TAG),
+                       p.get(prefix + PTags.LB_RX_TAG)
+                       )
 
 
 def json_parse_p(data):
-    data_list = []
     for p in data.get(NetworkElementTags.P_TAG.value) or []:
-        data_list.append(WiredPacket(p.get(prefix + PTags.FROM_ID_TAG),
-                                     p.get(prefix + PTags.FB_TX_TAG),
-                                     p.get(prefix + PTags.LB_TX_TAG),
-                                     p.get(prefix + PTags.META_INFO_TAG),
-                                     p.get(prefix + PTags.TO_ID_TAG),
-                                     p.get(prefix + PTags.FB_RX_TAG),
-                                     p.get(prefix + PTags.LB_RX_TAG)
-                                     ))
-    return data_list
+        yield json_parse_p_element(p)
+
+
+def json_parse_wpr_element(wpr):
+    wpr = decode_json_attributes(NetworkElementTags.WPR_TAG.value, wpr)
+    return WirelessPacketReception(wpr.get(prefix + WprTags.U_ID_TAG),
+                                   wpr.get(prefix + WprTags.T_ID_TAG),
+                                   wpr.get(prefix + WprTags.FB_RX_TAG),
+                                   wpr.get(prefix + WprTags.LB_RX_TAG)
+                                   )
 
 
 def json_parse_wpr(data):
-    data_list = []
     for wpr in data.get(NetworkElementTags.WPR_TAG.value) or []:
-        data_list.append(WirelessPacketReception(wpr.get(prefix + WprTags.U_ID_TAG),
-                                                 wpr.get(prefix + WprTags.T_ID_TAG),
-                                                 wpr.get(prefix + WprTags.FB_RX_TAG),
-                                                 wpr.get(prefix + WprTags.LB_RX_TAG)
-                                                 ))
-    return data_list
+        yield json_parse_wpr_element(wpr)
+
+
+def json_parse_pr_element(pr):
+    pr = decode_json_attributes(NetworkElementTags.PR_TAG.value, pr)
+    return Broadcaster(
+        pr.get(prefix + PrTags.U_ID_TAG),
+        pr.get(prefix + PrTags.F_ID_TAG),
+        pr.get(prefix + PrTags.FB_TX_TAG),
+        pr.get(prefix + PrTags.META_INFO_TAG)
+    )
 
 
 def json_parse_pr(data):
-    data_list = []
     for pr in data.get(NetworkElementTags.PR_TAG.value) or []:
-        data_list.append(Broadcaster(
-            pr.get(prefix + PrTags.U_ID_TAG),
-            pr.get(prefix + PrTags.F_ID_TAG),
-            pr.get(prefix + PrTags.FB_TX_TAG),
-            pr.get(prefix + PrTags.META_INFO_TAG)
-        ))
-    return data_list
+        yield json_parse_pr_element(pr)
+
+
+def json_parse_res_element(res):
+    res = decode_json_attributes(NetworkElementTags.RES_TAG.value, res)
+    return Resource(
+        res.get(prefix + ResTags.RID_TAG),
+        res.get(prefix + ResTags.P_TAG),
+    )
 
 
 def json_parse_res(data):
-    data_list = []
     for res in data.get(NetworkElementTags.RES_TAG.value) or []:
-        data_list.append(Resource(
-            res.get(prefix + ResTags.RID_TAG),
-            res.get(prefix + ResTags.P_TAG),
-        ))
-    return data_list
+        yield json_parse_res_element(res)
+
+
+def json_parse_link_element(link):
+    link = decode_json_attributes(NetworkElementTags.LINK_TAG.value, link)
+    return Link(link.get(prefix + LinkTags.FROM_ID_TAG),
+                link.get(prefix + LinkTags.TO_ID_TAG),
+                link.get(prefix + LinkTags.FD_TAG),
+                link.get(prefix + LinkTags.TD_TAG),
+                link.get(prefix + LinkTags.LD_TAG)
+                )
 
 
 def json_parse_link(data):
-    data_list = []
     data = data.get(NetworkElementTags.LINK_TAG.value)
     if data is not None:
-        data_list.append(Link(data.get(prefix + LinkTags.FROM_ID_TAG),
-                              data.get(prefix + LinkTags.TO_ID_TAG),
-                              data.get(prefix + LinkTags.FD_TAG),
-                              data.get(prefix + LinkTags.TD_TAG),
-                              data.get(prefix + LinkTags.LD_TAG)
-                              ))
-    return data_list
+        yield json_parse_link_element(data)
+
+
+def json_parse_nsc_element(ncs):
+    ncs = decode_json_attributes(NetworkElementTags.NCS_TAG.value, ncs)
+    return Ncs(ncs.get(prefix + NcsTags.NC_ID_TAG),
+               ncs.get(prefix + NcsTags.N_TAG),
+               ncs.get(prefix + NcsTags.T_TAG)
+               )
 
 
 def json_parse_nsc(data):
-    data_list = [Ncs(data.get(NetworkElementTags.NCS_TAG.value).get(prefix + NcsTags.NC_ID_TAG),
-                     data.get(NetworkElementTags.NCS_TAG.value).get(prefix + NcsTags.N_TAG),
-                     data.get(NetworkElementTags.NCS_TAG.value).get(prefix + NcsTags.T_TAG)
-                     )]
-    return data_list
+    yield json_parse_nsc_element(data.get(NetworkElementTags.NCS_TAG.value))
 
 
 def json_parse_address(data):
@@ -146,8 +189,26 @@ def json_parse_address(data):
     return data_list
 
 
+# Parsing function of single element for each tag under <anim>
+json_element_parsers = {
+    NetworkElementTags.NODE_TAG.value: json_parse_node,
+    NetworkElementTags.NU_TAG.value: json_parse_nu_element,
+    NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value: json_parse_non_link_property,
+    NetworkElementTags.IP_TAG.value: json_parse_ip_element,
+    NetworkElementTags.IPV6_TAG.value: json_parse_ipv_element,
+    NetworkElementTags.P_TAG.value: json_parse_p_element,
+    NetworkElementTags.WPR_TAG.value: json_parse_wpr_element,
+    NetworkElementTags.PR_TAG.value: json_parse_pr_element,
+    NetworkElementTags.RES_TAG.value: json_parse_res_element,
+    NetworkElementTags.LINK_TAG.value: json_parse_link_element,
+    NetworkElementTags.NCS_TAG.value: json_parse_nsc_element,
+}
+
+
 class JsonParser(QThread):
     parsed_data_signal = pyqtSignal(object)
+    # Emitted at the end of a successful run, the parse result can be stored in the parse cache
+    parse_succeeded = pyqtSignal()
 
     def __init__(self, bottom_dock_widget):
         super().__init__()
@@ -160,7 +221,7 @@ class JsonParser(QThread):
         self.bottom_dock_widget.log('Json parser begin.')
         self.bottom_dock_widget.log('File path: {0}'.format(self.path))
         # Opening JSON file
-        f = open(self.path)
+        f = open_trace(self.path, 'r')
 
         # returns JSON object as
         # a dictionary
@@ -174,7 +235,7 @@ class JsonParser(QThread):
         anim = Anim(data.get(prefix + AnimTags.VER_TAG),
                     data.get(prefix + AnimTags.FILE_TYPE_TAG)
                     )
-        content = []
+        content = ColumnarTrace()
         content.extend(json_parse_nodes(data))
         content.extend(json_parse_nu(data))
         content.extend(json_parse_non_link_properties(data))
@@ -186,11 +247,12 @@ class JsonParser(QThread):
         content.extend(json_parse_res(data))
         content.extend(json_parse_link(data))
         content.extend(json_parse_nsc(data))
-        anim.content = content
+        anim.content = content.finish()
         # Closing file
         f.close()
         self.bottom_dock_widget.log('Json parser end.')
         self.parsed_data_signal.emit(anim)
+        self.parse_succeeded.emit()
 
     def parse(self, path, batch_size):
         self.path = path
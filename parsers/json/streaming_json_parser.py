@@ -0,0 +1,187 @@
+import json
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database.database import remove_database, close_thread_connections
+from database.ingest_queue import IngestQueue, default_queue_depth
+from network_elements.elements import Anim
+from network_elements.tags import NetworkElementTags, AnimTags
+from parsers.json.json_parser import json_element_parsers, prefix
+from utils.fileUtils import open_trace
+
+read_chunk_size = 1024 * 1024
+whitespace = ' \t\n\r'
+
+
+class JsonStreamReader:
+    """
+    Incremental reader of one JSON document.
+
+    Only a window of the file is held in memory: values are decoded one by one with raw_decode
+    and the consumed part of the buffer is dropped.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.file.read(read_chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop already consumed part of the buffer
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in whitespace:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON file.")
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(f"Expected '{character}' at position {self.position} of JSON buffer.")
+        self.position += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # Number at the end of buffer could continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def read_key(self):
+        key = self.read_value()
+        self.expect(':')
+        return key
+
+    def next_member(self, closing_character):
+        """Consumes separator after a member, returns False when the object or array is closed."""
+        character = self.peek()
+        self.position += 1
+        if character == ',':
+            return True
+        if character == closing_character:
+            return False
+        raise ValueError(f"Unexpected '{character}' in JSON file.")
+
+    def iter_array(self):
+        """Yields items of an array one by one, if value is not an array it is yielded as single item."""
+        if self.peek() != '[':
+            yield self.read_value()
+            return
+        self.position += 1
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.read_value()
+            if not self.next_member(']'):
+                return
+
+    def iter_object(self):
+        """Yields keys of an object, value of every key has to be consumed by the caller."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            yield self.read_key()
+            if not self.next_member('}'):
+                return
+
+
+def iter_anim(reader):
+    """Walks the anim object and yields (tag, value) for attributes and for every single element."""
+    for key in reader.iter_object():
+        if key != NetworkElementTags.ANIM_TAG.value:
+            reader.read_value()
+            continue
+        for tag in reader.iter_object():
+            if tag.startswith(prefix):
+                yield tag, reader.read_value()
+            else:
+                for element in reader.iter_array():
+                    yield tag, element
+
+
+class StreamingJsonParser(QThread):
+    update_status = pyqtSignal(int, int, float, str)
+    # Emitted at the end of a successful run, the parse result can be stored in the parse cache
+    parse_succeeded = pyqtSignal()
+
+    def __init__(self, bottom_dock_widget):
+        super().__init__()
+        self.batch_size = None
+        self.path = None
+        self.bottom_dock_widget = bottom_dock_widget
+        self.anim = None
+        self.none_type = None
+        self.queue_depth = default_queue_depth
+
+    def parse(self, path, batch_size):
+        self.path = path
+        self.batch_size = batch_size
+        self.start()
+
+    def run(self):
+        try:
+            remove_database()
+            self.bottom_dock_widget.log('Streaming json parser begin.')
+            self.bottom_dock_widget.log('File path: {0}'.format(self.path))
+
+            self.anim = Anim(None, None)
+            self.none_type = 0
+            batch = []
+
+            with IngestQueue(self.queue_depth, self.update_status.emit) as ingest_queue, \
+                    open_trace(self.path, 'r') as file:
+                for tag, value in iter_anim(JsonStreamReader(file)):
+                    if tag == prefix + AnimTags.VER_TAG:
+                        self.anim.ver = value
+                        continue
+                    if tag == prefix + AnimTags.FILE_TYPE_TAG:
+                        self.anim.file_type = value
+                        continue
+
+                    if value is None:
+                        continue
+                    element_parser = json_element_parsers.get(tag)
+                    if element_parser is None:
+                        self.none_type += 1
+                        self.bottom_dock_widget.log(f'Unknown tag in main content : {tag}')
+                        continue
+                    batch.append(element_parser(value))
+
+                    if len(batch) >= self.batch_size:
+                        ingest_queue.submit(batch)  # Waits when too many batches are not written yet
+                        batch = []
+
+                # Anim is saved once its attributes were read, they can follow the elements in the file
+                batch.append(self.anim)
+                # Save the remaining batch
+                ingest_queue.submit(batch)
+                ingest_queue.join()
+
+            self.anim = None
+            self.bottom_dock_widget.log(f'NoneType tags : {self.none_type}')
+            self.bottom_dock_widget.log('Streaming json parser end.')
+            self.parse_succeeded.emit()
+        finally:
+            close_thread_connections()
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+"""
+Cache of parse results, so reopening the same trace does not parse it again.
+
+Results are stored per content hash of the trace: database parsers ingest the trace directly into the
+database file of its entry, which is opened in place when the trace is opened again, parsers emitting data
+store a pickled snapshot of the parsed anim (with its ColumnarTrace).
+For every path the size and mtime are remembered, so the file is hashed only when it is opened for the
+first time or when it has changed. Changed files invalidate their old entry.
+
+Hashing and reading or writing snapshots take long for big traces, ParseCacheWorker does them in its own
+thread, the index is changed only by the thread owning ParseCache.
+"""
+
+cache_dir = "parse_cache"
+index_file_name = "index.json"
+hash_chunk_size = 4 * 1024 * 1024
+# Progress of hashing is reported in MiB, byte counts of big traces do not fit into int of a signal
+progress_unit = 1024 * 1024
+default_max_entries = 8
+
+database_kind = "database"
+columnar_kind = "columnar"
+
+
+def file_metadata(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def content_hash(path, progress=None):
+    """Returns hash of the file content, progress is called with the number of bytes hashed so far."""
+    digest = hashlib.blake2b(digest_size=16)
+    hashed = 0
+    with open(path, 'rb') as file:
+        while chunk := file.read(hash_chunk_size):
+            digest.update(chunk)
+            hashed += len(chunk)
+            if progress is not None:
+                progress(hashed)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory=cache_dir, max_entries=default_max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.index_path = os.path.join(directory, index_file_name)
+        self.entries = self.load_index()
+        # Paths of traces being parsed, added to the index when their result is stored
+        self.pending_paths = {}
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(temporary_path, self.index_path)
+
+    def lookup(self, path, kind):
+        """
+        Returns (key, cached file) of the trace found by its path, size and mtime without reading it.
+
+        Returns (None, None) when the path is not known or the file has changed, the trace has to be hashed
+        and looked up by lookup_hash.
+        """
+        path = os.path.abspath(path)
+        metadata = file_metadata(path)
+
+        changed = False
+        for key, entry in list(self.entries.items()):
+            paths = entry['paths']
+            if path not in paths or entry['kind'] != kind:
+                continue
+            if paths[path] == metadata and os.path.exists(entry['file']):
+                return key, self.touch(key)
+            # File was changed since it was cached
+            del paths[path]
+            if not paths:
+                self.remove_entry(key)
+            changed = True
+        if changed:
+            self.save_index()
+        return None, None
+
+    def lookup_hash(self, path, kind, digest):
+        """
+        Returns (key, cached file) for the trace with content hash digest, cached file is None when there is
+        no valid entry. Key identifies the trace content and is used to store the result after parsing.
+        """
+        path = os.path.abspath(path)
+        metadata = file_metadata(path)
+
+        key = f"{digest}.{kind}"
+        entry = self.entries.get(key)
+        if entry is not None and os.path.exists(entry['file']):
+            # Same content opened from another path
+            entry['paths'][path] = metadata
+            cached_file = self.touch(key)
+            self.save_index()
+            return key, cached_file
+        if self.entries.pop(key, None) is not None:
+            self.save_index()
+        self.pending_paths[key] = (path, metadata)
+        return key, None
+
+    def touch(self, key):
+        # Use time of a hit is saved with the next change of the index, a hit alone does not rewrite it
+        entry = self.entries[key]
+        entry['last_used'] = time.time()
+        return entry['file']
+
+    def remove_entry(self, key):
+        entry = self.entries.pop(key)
+        if os.path.exists(entry['file']):
+            os.remove(entry['file'])
+
+    def add_entry(self, key, kind, cached_file):
+        path, metadata = self.pending_paths.pop(key)
+        self.entries[key] = {'kind': kind, 'file': cached_file, 'paths': {path: metadata}, 'last_used': time.time()}
+
+        # Evict least recently used results
+        while len(self.entries) > self.max_entries:
+            self.remove_entry(min(self.entries, key=lambda entry_key: self.entries[entry_key]['last_used']))
+        self.save_index()
+
+    def database_file(self, key):
+        """Returns the database file of the entry, database parsers ingest the trace directly into it."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, key + '.db')
+
+    def snapshot_file(self, key):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, key + '.pickle')
+
+
+def write_snapshot(anim, cached_file):
+    """Writes a snapshot of the parsed anim."""
+    temporary_path = cached_file + '.tmp'
+    with open(temporary_path, 'wb') as snapshot_file:
+        pickle.dump(anim, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, cached_file)
+
+
+def read_snapshot(cached_file):
+    with open(cached_file, 'rb') as snapshot_file:
+        return pickle.load(snapshot_file)
+
+
+class ParseCacheWorker(QThread):
+    """Hashes traces and reads or writes snapshots one task after another, results are emitted as signals."""
+    update_status = pyqtSignal(int, int, float, str)
+    # Path of the trace and its content hash
+    trace_hashed = pyqtSignal(str, str)
+    snapshot_loaded = pyqtSignal(object)
+    # Key, kind and file of the stored entry
+    snapshot_stored = pyqtSignal(str, str, str)
+    # Path of the file and the error
+    failed = pyqtSignal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.tasks = deque()
+        self.lock = threading.Lock()
+        self.running = False
+
+    def hash_trace(self, path):
+        self.submit(self.run_hash, path)
+
+    def load_snapshot(self, cached_file):
+        self.submit(self.run_load, cached_file)
+
+    def store_snapshot(self, key, anim, cached_file):
+        self.submit(self.run_store, key, anim, cached_file)
+
+    def submit(self, task, *args):
+        with self.lock:
+            self.tasks.append((task, args))
+            if self.running:
+                return
+            self.running = True
+        # Thread may be still returning from its previous run
+        self.wait()
+        self.start()
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.tasks:
+                    self.running = False
+                    return
+                task, args = self.tasks.popleft()
+            try:
+                task(*args)
+            except (OSError, EOFError, pickle.PickleError) as e:
+                self.failed.emit(args[-1], str(e))
+
+    def run_hash(self, path):
+        total = max(1, os.path.getsize(path) // progress_unit)
+        start_time = time.perf_counter()
+
+        def progress(hashed):
+            self.update_status.emit(hashed // progress_unit, total, time.perf_counter() - start_time,
+                                    "Hashing trace:")
+
+        self.trace_hashed.emit(path, content_hash(path, progress))
+
+    def run_load(self, cached_file):
+        self.snapshot_loaded.emit(read_snapshot(cached_file))
+
+    def run_store(self, key, anim, cached_file):
+        write_snapshot(anim, cached_file)
+        self.snapshot_stored.emit(key, columnar_kind, cached_file)
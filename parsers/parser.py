@@ -1,3 +1,9 @@
+from database.database import set_database_path, working_db_path
+from database.ingest_queue import default_queue_depth
+from parsers.parse_cache import ParseCache, ParseCacheWorker, database_kind, columnar_kind
+from utils.fileUtils import get_compression, strip_compression
+
+
 class ParserAPI:
     def __init__(self):
         super().__init__()
@@ -5,11 +11,32 @@ class ParserAPI:
         self.active_parsers = {}
         self.data = None
         self.batch_size = 150000
+        self.queue_depth = default_queue_depth
+        self.parse_cache = ParseCache()
+        self.use_parse_cache = True
+        # Hashing and snapshots of the cache run in the worker thread, its results are handled in this thread
+        self.parse_cache_worker = ParseCacheWorker()
+        self.parse_cache_worker.trace_hashed.connect(self.on_trace_hashed)
+        self.parse_cache_worker.snapshot_loaded.connect(self.on_snapshot_loaded)
+        self.parse_cache_worker.snapshot_stored.connect(self.parse_cache.add_entry)
+        self.parse_cache_worker.failed.connect(self.on_cache_failed)
+        # Parser and path of the trace waiting for the worker, and the file the worker reads for it
+        self.pending_parse = None
+        # Cache key of the trace being parsed, its result is stored when the parser finishes
+        self.cache_key = None
+        # Cache key of the trace parsed to the database, it identifies the trace in DatabaseCatalog
+        self.trace_key = None
+        # Opens the processed steps of a cached trace in place, returns False when they are not in the catalog
+        self.processed_steps_callback = None
 
     def register_parser(self, file_type, parser, name):
         if file_type not in self.parsers:
             self.parsers[file_type] = {}
         self.parsers[file_type][name] = parser
+        # Result is stored only when the whole trace was parsed, finished is emitted also after a failed run
+        parser.parse_succeeded.connect(lambda: self.store_parse_result(parser))
+        if hasattr(parser, 'parsed_data_signal'):
+            parser.parsed_data_signal.connect(self.set_parsed_data)
 
         # Set the first registered parser for a file type as the active parser by default
         if file_type not in self.active_parsers:
@@ -21,19 +48,131 @@ class ParserAPI:
 
         self.active_parsers[file_type] = self.parsers[file_type][name]
 
-    def parse_file(self, file_path):
+    def parse_file(self, file_path, follow=False):
         file_type = self.get_file_type(file_path)
 
         if file_type not in self.active_parsers:
             raise ValueError(f"No active parser set for file type: {file_type}")
 
         parser = self.active_parsers[file_type]
+        if follow and not hasattr(parser, 'follow'):
+            raise ValueError(f"Parser {type(parser).__name__} does not support follow mode")
+        if follow and get_compression(file_path):
+            raise ValueError("Compressed file can not be followed")
+        if hasattr(parser, 'follow'):
+            parser.follow = follow
+
+        # Connections to the database of the previous trace are closed, the parser writes to the working one
+        set_database_path(working_db_path)
+
+        self.cache_key = None
+        self.trace_key = None
+        self.pending_parse = None
+        if hasattr(parser, 'queue_depth'):
+            parser.queue_depth = self.queue_depth
+        # File which is still written can not be cached
+        if not self.use_parse_cache or follow:
+            return self.start_parser(parser, file_path)
+
+        key, cached_file = self.parse_cache.lookup(file_path, self.get_cache_kind(parser))
+        if key is None:
+            # Trace is hashed in the worker thread, on_trace_hashed continues
+            self.pending_parse = (parser, file_path, file_path)
+            self.parse_cache_worker.hash_trace(file_path)
+            return None
+        return self.use_cache_entry(parser, file_path, key, cached_file)
+
+    def on_trace_hashed(self, file_path, digest):
+        # Another trace was opened while this one was hashed
+        if self.pending_parse is None or self.pending_parse[2] != file_path:
+            return
+        parser, _, _ = self.pending_parse
+        self.pending_parse = None
+        key, cached_file = self.parse_cache.lookup_hash(file_path, self.get_cache_kind(parser), digest)
+        self.use_cache_entry(parser, file_path, key, cached_file)
+
+    def on_cache_failed(self, path, error):
+        if self.pending_parse is None or self.pending_parse[2] != path:
+            return
+        parser, file_path, _ = self.pending_parse
+        self.pending_parse = None
+        parser.bottom_dock_widget.log(f'Parse cache failed for {path}: {error}')
+        # Trace is parsed without the cache
+        self.start_parser(parser, file_path)
+
+    def use_cache_entry(self, parser, file_path, key, cached_file):
+        if self.get_cache_kind(parser) == database_kind:
+            self.trace_key = key
+        if cached_file is not None:
+            parser.bottom_dock_widget.log(f'Parse result loaded from cache: {cached_file}')
+            return self.restore_parse_result(parser, file_path, cached_file)
+
+        self.cache_key = key
+        if self.get_cache_kind(parser) == database_kind:
+            # Parser ingests the trace directly into the database of the cache entry, it is not copied afterwards
+            set_database_path(self.parse_cache.database_file(key))
+        return self.start_parser(parser, file_path)
+
+    def start_parser(self, parser, file_path):
         self.data = parser.parse(file_path, self.batch_size)
         return self.data
 
+    @staticmethod
+    def get_cache_kind(parser):
+        # Parsers emitting parsed data keep it in memory, the others ingest it to the database
+        return columnar_kind if hasattr(parser, 'parsed_data_signal') else database_kind
+
+    def restore_parse_result(self, parser, file_path, cached_file):
+        self.data = None
+        if self.get_cache_kind(parser) == database_kind:
+            # Cached database is opened in place, with its processed steps when the catalog has them
+            set_database_path(cached_file)
+            if self.processed_steps_callback is not None:
+                self.processed_steps_callback(self.trace_key)
+        else:
+            # Snapshot is read in the worker thread, on_snapshot_loaded emits it
+            self.pending_parse = (parser, file_path, cached_file)
+            self.parse_cache_worker.load_snapshot(cached_file)
+        return self.data
+
+    def on_snapshot_loaded(self, data):
+        if self.pending_parse is None:
+            return
+        parser, _, _ = self.pending_parse
+        self.pending_parse = None
+        self.data = data
+        parser.parsed_data_signal.emit(data)
+
+    def set_parsed_data(self, data):
+        self.data = data
+
+    def store_parse_result(self, parser):
+        if self.cache_key is None:
+            return
+        if self.get_cache_kind(parser) == database_kind:
+            # Trace was ingested into the file of the entry
+            self.parse_cache.add_entry(self.cache_key, database_kind, self.parse_cache.database_file(self.cache_key))
+        elif self.data is not None:
+            self.parse_cache_worker.store_snapshot(self.cache_key, self.data,
+                                                   self.parse_cache.snapshot_file(self.cache_key))
+        self.cache_key = None
+
+    def stop_following(self):
+        for parsers in self.parsers.values():
+            for parser in parsers.values():
+                if hasattr(parser, 'stop_following'):
+                    parser.stop_following()
+
     def set_batch_size(self, batch_size):
         self.batch_size = batch_size
 
+    def set_queue_depth(self, queue_depth):
+        self.queue_depth = queue_depth
+
+    def set_processed_steps_callback(self, callback):
+        self.processed_steps_callback = callback
+
     @staticmethod
     def get_file_type(file_path):
-        return file_path.split('.')[-1].lower()
+        # trace.xml.gz is parsed by the xml parser
+        return strip_compression(file_path).split('.')[-1].lower()
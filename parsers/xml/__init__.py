@@ -1 +1 @@
-__all__ = ['dom', 'tree_element']
+__all__ = ['dom', 'line_tokenizer', 'parallel_tree_element', 'tree_element']
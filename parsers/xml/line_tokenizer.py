@@ -0,0 +1,192 @@
+import html
+import re
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from lxml import etree
+
+from database.database import remove_database, close_thread_connections
+from database.ingest_queue import IngestQueue, default_queue_depth
+from network_elements.elements import (
+    Anim, Link, Ncs, Node, NonP2pLinkProperties, NodeUpdate, WiredPacket, Broadcaster, Resource,
+    WirelessPacketReception
+)
+from network_elements.schema import decode_attributes, get_decoder
+from network_elements.tags import NetworkElementTags, AnimTags, NodeTags, NuTags, NonP2pLinkPropertiesTags, NcsTags, \
+    PTags, WprTags, PrTags, ResTags, LinkTags
+from parsers.xml.tree_element import parse_tag
+from utils.fileUtils import open_trace
+
+"""
+Almost every element in NetAnim trace is a flat element like <p .../> or <wpr .../> written on its own line.
+Their attributes are read directly from the raw bytes; nested elements (<ip>, <ipv6>) fall back to lxml.
+"""
+
+# Element class and the attributes passed to its constructor, in the same order as in parse_tag
+flat_elements = {
+    NetworkElementTags.NODE_TAG.value: (Node, (NodeTags.ID_TAG, NodeTags.SYS_ID_TAG, NodeTags.LOC_X_TAG,
+                                               NodeTags.LOC_Y_TAG, NodeTags.LOC_Z_TAG)),
+    NetworkElementTags.NU_TAG.value: (NodeUpdate, (NuTags.P_TAG, NuTags.T_TAG, NuTags.ID_TAG, NuTags.COLOR_R_TAG,
+                                                   NuTags.COLOR_G_TAG, NuTags.COLOR_B_TAG, NuTags.WIDTH_TAG,
+                                                   NuTags.HEIGHT_TAG, NuTags.COORD_X_TAG, NuTags.COORD_Y_TAG,
+                                                   NuTags.COORD_Z_TAG, NuTags.DESCRIPTION_TAG)),
+    NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value: (NonP2pLinkProperties, (
+        NonP2pLinkPropertiesTags.ID_TAG, NonP2pLinkPropertiesTags.IP_ADDRESS_TAG,
+        NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG)),
+    NetworkElementTags.NCS_TAG.value: (Ncs, (NcsTags.NC_ID_TAG, NcsTags.N_TAG, NcsTags.T_TAG)),
+    NetworkElementTags.P_TAG.value: (WiredPacket, (PTags.FROM_ID_TAG, PTags.FB_TX_TAG, PTags.LB_TX_TAG,
+                                                   PTags.META_INFO_TAG, PTags.TO_ID_TAG, PTags.FB_RX_TAG,
+                                                   PTags.LB_RX_TAG)),
+    NetworkElementTags.WPR_TAG.value: (WirelessPacketReception, (WprTags.U_ID_TAG, WprTags.T_ID_TAG,
+                                                                 WprTags.FB_RX_TAG, WprTags.LB_RX_TAG)),
+    NetworkElementTags.PR_TAG.value: (Broadcaster, (PrTags.U_ID_TAG, PrTags.F_ID_TAG, PrTags.FB_TX_TAG,
+                                                    PrTags.META_INFO_TAG)),
+    NetworkElementTags.RES_TAG.value: (Resource, (ResTags.RID_TAG, ResTags.P_TAG)),
+    NetworkElementTags.LINK_TAG.value: (Link, (LinkTags.FROM_ID_TAG, LinkTags.TO_ID_TAG, LinkTags.FD_TAG,
+                                               LinkTags.TD_TAG, LinkTags.LD_TAG)),
+}
+
+tag_pattern = re.compile(rb'<([\w:.-]+)')
+attribute_pattern = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def compile_element_pattern(tag, attribute_names):
+    """
+    NetAnim writes attributes of an element always in the same order, so one match of this pattern
+    returns all constructor arguments at once (every value has one group per quote type).
+    """
+    attributes = r'\s+'.join(r'{0}\s*=\s*(?:"([^"]*)"|\'([^\']*)\')'.format(re.escape(name))
+                             for name in attribute_names)
+    return re.compile(r'<{0}\s+{1}\s*/>'.format(re.escape(tag), attributes))
+
+
+element_patterns = {tag: compile_element_pattern(tag, attribute_names)
+                    for tag, (_, attribute_names) in flat_elements.items()}
+element_decoders = {tag: [get_decoder(tag, name) for name in attribute_names]
+                    for tag, (_, attribute_names) in flat_elements.items()}
+
+
+def unescape(value):
+    return value if '&' not in value else html.unescape(value)
+
+
+def read_attributes(raw_element):
+    text = raw_element.decode()
+    equals = text.find('=')
+    quote = text[equals + 1:equals + 2]
+    if equals != -1 and quote in ('"', "'"):
+        # Usually all attributes of an element are quoted the same way: name="value" name="value" ...
+        parts = text.split(quote)
+        names = parts[0:-1:2]
+        if '=' not in parts[-1] and all(name.endswith('=') for name in names):
+            return {name.rsplit(None, 1)[-1][:-1]: unescape(value) for name, value in zip(names, parts[1::2])}
+
+    return {name: unescape(double_quoted or single_quoted)
+            for name, double_quoted, single_quoted in attribute_pattern.findall(text)}
+
+
+def tokenize_element(tag, raw_element):
+    flat_element = flat_elements.get(tag)
+    if flat_element is None:
+        # Nested or unknown elements are parsed by lxml
+        return parse_tag(etree.fromstring(raw_element))
+
+    element_class, attribute_names = flat_element
+    match = element_patterns[tag].match(raw_element.decode())
+    if match is not None:
+        values = match.groups()
+        return element_class(*[decode(unescape(double_quoted if double_quoted is not None else single_quoted))
+                               for decode, double_quoted, single_quoted
+                               in zip(element_decoders[tag], values[0::2], values[1::2])])
+
+    # Some attributes are missing or in different order (e.g. <nu> has different attributes per update type)
+    attributes = decode_attributes(tag, read_attributes(raw_element))
+    return element_class(*[attributes.get(name) for name in attribute_names])
+
+
+def is_element_complete(tag, raw_element):
+    end = raw_element.rstrip()
+    if tag in flat_elements:
+        return end.endswith(b'/>')
+    if end.endswith(b'/>') and raw_element.count(b'<') == 1:
+        return True
+    return end.endswith(b'</' + tag.encode() + b'>')
+
+
+class LineTokenizerXmlParser(QThread):
+    update_status = pyqtSignal(int, int, float, str)
+    # Emitted at the end of a successful run, the parse result can be stored in the parse cache
+    parse_succeeded = pyqtSignal()
+
+    def __init__(self, bottom_dock_widget):
+        super().__init__()
+        self.batch_size = None
+        self.xml_file_path = None
+        self.bottom_dock_widget = bottom_dock_widget
+        self.anim = None
+        self.none_type = None
+        self.queue_depth = default_queue_depth
+
+    def parse(self, xml_file_path, batch_size):
+        self.xml_file_path = xml_file_path
+        self.batch_size = batch_size
+        self.start()
+
+    def run(self):
+        try:
+            remove_database()
+            self.bottom_dock_widget.log('Xml line tokenizer parser begin.')
+            self.bottom_dock_widget.log('File path: {0}'.format(self.xml_file_path))
+
+            self.none_type = 0
+            batch = []
+            raw_element = b''
+            tag = None
+
+            with IngestQueue(self.queue_depth, self.update_status.emit) as ingest_queue, \
+                    open_trace(self.xml_file_path) as file:
+                for line in file:
+                    if raw_element:
+                        raw_element += line
+                    else:
+                        stripped = line.lstrip()
+                        # Skip empty lines, closing tags, comments and xml declaration
+                        if not stripped.startswith(b'<') or stripped[1:2] in (b'/', b'?', b'!'):
+                            continue
+                        tag = tag_pattern.match(stripped).group(1).decode()
+                        if tag == NetworkElementTags.ANIM_TAG.value:
+                            attributes = read_attributes(stripped)
+                            self.anim = Anim(attributes.get(AnimTags.VER_TAG), attributes.get(AnimTags.FILE_TYPE_TAG))
+                            continue
+                        raw_element = stripped
+
+                    # Element can continue on the next lines (e.g. <pr> with long meta-info)
+                    if not is_element_complete(tag, raw_element):
+                        continue
+
+                    item = tokenize_element(tag, raw_element)
+                    raw_element = b''
+
+                    if item is None:
+                        self.none_type += 1
+                        print(f'Unknown tag in main content : {tag}')
+                    else:
+                        batch.append(item)
+
+                    if len(batch) >= self.batch_size:
+                        ingest_queue.submit(batch)  # Waits when too many batches are not written yet
+                        batch = []
+
+                # Anim is saved like the tree parser saves it, after its elements
+                if self.anim is not None:
+                    batch.append(self.anim)
+                # Save the remaining batch
+                if batch:
+                    ingest_queue.submit(batch)
+                ingest_queue.join()
+
+            self.anim = None
+            self.bottom_dock_widget.log(f'NoneType tags : {self.none_type}')
+            self.bottom_dock_widget.log('Xml line tokenizer parser end.')
+            self.parse_succeeded.emit()
+        finally:
+            close_thread_connections()
@@ -0,0 +1,363 @@
+import heapq
+import os
+import pickle
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from lxml import etree
+
+from database.database import get_database_path, remove_database, close_thread_connections
+from database.ingest_queue import IngestQueue, default_queue_depth
+from network_elements.elements import NodeUpdate, WiredPacket, Broadcaster, WirelessPacketReception
+from network_elements.tags import NetworkElementTags
+from parsers.xml.tree_element import parse_tag
+from utils.fileUtils import get_compression, open_trace
+
+"""
+NetAnim writes every element under <anim> as a self-contained element starting on its own line,
+so the file can be cut into byte ranges on line boundaries and every range parsed on its own.
+
+Workers write the elements of every range sorted by time into a run file and the parser thread merges
+the runs as a stream, so neither the workers nor the parser hold the parsed trace in memory.
+"""
+
+read_chunk_size = 1024 * 1024
+root_search_size = 64 * 1024
+compressed_piece_size = 16 * 1024 * 1024
+byte_range_size = 16 * 1024 * 1024
+run_chunk_size = 4096
+max_open_runs = 256
+
+
+def element_time(item):
+    """Returns the simulation time of an element used to merge the ranges back into global time order."""
+    match item:
+        case NodeUpdate():
+            value = item.time
+        case WiredPacket() | Broadcaster():
+            value = item.first_byte_transmission_time
+        case WirelessPacketReception():
+            value = item.first_byte_received_time
+        case _:
+            # Static elements (nodes, links, addresses...) do not have time and go first
+            return float('-inf')
+    return value if value is not None else float('-inf')
+
+
+def find_content_range(xml_file_path):
+    """Returns the root start tag and the byte range between <anim ...> and </anim>."""
+    file_size = os.path.getsize(xml_file_path)
+    with open(xml_file_path, 'rb') as file:
+        head = file.read(root_search_size)
+        root_start = head.find(b'<' + NetworkElementTags.ANIM_TAG.value.encode())
+        if root_start == -1:
+            raise ValueError(f"Root element <{NetworkElementTags.ANIM_TAG.value}> not found in: {xml_file_path}")
+        root_end = head.find(b'>', root_start) + 1
+        root_tag = head[root_start:root_end]
+
+        file.seek(max(file_size - root_search_size, 0))
+        tail = file.read()
+        closing_tag = tail.rfind(b'</' + NetworkElementTags.ANIM_TAG.value.encode())
+        content_end = file_size - len(tail) + closing_tag if closing_tag != -1 else file_size
+
+    return root_tag, root_end, content_end
+
+
+def is_element_start(line):
+    """Checks if the line opens a top-level element (nested <address> lines and closing tags do not)."""
+    stripped = line.lstrip()
+    return (stripped.startswith(b'<')
+            and not stripped.startswith(b'</')
+            and not stripped.startswith(b'<' + NetworkElementTags.ADDRESS_TAG.value.encode()))
+
+
+def split_byte_ranges(xml_file_path, start, end, parts):
+    """Splits the content of the file into at most `parts` byte ranges, each beginning with an element start."""
+    boundaries = [start]
+    with open(xml_file_path, 'rb') as file:
+        for part in range(1, parts):
+            target = start + (end - start) * part // parts
+            if target <= boundaries[-1]:
+                continue
+            file.seek(target)
+            # Skip the rest of the line we landed in
+            file.readline()
+            boundary = end
+            while True:
+                position = file.tell()
+                line = file.readline()
+                if not line or position >= end:
+                    break
+                if is_element_start(line):
+                    boundary = position
+                    break
+            if boundaries[-1] < boundary < end:
+                boundaries.append(boundary)
+    boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_byte_range(xml_file_path, start, end):
+    with open(xml_file_path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(read_chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def read_root_tag(file):
+    """Reads the stream up to the end of <anim ...> tag, returns the tag and already read content after it."""
+    head = b''
+    root_start = -1
+    while root_start == -1 or head.find(b'>', root_start) == -1:
+        chunk = file.read(read_chunk_size)
+        if not chunk:
+            raise ValueError(f"Root element <{NetworkElementTags.ANIM_TAG.value}> not found")
+        head += chunk
+        root_start = head.find(b'<' + NetworkElementTags.ANIM_TAG.value.encode())
+    root_end = head.find(b'>', root_start) + 1
+    return head[root_start:root_end], head[root_end:]
+
+
+def split_stream(file, content, piece_size):
+    """
+    Splits the rest of a stream (e.g. decompressed trace) into pieces of about piece_size bytes,
+    every piece begins with an element start like the byte ranges of a plain file.
+    """
+    closing_tag = b'</' + NetworkElementTags.ANIM_TAG.value.encode()
+    eof = False
+    while not eof:
+        while len(content) < piece_size:
+            chunk = file.read(read_chunk_size)
+            if not chunk:
+                eof = True
+                break
+            content += chunk
+
+        if eof:
+            closing = content.rfind(closing_tag)
+            yield content[:closing] if closing != -1 else content
+            return
+
+        # Find the last line which starts an element and cut the content before it
+        cut = len(content)
+        while True:
+            cut = content.rfind(b'\n', 0, cut - 1)
+            if cut <= 0:
+                cut = -1
+                break
+            line_end = content.find(b'\n', cut + 1)
+            if line_end != -1 and is_element_start(content[cut + 1:line_end]):
+                break
+        if cut == -1:
+            # Element longer than one piece, read more
+            piece_size *= 2
+            continue
+        yield content[:cut + 1]
+        content = content[cut + 1:]
+
+
+def write_run(items, run_path):
+    """Writes sorted elements to a run file as pickled chunks of run_chunk_size elements."""
+    with open(run_path, 'wb') as file:
+        for index in range(0, len(items), run_chunk_size):
+            pickle.dump(items[index:index + run_chunk_size], file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(run_path):
+    """Yields the elements of a run file, only one chunk is held in memory."""
+    with open(run_path, 'rb') as file:
+        while True:
+            try:
+                chunk = pickle.load(file)
+            except EOFError:
+                return
+            yield from chunk
+
+
+def merge_runs(run_paths, run_path):
+    """Merges sorted runs into one run, elements with the same time keep the order of the runs."""
+    with open(run_path, 'wb') as file:
+        chunk = []
+        for item in heapq.merge(*(read_run(path) for path in run_paths), key=element_time):
+            chunk.append(item)
+            if len(chunk) >= run_chunk_size:
+                pickle.dump(chunk, file, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, file, pickle.HIGHEST_PROTOCOL)
+    for path in run_paths:
+        os.remove(path)
+
+
+def parse_byte_range(xml_file_path, start, end, run_path):
+    """Parses the top-level elements of one byte range into a sorted run, returns unknown tags and the run."""
+    items, none_type = parse_chunks(read_byte_range(xml_file_path, start, end))
+    write_run(items, run_path)
+    return none_type, run_path
+
+
+def parse_piece(piece, run_path):
+    """Parses one piece of a decompressed stream into a sorted run, returns unknown tags and the run."""
+    items, none_type = parse_chunks([piece])
+    write_run(items, run_path)
+    return none_type, run_path
+
+
+def bounded_results(executor, calls, limit):
+    """
+    Submits the calls (function and its arguments) while at most `limit` of them are running or waiting,
+    yields their results in the order of submission.
+    """
+    pending = deque()
+    for call in calls:
+        pending.append(executor.submit(*call))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_chunks(chunks):
+    """
+    Parses the top-level elements of consecutive chunks with the same mapping as ElementTreeXmlParser.
+
+    The content is wrapped in a synthetic root element so that lxml sees a well-formed document.
+    Returns the elements sorted by time and the number of unknown tags.
+    """
+    root_tag = NetworkElementTags.ANIM_TAG.value.encode()
+    parser = etree.XMLPullParser(events=("start", "end"))
+    parser.feed(b'<' + root_tag + b'>')
+
+    items = []
+    none_type = 0
+    depth = 0
+
+    def handle_events():
+        nonlocal depth, none_type
+        for event, selected_tag in parser.read_events():
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            # Only direct children of the root are elements, nested ones are parsed by their parent
+            if depth != 1:
+                continue
+            item = parse_tag(selected_tag)
+            if item is None:
+                none_type += 1
+            else:
+                items.append(item)
+
+            selected_tag.clear()
+            while selected_tag.getprevious() is not None:
+                del selected_tag.getparent()[0]
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        handle_events()
+
+    parser.feed(b'</' + root_tag + b'>')
+    parser.close()
+    handle_events()
+
+    items.sort(key=element_time)
+    return items, none_type
+
+
+class ParallelElementTreeXmlParser(QThread):
+    update_status = pyqtSignal(int, int, float, str)
+    # Emitted at the end of a successful run, the parse result can be stored in the parse cache
+    parse_succeeded = pyqtSignal()
+
+    def __init__(self, bottom_dock_widget):
+        super().__init__()
+        self.batch_size = None
+        self.xml_file_path = None
+        self.bottom_dock_widget = bottom_dock_widget
+        self.anim = None
+        self.none_type = None
+        self.queue_depth = default_queue_depth
+        self.workers = os.cpu_count() or 1
+
+    def parse(self, xml_file_path, batch_size):
+        self.xml_file_path = xml_file_path
+        self.batch_size = batch_size
+        self.start()
+
+    def run(self):
+        try:
+            remove_database()
+            self.bottom_dock_widget.log('Xml parallel treeElement parser begin.')
+            self.bottom_dock_widget.log('File path: {0}'.format(self.xml_file_path))
+
+            self.none_type = 0
+            batch = []
+
+            # Runs are written next to the database, the system temporary directory may be too small for them
+            run_dir = os.path.dirname(os.path.abspath(get_database_path()))
+            # Parse workers feed the single database writer
+            with tempfile.TemporaryDirectory(dir=run_dir) as run_dir, \
+                    ProcessPoolExecutor(max_workers=self.workers) as executor, \
+                    IngestQueue(self.queue_depth, self.update_status.emit) as ingest_queue:
+                if get_compression(self.xml_file_path):
+                    # Compressed stream can not be seeked, it is decompressed here and pieces are sent to the workers,
+                    # the next piece is decompressed only when a worker is free
+                    self.bottom_dock_widget.log(f'Parsing decompressed pieces on {self.workers} workers.')
+                    with open_trace(self.xml_file_path) as file:
+                        root_tag, content = read_root_tag(file)
+                        calls = ((parse_piece, piece, os.path.join(run_dir, f'{index}.run'))
+                                 for index, piece in enumerate(split_stream(file, content, compressed_piece_size)))
+                        run_paths = self.collect_runs(executor, calls, run_dir)
+                else:
+                    root_tag, content_start, content_end = find_content_range(self.xml_file_path)
+                    # Many small ranges keep the workers busy until the end and their runs small
+                    parts = max(self.workers, -(-(content_end - content_start) // byte_range_size))
+                    byte_ranges = split_byte_ranges(self.xml_file_path, content_start, content_end, parts)
+                    self.bottom_dock_widget.log(f'Parsing {len(byte_ranges)} byte ranges on {self.workers} workers.')
+                    calls = ((parse_byte_range, self.xml_file_path, start, end, os.path.join(run_dir, f'{index}.run'))
+                             for index, (start, end) in enumerate(byte_ranges))
+                    run_paths = self.collect_runs(executor, calls, run_dir)
+                self.anim = parse_tag(etree.fromstring(root_tag + b'</' + NetworkElementTags.ANIM_TAG.value.encode() + b'>'))
+
+                # Every run is already sorted, merge them back into global time order
+                for item in heapq.merge(*(read_run(path) for path in run_paths), key=element_time):
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        ingest_queue.submit(batch)  # Waits when too many batches are not written yet
+                        batch = []
+
+                # Anim is saved like the tree parser saves it, after its elements
+                batch.append(self.anim)
+                # Save the remaining batch
+                ingest_queue.submit(batch)
+                ingest_queue.join()
+
+            self.anim = None
+            self.bottom_dock_widget.log(f'NoneType tags : {self.none_type}')
+            self.bottom_dock_widget.log('Xml parallel TreeElement parser end.')
+            self.parse_succeeded.emit()
+        finally:
+            close_thread_connections()
+
+    def collect_runs(self, executor, calls, run_dir):
+        """
+        Runs the parse calls with at most workers * 2 of them submitted at a time and returns their runs in order.
+        When there are max_open_runs of them, they are merged into one, so the final merge does not open too many.
+        """
+        run_paths = []
+        for index, (none_type, run_path) in enumerate(bounded_results(executor, calls, self.workers * 2)):
+            self.none_type += none_type
+            run_paths.append(run_path)
+            if len(run_paths) >= max_open_runs:
+                # Runs are merged in file order, so equal times keep their order in the trace
+                merged_run = os.path.join(run_dir, f'{index}.merged.run')
+                merge_runs(run_paths, merged_run)
+                run_paths = [merged_run]
+        return run_paths
@@ -1,111 +1,123 @@
-from concurrent.futures import ProcessPoolExecutor
-
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, pyqtSignal
 from lxml import etree
 
-from database.database import process_batch, remove_database
+from database.database import process_batch, remove_database, close_thread_connections
+from database.ingest_queue import IngestQueue, default_queue_depth
 from network_elements.elements import (
     Address, Anim, Ip, IpV6, Link, Ncs, Node, NonP2pLinkProperties,
     NodeUpdate, WiredPacket, Broadcaster, Resource, WirelessPacketReception
 )
+from network_elements.schema import decode_attributes
 from network_elements.tags import NetworkElementTags, AnimTags, NodeTags, NuTags, NonP2pLinkPropertiesTags, AddressTags, \
     IpTags, IpV6Tags, NcsTags, PTags, WprTags, PrTags, ResTags, LinkTags
+from utils.fileUtils import open_trace
+
+follow_read_chunk_size = 1024 * 1024
+# Milliseconds to wait for new data when the end of a followed file is reached
+follow_poll_interval = 500
 
 
 def parse_tag(selected_tag):
+    attributes = decode_attributes(selected_tag.tag, selected_tag.attrib)
     match selected_tag.tag:
         case NetworkElementTags.ANIM_TAG.value:
-            return Anim(selected_tag.attrib.get(AnimTags.VER_TAG),
-                        selected_tag.attrib.get(AnimTags.FILE_TYPE_TAG)
+            return Anim(attributes.get(AnimTags.VER_TAG),
+                        attributes.get(AnimTags.FILE_TYPE_TAG)
                         )
 
         case NetworkElementTags.NODE_TAG.value:
-            return Node(selected_tag.attrib.get(NodeTags.ID_TAG),
-                        selected_tag.attrib.get(NodeTags.SYS_ID_TAG),
-                        selected_tag.attrib.get(NodeTags.LOC_X_TAG),
-                        selected_tag.attrib.get(NodeTags.LOC_Y_TAG),
-                        selected_tag.attrib.get(NodeTags.LOC_Z_TAG)
+            return Node(attributes.get(NodeTags.ID_TAG),
+                        attributes.get(NodeTags.SYS_ID_TAG),
+                        attributes.get(NodeTags.LOC_X_TAG),
+                        attributes.get(NodeTags.LOC_Y_TAG),
+                        attributes.get(NodeTags.LOC_Z_TAG)
                         )
 
         case NetworkElementTags.NU_TAG.value:
-            return NodeUpdate(selected_tag.attrib.get(NuTags.P_TAG),
-                              selected_tag.attrib.get(NuTags.T_TAG),
-                              selected_tag.attrib.get(NuTags.ID_TAG),
-                              selected_tag.attrib.get(NuTags.COLOR_R_TAG),
-                              selected_tag.attrib.get(NuTags.COLOR_G_TAG),
-                              selected_tag.attrib.get(NuTags.COLOR_B_TAG),
-                              selected_tag.attrib.get(NuTags.WIDTH_TAG),
-                              selected_tag.attrib.get(NuTags.HEIGHT_TAG),
-                              selected_tag.attrib.get(NuTags.COORD_X_TAG),
-                              selected_tag.attrib.get(NuTags.COORD_Y_TAG),
-                              selected_tag.attrib.get(NuTags.COORD_Z_TAG),
-                              selected_tag.attrib.get(NuTags.DESCRIPTION_TAG),
+            return NodeUpdate(attributes.get(NuTags.P_TAG),
+                              attributes.get(NuTags.T_TAG),
+                              attributes.get(NuTags.ID_TAG),
+                              attributes.get(NuTags.COLOR_R_TAG),
+                              attributes.get(NuTags.COLOR_G_TAG),
+                              attributes.get(NuTags.COLOR_B_TAG),
+                              attributes.get(NuTags.WIDTH_TAG),
+                              attributes.get(NuTags.HEIGHT_TAG),
+                              attributes.get(NuTags.COORD_X_TAG),
+                              attributes.get(NuTags.COORD_Y_TAG),
+                              attributes.get(NuTags.COORD_Z_TAG),
+                              attributes.get(NuTags.DESCRIPTION_TAG),
                               )
 
         case NetworkElementTags.NONP2PLINKPROPERTIES_TAG.value:
-            return NonP2pLinkProperties(selected_tag.attrib.get(NonP2pLinkPropertiesTags.ID_TAG),
-                                        selected_tag.attrib.get(NonP2pLinkPropertiesTags.IP_ADDRESS_TAG),
-                                        selected_tag.attrib.get(NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG)
+            return NonP2pLinkProperties(attributes.get(NonP2pLinkPropertiesTags.ID_TAG),
+                                        attributes.get(NonP2pLinkPropertiesTags.IP_ADDRESS_TAG),
+                                        attributes.get(NonP2pLinkPropertiesTags.CHANNEL_TYPE_TAG)
                                         )
         case NetworkElementTags.IP_TAG.value:
             addresses = selected_tag.findall(NetworkElementTags.ADDRESS_TAG.value)
             addresses_list = []
             for address in addresses:
                 addresses_list.append(Address(address.text))
-            return Ip(selected_tag.attrib.get(IpTags.N_TAG), addresses_list)
+            return Ip(attributes.get(IpTags.N_TAG), addresses_list)
 
         case NetworkElementTags.IPV6_TAG.value:
             addresses = selected_tag.findall(NetworkElementTags.ADDRESS_TAG.value)
             addresses_list = []
             for _ in addresses:
-                addresses_list.append(Address(selected_tag.attrib.get(AddressTags.IP_ADDRESS_TAG)))
-            return IpV6(selected_tag.attrib.get(IpV6Tags.N_TAG), addresses_list)
+                addresses_list.append(Address(attributes.get(AddressTags.IP_ADDRESS_TAG)))
+            return IpV6(attributes.get(IpV6Tags.N_TAG), addresses_list)
 
         case NetworkElementTags.ADDRESS_TAG.value:
             return Address(selected_tag.text)
 
         case NetworkElementTags.NCS_TAG.value:
-            return Ncs(selected_tag.attrib.get(NcsTags.NC_ID_TAG),
-                       selected_tag.attrib.get(NcsTags.N_TAG),
-                       selected_tag.attrib.get(NcsTags.T_TAG)
+            return Ncs(attributes.get(NcsTags.NC_ID_TAG),
+                       attributes.get(NcsTags.N_TAG),
+                       attributes.get(NcsTags.T_TAG)
                        )
 
         case NetworkElementTags.P_TAG.value:
-            return WiredPacket(selected_tag.attrib.get(PTags.FROM_ID_TAG),
-                               selected_tag.attrib.get(PTags.FB_TX_TAG),
-                               selected_tag.attrib.get(PTags.LB_TX_TAG),
-                               selected_tag.attrib.get(PTags.META_INFO_TAG),
-                               selected_tag.attrib.get(PTags.TO_ID_TAG),
-                               selected_tag.attrib.get(PTags.FB_RX_TAG),
-                               selected_tag.attrib.get(PTags.LB_RX_TAG)
+            return WiredPacket(attributes.get(PTags.FROM_ID_TAG),
+                               attributes.get(PTags.FB_TX_TAG),
+                               attributes.get(PTags.LB_TX_TAG),
+                               attributes.get(PTags.META_INFO_TAG),
+                               attributes.get(PTags.TO_ID_TAG),
+                               attributes.get(PTags.FB_RX_TAG),
+                               attributes.get(PTags.LB_RX_TAG)
                                )
 
         case NetworkElementTags.WPR_TAG.value:
-            return WirelessPacketReception(selected_tag.attrib.get(WprTags.U_ID_TAG),
-                                           selected_tag.attrib.get(WprTags.T_ID_TAG),
-                                           selected_tag.attrib.get(WprTags.FB_RX_TAG),
-                                           selected_tag.attrib.get(WprTags.LB_RX_TAG)
+            return WirelessPacketReception(attributes.get(WprTags.U_ID_TAG),
+                                           attributes.get(WprTags.T_ID_TAG),
+                                           attributes.get(WprTags.FB_RX_TAG),
+                                           attributes.get(WprTags.LB_RX_TAG)
                                            )
         case NetworkElementTags.PR_TAG.value:
-            return Broadcaster(selected_tag.attrib.get(PrTags.U_ID_TAG),
-                               selected_tag.attrib.get(PrTags.F_ID_TAG),
-                               selected_tag.attrib.get(PrTags.FB_TX_TAG),
-                               selected_tag.attrib.get(PrTags.META_INFO_TAG)
+            return Broadcaster(attributes.get(PrTags.U_ID_TAG),
+                               attributes.get(PrTags.F_ID_TAG),
+                               attributes.get(PrTags.FB_TX_TAG),
+                               attributes.get(PrTags.META_INFO_TAG)
                                )
         case NetworkElementTags.RES_TAG.value:
-            return Resource(selected_tag.attrib.get(ResTags.RID_TAG),
-                            selected_tag.attrib.get(ResTags.P_TAG)
+            return Resource(attributes.get(ResTags.RID_TAG),
+                            attributes.get(ResTags.P_TAG)
                             )
         case NetworkElementTags.LINK_TAG.value:
-            return Link(selected_tag.attrib.get(LinkTags.FROM_ID_TAG),
-                        selected_tag.attrib.get(LinkTags.TO_ID_TAG),
-                        selected_tag.attrib.get(LinkTags.FD_TAG),
-                        selected_tag.attrib.get(LinkTags.TD_TAG),
-                        selected_tag.attrib.get(LinkTags.LD_TAG)
+            return Link(attributes.get(LinkTags.FROM_ID_TAG),
+                        attributes.get(LinkTags.TO_ID_TAG),
+                        attributes.get(LinkTags.FD_TAG),
+                        attributes.get(LinkTags.TD_TAG),
+                        attributes.get(LinkTags.LD_TAG)
                         )
 
 
 class ElementTreeXmlParser(QThread):
+    # Elements saved to the database in follow mode
+    elements_appended = pyqtSignal(object)
+    update_status = pyqtSignal(int, int, float, str)
+    # Emitted at the end of a successful run, the parse result can be stored in the parse cache
+    parse_succeeded = pyqtSignal()
+
     def __init__(self, bottom_dock_widget):
         super().__init__()
         self.batch_size = None
@@ -113,50 +125,135 @@ class ElementTreeXmlParser(QThread):
         self.bottom_dock_widget = bottom_dock_widget
         self.anim = None
         self.none_type = None
+        self.queue_depth = default_queue_depth
+        self.follow = False
+        self.following = False
 
     def parse(self, xml_file_path, batch_size):
         self.xml_file_path = xml_file_path
         self.batch_size = batch_size
         self.start()
 
+    def stop_following(self):
+        self.following = False
+
     def run(self):
-        remove_database()
-        self.bottom_dock_widget.log('Xml treeElement parser begin.')
-        self.bottom_dock_widget.log('File path: {0}'.format(self.xml_file_path))
+        try:
+            if self.follow:
+                self.run_follow()
+                return
+
+            remove_database()
+            self.bottom_dock_widget.log('Xml treeElement parser begin.')
+            self.bottom_dock_widget.log('File path: {0}'.format(self.xml_file_path))
+
+            file = open_trace(self.xml_file_path)
+            context = etree.iterparse(file, events=("start", "end"))
+            event, root = next(context)
+
+            self.anim = parse_tag(root)
+
+            self.none_type = 0
+            batch = []
+
+            with IngestQueue(self.queue_depth, self.update_status.emit) as ingest_queue, file:
+                for event, selected_tag in context:
+                    if event == "end":
+                        item = parse_tag(selected_tag)
+
+                        if item is None:
+                            self.none_type += 1
+                            print(f'Unknown tag in main content : {item}')
+                        else:
+                            batch.append(item)
+
+                        if len(batch) >= self.batch_size:
+                            ingest_queue.submit(batch)  # Waits when too many batches are not written yet
+                            batch = []
+
+                        # Clear the selected_tag and remove it from the tree to save memory
+                        selected_tag.clear()
+                        while selected_tag.getprevious() is not None:
+                            del selected_tag.getparent()[0]
+
+                # Save the remaining batch
+                if batch:
+                    ingest_queue.submit(batch)
+                ingest_queue.join()
 
-        context = etree.iterparse(self.xml_file_path, events=("start", "end"))
-        event, root = next(context)
+            self.anim = None
+            self.bottom_dock_widget.log(f'NoneType tags : {self.none_type}')
+            self.bottom_dock_widget.log('Xml TreeElement parser end.')
+            self.parse_succeeded.emit()
+        finally:
+            close_thread_connections()
 
-        self.anim = parse_tag(root)
+    def run_follow(self):
+        """
+        Follows the file while it is written by a running simulation.
 
+        Only newly appended bytes are read and fed to the pull parser, so missing </anim> is not an error.
+        Every complete element is saved to the database and announced by elements_appended.
+        Following ends when </anim> is read or when stop_following is called.
+        """
+        remove_database()
+        self.bottom_dock_widget.log('Xml treeElement parser follow begin.')
+        self.bottom_dock_widget.log('File path: {0}'.format(self.xml_file_path))
+
+        parser = etree.XMLPullParser(events=("start", "end"))
         self.none_type = 0
+        self.following = True
         batch = []
+        depth = 0
+        closed = False
 
-        with ProcessPoolExecutor() as executor:
-            for event, selected_tag in context:
-                if event == "end":
-                    item = parse_tag(selected_tag)
+        def flush():
+            nonlocal batch
+            if batch:
+                process_batch(batch)
+                self.elements_appended.emit(batch)
+                batch = []
+
+        with open(self.xml_file_path, 'rb') as file:
+            while self.following and not closed:
+                chunk = file.read(follow_read_chunk_size)
+                if not chunk:
+                    # Wait for the simulation to write more
+                    flush()
+                    self.msleep(follow_poll_interval)
+                    continue
 
+                parser.feed(chunk)
+                for event, selected_tag in parser.read_events():
+                    if event == "start":
+                        depth += 1
+                        if depth == 1:
+                            self.anim = parse_tag(selected_tag)
+                        continue
+                    depth -= 1
+                    if depth == 0:
+                        closed = True
+                        break
+                    # Nested elements are parsed by their parent
+                    if depth != 1:
+                        continue
+
+                    item = parse_tag(selected_tag)
                     if item is None:
                         self.none_type += 1
-                        print(f'Unknown tag in main content : {item}')
+                        print(f'Unknown tag in main content : {selected_tag.tag}')
                     else:
                         batch.append(item)
 
-                    if len(batch) >= self.batch_size:
-                        executor.submit(process_batch,
-                                        batch.copy())  # Submit the batch processing task to the process pool
-                        batch = []
-
-                    # Clear the selected_tag and remove it from the tree to save memory
                     selected_tag.clear()
                     while selected_tag.getprevious() is not None:
                         del selected_tag.getparent()[0]
 
-            # Save the remaining batch
-            if batch:
-                process_batch(batch)
+                    if len(batch) >= self.batch_size:
+                        flush()
+            flush()
 
+        self.following = False
         self.anim = None
         self.bottom_dock_widget.log(f'NoneType tags : {self.none_type}')
-        self.bottom_dock_widget.log('Xml TreeElement parser end.')
+        self.bottom_dock_widget.log('Xml TreeElement parser follow end.')
@@ -0,0 +1,75 @@
+import numpy as np
+
+from step.step import WiredPacketStep, WirelessPacketReceptionStep
+from utils.calcUtils import interpolate_coordinates_3D
+
+"""
+Substeps of a packet are fully determined by its endpoints, times and the number of steps, they are computed
+the same way when they are generated for the steps table and when they are interpolated from one packet row.
+packet_substep_columns computes the substeps of many packets at once with numpy, with the same floating point
+operations, so its values are equal to those of packet_substep.
+"""
+
+# Substeps of packets in columnar form, packet is the index of the packet in the arrays of packet_substep_columns
+substep_column_dtype = np.dtype([
+    ('packet', np.int64), ('step_number', np.int32), ('time', np.float64), ('loc_x', np.float64),
+    ('loc_y', np.float64), ('loc_z', np.float64),
+])
+
+
+def substep_time(start_time, end_time, step, num_steps):
+    return start_time + (step * (end_time - start_time) / (num_steps - 1))
+
+
+def packet_substep(is_wired, num_steps, step, packet_id, from_id, to_id, start_time, end_time, meta_info, src,
+                   dst=None):
+    """
+    Returns substep `step` of a packet moving from src to dst coordinates.
+
+    Packet without destination node (to_id -1) moves away from its source, dst is ignored.
+    """
+    if to_id == -1:
+        drop_packet_constant = (5 * step)
+        dst = (src[0] + drop_packet_constant, src[1] + drop_packet_constant, src[2] + drop_packet_constant)
+
+    time_step = substep_time(start_time, end_time, step, num_steps)
+    x, y, z = interpolate_coordinates_3D(src, dst, step, num_steps)
+
+    if is_wired:
+        return WiredPacketStep(time_step, packet_id, from_id, to_id, start_time, end_time, meta_info, step, x, y, z)
+    return WirelessPacketReceptionStep(time_step, packet_id, from_id, to_id, start_time, end_time, step, x, y, z,
+                                       meta_info)
+
+
+def packet_substep_columns(start_times, end_times, src, dst, dropped, num_steps):
+    """
+    Returns all substeps of packets as one array of substep_column_dtype, substeps of a packet follow each other.
+
+    Arguments have one item per packet: start and end times, (x, y, z) rows of the source and destination with
+    NaN for a missing coordinate and whether the packet has no destination node (to_id -1).
+    """
+    start_times = np.asarray(start_times, dtype=np.float64)
+    end_times = np.asarray(end_times, dtype=np.float64)
+    src = np.asarray(src, dtype=np.float64).reshape(-1, 3)
+    dst = np.asarray(dst, dtype=np.float64).reshape(-1, 3)
+    dropped = np.asarray(dropped, dtype=bool)
+    steps = np.arange(num_steps)
+    fraction = steps / (num_steps - 1)
+
+    columns = np.empty((len(start_times), num_steps), dtype=substep_column_dtype)
+    columns['packet'] = np.arange(len(start_times))[:, None]
+    columns['step_number'] = steps
+    columns['time'] = start_times[:, None] + (steps * (end_times - start_times)[:, None] / (num_steps - 1))
+    for axis, name in enumerate(('loc_x', 'loc_y', 'loc_z')):
+        source = src[:, axis, None]
+        locations = source + fraction * (dst[:, axis, None] - source)
+        # Missing coordinate of the destination is the source one
+        missing = np.isnan(dst[:, axis])
+        locations[missing] = source[missing]
+        # Dropped packet moves away from its source by 5 in every coordinate per step
+        dropped_source = source[dropped]
+        locations[dropped] = dropped_source + fraction * ((dropped_source + 5 * steps) - dropped_source)
+        columns[name] = locations
+    # Missing z is 0 like in the step objects
+    columns['loc_z'][np.isnan(columns['loc_z'])] = 0
+    return columns.ravel()
@@ -0,0 +1,77 @@
+import numpy as np
+
+"""
+Positions of nodes over time.
+
+Position updates of every node are kept sorted by time in numpy arrays, after the initial position of the node,
+so the position of a node at any time is found by binary search instead of replaying the updates in order.
+Positions of many (node, time) pairs are looked up in one call with one searchsorted per node.
+"""
+
+
+class NodeTimeline:
+    def __init__(self):
+        # Node id -> (times, positions (n, 3)), the initial position has time -inf, missing coordinate is NaN
+        self.timelines = {}
+
+    @classmethod
+    def from_rows(cls, nodes, updates):
+        """Returns timeline of nodes (id, x, y, z) and their position updates (time, id, x, y, z)."""
+        timeline = cls()
+        timeline.add_nodes(nodes)
+        timeline.add_updates(updates)
+        return timeline
+
+    def __contains__(self, node_id):
+        return node_id in self.timelines
+
+    def add_nodes(self, nodes):
+        for node_id, x, y, z in nodes:
+            self.timelines[node_id] = (np.array([-np.inf]), np.array([[x, y, z]], dtype=np.float64))
+
+    def add_updates(self, updates):
+        """
+        Adds position updates, updates with the same time are applied in the order they are added.
+        Updates of nodes which are not in the timeline are ignored.
+        """
+        grouped = {}
+        for time, node_id, x, y, z in updates:
+            if node_id in self.timelines:
+                grouped.setdefault(node_id, []).append((time, x, y, z))
+        for node_id, rows in grouped.items():
+            rows = np.array(rows, dtype=np.float64)
+            times, positions = self.timelines[node_id]
+            times = np.concatenate((times, rows[:, 0]))
+            positions = np.concatenate((positions, rows[:, 1:]))
+            order = np.argsort(times, kind='stable')
+            self.timelines[node_id] = (times[order], positions[order])
+
+    def nodes_at(self, time):
+        """Returns (id, x, y, z) of all nodes at time, they seed the timeline of a part of the trace."""
+        node_ids = list(self.timelines)
+        positions = self.positions_at(node_ids, np.full(len(node_ids), time))
+        return [(node_id, *position) for node_id, position in zip(node_ids, positions.tolist())]
+
+    def positions_at(self, node_ids, times):
+        """
+        Returns (n, 3) array of positions of the nodes at the times, including updates at the same time.
+        Position of a node which is not in the timeline is NaN.
+        """
+        node_ids = np.asarray(node_ids)
+        times = np.asarray(times, dtype=np.float64)
+        positions = np.full((len(node_ids), 3), np.nan)
+        if len(node_ids) == 0:
+            return positions
+
+        # Queries are grouped by node, every group is answered by one binary search
+        order = np.argsort(node_ids, kind='stable')
+        group_ids, group_starts = np.unique(node_ids[order], return_index=True)
+        group_ends = np.append(group_starts[1:], len(order))
+        for node_id, start, end in zip(group_ids.tolist(), group_starts, group_ends):
+            timeline = self.timelines.get(node_id)
+            if timeline is None:
+                continue
+            node_times, node_positions = timeline
+            queries = order[start:end]
+            positions[queries] = node_positions[np.searchsorted(node_times, times[queries], side='right') - 1]
+        return positions
@@ -0,0 +1,97 @@
+import sqlite3
+import uuid
+
+import numpy as np
+
+from database.database import set_worker_database_path, get_node_position_updates, merge_packet_events, \
+    create_step_tables, insert_packet_rows, insert_packet_substeps
+from network_elements.elements import WiredPacket
+from step.interpolation import packet_substep_columns
+from step.node_timeline import NodeTimeline
+
+"""
+Packets of the database path are kept as rows (step_type, packet_id, from_id, to_id, start time, end time,
+meta_info) and saved in batches, positions of their endpoints are looked up in a NodeTimeline when they are saved.
+
+Rows do not depend on each other, so the packets can be cut into parts by their reception time and every part
+generated in its own worker process (generate_partition), seeded with the positions of the nodes at its start.
+"""
+
+
+def packet_row(packet, node_timeline):
+    """
+    Returns the row of a wired packet or reception, None for a packet sent to its source or a reception whose
+    broadcast is unknown (no transmission time).
+    """
+    to_id = packet.to_id if packet.to_id in node_timeline else -1
+    if packet.from_id == to_id or packet.first_byte_transmission_time is None:
+        return None
+    return (1 if isinstance(packet, WiredPacket) else 3, str(uuid.uuid4()), packet.from_id, to_id,
+            packet.first_byte_transmission_time, packet.first_byte_received_time, packet.meta_info)
+
+
+def row_length(row, packet_steps, interpolate_packets):
+    """Number of rows save_packet_rows writes for the row, the packet or its substeps."""
+    return 1 if interpolate_packets else packet_steps[row[0]]
+
+
+def save_packet_rows(rows, node_timeline, packet_steps, interpolate_packets, conn=None):
+    """
+    Inserts packets of rows with positions of their endpoints, or their substeps generated by packet_substep_columns
+    with wired packets first. packet_steps is step type -> number of substeps of its packets.
+    """
+    # Packet event is processed at its reception time, the endpoints are where the nodes are at that time
+    end_times = [row[5] for row in rows]
+    src = node_timeline.positions_at([row[2] for row in rows], end_times)
+    dst = node_timeline.positions_at([row[3] for row in rows], end_times)
+    if interpolate_packets:
+        insert_packet_rows([(*row, *source, *destination)
+                            for row, source, destination in zip(rows, src.tolist(), dst.tolist())], conn)
+        return
+
+    step_types = np.array([row[0] for row in rows])
+    for step_type, num_steps in packet_steps.items():
+        selected = step_types == step_type
+        if not selected.any():
+            continue
+        selected_rows = [row for row, is_selected in zip(rows, selected.tolist()) if is_selected]
+        columns = packet_substep_columns([row[4] for row in selected_rows], [row[5] for row in selected_rows],
+                                         src[selected], dst[selected], [row[3] == -1 for row in selected_rows],
+                                         num_steps)
+        insert_packet_substeps(step_type, selected_rows, columns, conn)
+
+
+def generate_partition(elements_path, partition_path, time_range, nodes, packet_steps, interpolate_packets,
+                       batch_size):
+    """
+    Runs in a worker process, generates steps of packets received in time_range (start, end) from the elements
+    at elements_path into a new database at partition_path (see append_partition_steps). nodes are (id, x, y, z)
+    of all nodes at the start time. Returns the number of packets.
+    """
+    set_worker_database_path(elements_path)
+    node_timeline = NodeTimeline.from_rows(nodes, get_node_position_updates(time_range))
+
+    conn = sqlite3.connect(partition_path)
+    cursor = conn.cursor()
+    create_step_tables(cursor)
+    cursor.close()
+
+    packets = 0
+    rows = []
+    length = 0
+    for packet in merge_packet_events(batch_size, time_range):
+        row = packet_row(packet, node_timeline)
+        if row is None:
+            continue
+        rows.append(row)
+        length += row_length(row, packet_steps, interpolate_packets)
+        if length >= batch_size:
+            save_packet_rows(rows, node_timeline, packet_steps, interpolate_packets, conn)
+            packets += len(rows)
+            rows = []
+            length = 0
+    if rows:
+        save_packet_rows(rows, node_timeline, packet_steps, interpolate_packets, conn)
+        packets += len(rows)
+    conn.close()
+    return packets
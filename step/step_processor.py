@@ -1,29 +1,45 @@
-import copy
 import datetime
+import multiprocessing
+import os
 import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 from PyQt5.QtCore import pyqtSignal, QThread
 from tqdm import tqdm
 
 from database.database import insert_node_updates_to_steps, get_all_nodes, \
-    update_wireless_packet_reception_fb_tx, clear_steps, insert_steps_to_database, get_data, get_data_length
+    update_wireless_packet_reception_fb_tx, clear_steps, merge_events, get_data_length, \
+    insert_node_update_steps, order_steps, get_animation_length, use_wal_journal, \
+    get_longest_event_duration, count_steps_before, set_database_path, get_database_path, get_elements_path, \
+    get_node_position_updates, get_packet_time_cuts, append_partition_steps, BroadcastJoin, complete_reception, \
+    close_thread_connections
+from database.catalog import DatabaseCatalog
 from network_elements.elements import WiredPacket, Node, NodeUpdate, WirelessPacketReception, Broadcaster
+from network_elements.trace import ColumnarTrace
 from step.step import WiredPacketStep, NodeUpdateStep, WirelessPacketReceptionStep
 from step.step_enum import StepType, NodeUpdateType
-from utils.calcUtils import interpolate_coordinates_3D
+from step.interpolation import packet_substep, packet_substep_columns
+from step.node_timeline import NodeTimeline
+from step.packet_rows import packet_row, row_length, save_packet_rows, generate_partition
 from utils.manage import get_objects_by_type
 
 
 class StepProcessor(QThread):
     data_processed = pyqtSignal(object)
     update_status = pyqtSignal(int, int, float, str)
+    # Size of the steps table after steps of followed file were appended
+    steps_appended = pyqtSignal(int)
+    # Number of steps before the committed watermark while steps are processed progressively
+    steps_committed = pyqtSignal(int)
 
     def __init__(self, bottom_dock_widget):
 
         super().__init__()
         self.data = None
-        self.node_dict = None
+        # Positions of nodes over time in the database path
+        self.node_timeline = NodeTimeline()
         self.batch_size = 1500000
         self.database_batch_size = 1500000
         self.bottom_dock_widget = bottom_dock_widget
@@ -39,26 +55,87 @@ class StepProcessor(QThread):
         self.radius_constant = 2
         self.end_time_constant = 0.000010
         self.optimized_parser = False
+        # Packets are stored as one row, their substeps are interpolated during the animation
+        self.interpolate_packets = False
+        # Packets of the database path, their substeps are generated at once when the rows are saved
+        self.packet_rows = []
+        # Number of rows save_packet_rows writes for packet_rows, packets or their substeps
+        self.packet_rows_length = 0
+        # Steps are played while they are processed, up to the committed watermark
+        self.progressive = False
+        self.longest_event_duration = 0.0
+        # Worker processes generating steps of parts of the trace, 1 generates them in this thread
+        self.workers = 1
+        # Processed steps of traces are kept per trace and settings, select_database is called before processing
+        self.catalog = DatabaseCatalog()
+        self.trace_key = None
+        # Steps of the selected catalog file are already processed
+        self.steps_processed = False
+        # Recent broadcasts of followed file joined with their receptions, older ones are read from the database
+        self.broadcasts = BroadcastJoin()
+        # Steps tables of the followed file are created (see start_following)
+        self.following_steps_created = False
 
     def run(self):
-        result = None
-        if self.data is not None:
-            self.data = self.data.content
-        if self.optimized_parser:
-            self.process_steps_with_sql_calls()
-        else:
-            result = self.process_steps_without_sql_calls(self.data)
-        self.data_processed.emit(result)
+        try:
+            result = None
+            if self.data is not None:
+                self.data = self.data.content
+            if self.optimized_parser:
+                self.process_steps_with_sql_calls()
+            else:
+                result = self.process_steps_without_sql_calls(self.data)
+            self.data_processed.emit(result)
+        finally:
+            close_thread_connections()
+
+    def open_processed_steps(self, trace_key):
+        """
+        Opens the catalog file with steps of the trace processed with the current settings in place, returns False
+        when there is none. Called in the main thread, the file of the elements is attached to it.
+        """
+        entry = self.catalog.lookup(trace_key, self.output_settings())
+        if entry is None:
+            return False
+        # Already opened with the trace
+        if entry[0] != get_database_path():
+            set_database_path(*entry)
+            self.bottom_dock_widget.log(f'Processed steps loaded from catalog: {entry[0]}')
+        return True
+
+    def select_database(self, trace_key):
+        """
+        Selects the database the steps of the trace are processed to, called in the main thread before start.
+        Without trace_key the steps are processed in the current database.
+        """
+        self.trace_key = trace_key
+        if trace_key is None:
+            # Steps of a catalog file are replaced, its entry no longer matches them
+            self.catalog.invalidate(get_database_path())
+        self.steps_processed = trace_key is not None and self.open_processed_steps(trace_key)
+        if trace_key is not None and not self.steps_processed:
+            # Steps are processed to a new file with the elements attached, databases of other settings stay ready
+            set_database_path(self.catalog.prepare(trace_key, self.output_settings()), get_elements_path())
 
     def process_steps_with_sql_calls(self):
+        if self.steps_processed:
+            return
+
         # Insert the processed data into the steps table
         # Define the query
 
-        clear_steps()
+        if self.progressive:
+            use_wal_journal()
+        clear_steps(self.interpolate_packets)
         self.process_node_update()
         self.update_wireless_packet_reception()
         self.process_optimised_data()
-        # Close the database connection
+        if self.progressive:
+            self.steps_committed.emit(get_animation_length(self.packet_steps()))
+        if not self.interpolate_packets:
+            self.order_steps()
+        if self.trace_key is not None:
+            self.catalog.add(self.trace_key, self.output_settings(), get_database_path(), get_elements_path())
 
     def process_steps_without_sql_calls(self, data, node_data=None):
         """
@@ -70,6 +147,9 @@ class StepProcessor(QThread):
         Returns:
         - A sorted list of all substeps for the provided data
         """
+        if isinstance(data, ColumnarTrace):
+            return self.process_columnar_steps(data)
+
         self.bottom_dock_widget.log("Processing of steps begin.")
         # Get the node_object data, node_object update data, and wired packet_object data from the content of the
         # provided data
@@ -90,48 +170,137 @@ class StepProcessor(QThread):
         # Sort the combined data by time
         combined_data.sort(key=sorting_key)
 
-        # Create a copy of the node_object data to update
-        updated_node_data = copy.deepcopy(node_data)
         wireless_packet_max_time_map = {}
 
         for item in wireless_packet_data:
             if item.unique_id not in wireless_packet_max_time_map or item.first_byte_received_time \
                     > wireless_packet_max_time_map[item.unique_id]:
                 wireless_packet_max_time_map[item.unique_id] = item.first_byte_received_time
+        return self.generate_substeps(combined_data, node_data)
+
+    def process_columnar_steps(self, trace):
+        """
+        Same as process_steps_without_sql_calls for data stored in ColumnarTrace.
+
+        Steps are generated from the numpy columns, positions of the nodes come from a NodeTimeline and substeps of
+        all packets of a type are computed at once by packet_substep_columns, only the steps are created as objects.
+        """
+        self.bottom_dock_widget.log("Processing of columnar steps begin.")
+        nodes = trace.get_array(Node)
+        node_updates = trace.get_array(NodeUpdate)[trace.time_order(NodeUpdate)]
+        update_times = np.nan_to_num(node_updates['time'], nan=0.0)
+        # Node is moved by every update with both x and y
+        moves = ~np.isnan(node_updates['x']) & ~np.isnan(node_updates['y'])
+        node_timeline = NodeTimeline.from_rows(
+            zip(nodes['id'].tolist(), nodes['loc_x'].tolist(), nodes['loc_y'].tolist(), nodes['loc_z'].tolist()),
+            zip(update_times[moves].tolist(), node_updates['id'][moves].tolist(), node_updates['x'][moves].tolist(),
+                node_updates['y'][moves].tolist(), node_updates['z'][moves].tolist()))
+
+        node_update_steps = self.substeps[StepType.NODE_UPDATE]
+        updates = trace.get_values(node_updates, NodeUpdate)
+        for p, update_time, node_id, r, g, b, w, h, x, y, z, descr in zip(*updates.values()):
+            node_update_steps.append(NodeUpdateStep(time=update_time, update_type=NodeUpdateType[p.upper()],
+                                                    node_id=node_id, red=r, green=g, blue=b, width=w, height=h,
+                                                    loc_x=x, loc_y=y, loc_z=z, description=descr))
+
+        # Packets refer to the nodes by their index in the node list
+        node_ids = nodes['id']
+        wired_packets = trace.get_array(WiredPacket)[trace.time_order(WiredPacket)]
+        meta_infos = [trace.strings.decode(code) for code in wired_packets['meta_info'].tolist()]
+        self.generate_columnar_packet_substeps(StepType.WIRED_PACKET, self.num_steps_wired_packet_animation,
+                                               wired_packets['first_byte_transmission_time'],
+                                               wired_packets['first_byte_received_time'],
+                                               node_ids[wired_packets['from_id']], node_ids[wired_packets['to_id']],
+                                               meta_infos, wired_packets['first_byte_transmission_time'], node_timeline)
+
+        broadcasters = trace.get_array(Broadcaster)[trace.time_order(Broadcaster)]
+        broadcaster_rows = {unique_id: row for row, unique_id in enumerate(broadcasters['unique_id'].tolist())}
+        receptions = trace.get_array(WirelessPacketReception)[trace.time_order(WirelessPacketReception)]
+        rows = np.array([broadcaster_rows.get(unique_id, -1) for unique_id in receptions['unique_id'].tolist()],
+                        dtype=np.int64)
+        # Receptions of unknown broadcasts are skipped
+        receptions, rows = receptions[rows >= 0], rows[rows >= 0]
+        self.generate_columnar_packet_substeps(StepType.WIRELESS_PACKET_RECEPTION,
+                                               self.num_steps_wireless_packet_reception,
+                                               broadcasters['first_byte_transmission_time'][rows],
+                                               receptions['first_byte_received_time'],
+                                               node_ids[broadcasters['from_id'][rows]], node_ids[receptions['to_id']],
+                                               [""] * len(receptions), receptions['first_byte_received_time'],
+                                               node_timeline)
+        return self.sorted_substeps()
+
+    def generate_columnar_packet_substeps(self, step_type, num_steps, start_times, end_times, from_ids, to_ids,
+                                          meta_infos, event_times, node_timeline):
+        """
+        Same as generate_wired_packet_substeps for columns of packets in time order, the endpoints are the positions
+        of the nodes at event_times. Packets sent to their source are skipped.
+        """
+        selected = from_ids != to_ids
+        event_times = np.nan_to_num(event_times[selected], nan=0.0)
+        from_ids, to_ids = from_ids[selected], to_ids[selected]
+        start_times, end_times = start_times[selected], end_times[selected]
+        meta_infos = [meta_info for meta_info, is_selected in zip(meta_infos, selected.tolist()) if is_selected]
+        columns = packet_substep_columns(start_times, end_times, node_timeline.positions_at(from_ids, event_times),
+                                         node_timeline.positions_at(to_ids, event_times),
+                                         np.zeros(len(from_ids), dtype=bool), num_steps)
+
+        packet_ids = [uuid.uuid4() for _ in range(len(from_ids))]
+        packets = list(zip(packet_ids, from_ids.tolist(), to_ids.tolist(), start_times.tolist(), end_times.tolist(),
+                           meta_infos))
+        substeps = self.substeps[step_type]
+        for packet, step_number, time_step, x, y, z in zip(columns['packet'].tolist(), columns['step_number'].tolist(),
+                                                           columns['time'].tolist(), columns['loc_x'].tolist(),
+                                                           columns['loc_y'].tolist(), columns['loc_z'].tolist()):
+            packet_id, from_id, to_id, start_time, end_time, meta_info = packets[packet]
+            if step_type == StepType.WIRED_PACKET:
+                substeps.append(WiredPacketStep(time_step, packet_id, from_id, to_id, start_time, end_time, meta_info,
+                                                step_number, x, y, z))
+            else:
+                substeps.append(WirelessPacketReceptionStep(time_step, packet_id, from_id, to_id, start_time,
+                                                            end_time, step_number, x, y, z, meta_info))
+
+    def generate_substeps(self, combined_data, node_data):
+        """
+        Generates substeps for time ordered elements and returns all of them sorted by time. Endpoints of a packet
+        are the positions of the nodes when the packet comes in combined_data, they are looked up in a NodeTimeline
+        of node_data and the node updates.
+        """
+        node_timeline = NodeTimeline.from_rows(
+            ((node.id, node.loc_x, node.loc_y, node.loc_z) for node in node_data),
+            ((sorting_key(item), item.id, item.x, item.y, item.z) for item in combined_data
+             if isinstance(item, NodeUpdate) and item.x is not None and item.y is not None))
+
         broadcaster_transmitted = {}
-        # Loop through the combined data and generate substeps for each item
+        # (number of steps, start time, end time, from id, to id, meta info, is wired, time in combined_data)
+        packets = []
         for item in combined_data:
             if isinstance(item, NodeUpdate):
-                # If the item is a NodeUpdate, update the position of the corresponding node_object and add a
-                # NodeUpdateStep Find the node_object with the matching ID in updated_node_data
-                node = next((node for node in updated_node_data if node.id == item.id), None)
-
-                # If the node_object exists, update its position
-                if node:
-                    if item.x and item.y and item.z is not None:
-                        node.loc_x, node.loc_y, node.loc_z = item.x, item.y, item.z
-
                 self.update_node_position(item)
             elif isinstance(item, WiredPacket):
-                # If the item is a WiredPacket, generate substeps for the packet_object and add WiredPacketStep objects
-                self.generate_wired_packet_substeps(self.num_steps_wired_packet_animation,
-                                                    item.first_byte_transmission_time,
-                                                    item.first_byte_received_time, updated_node_data[int(item.from_id)],
-                                                    updated_node_data[int(item.to_id)],
-                                                    item.meta_info, True)
-
+                packets.append((self.num_steps_wired_packet_animation, item.first_byte_transmission_time,
+                                item.first_byte_received_time, item.from_id, item.to_id, item.meta_info, True,
+                                sorting_key(item)))
             elif isinstance(item, Broadcaster):
                 broadcaster_transmitted[item.unique_id] = item
             elif isinstance(item, WirelessPacketReception):
-                # If the item is a WirelessPacketReception, do nothing (for now)
-                self.generate_wired_packet_substeps(self.num_steps_wireless_packet_reception,
-                                                    broadcaster_transmitted[
-                                                        item.unique_id].first_byte_transmission_time,
-                                                    item.first_byte_received_time,
-                                                    updated_node_data[
-                                                        int(broadcaster_transmitted[item.unique_id].from_id)],
-                                                    updated_node_data[int(item.to_id)])
-
+                broadcaster = broadcaster_transmitted[item.unique_id]
+                packets.append((self.num_steps_wireless_packet_reception, broadcaster.first_byte_transmission_time,
+                                item.first_byte_received_time, broadcaster.from_id, item.to_id, "", False,
+                                sorting_key(item)))
+
+        # Endpoints of all packets are looked up at once
+        times = [packet[7] for packet in packets]
+        src = node_timeline.positions_at([packet[3] for packet in packets], times)
+        dst = node_timeline.positions_at([packet[4] for packet in packets], times)
+        for (num_steps, start_time, end_time, from_id, to_id, meta_info, is_wired, _), source, destination in zip(
+                packets, src.tolist(), dst.tolist()):
+            if to_id not in node_timeline:
+                to_id, destination = -1, None
+            self.generate_wired_packet_substeps(num_steps, start_time, end_time, from_id, to_id, source, destination,
+                                                meta_info, is_wired)
+        return self.sorted_substeps()
+
+    def sorted_substeps(self):
         # Combine all substeps for each step type and sort them by time
         all_substeps = []
         for step_type_list in self.substeps.values():
@@ -189,48 +358,17 @@ class StepProcessor(QThread):
             # Delay for the duration of a step
             time.sleep(step_duration.total_seconds())
 
-    def generate_wired_packet_substeps(self, num_steps, start_time,
-                                       end_time, from_node, to_node, meta_info="",
-                                       is_wired=False):
-        if to_node is None:
-            to_id = -1
-        else:
-            to_id = to_node.id
+    def generate_wired_packet_substeps(self, num_steps, start_time, end_time, from_id, to_id, src, dst,
+                                       meta_info="", is_wired=False):
+        """Generates substeps of a packet between src and dst positions, dst is None when to_id is -1."""
         # Generate a unique packet_object ID
         packet_id = uuid.uuid4()
 
-        # Calculate the total time difference between transmission and reception
-        time_difference = float(end_time) - float(start_time)
-
         # Loop through the number of steps specified
         for step in range(num_steps):
-            # Calculate the time step based on the transmission and reception times
-            time_step = float(start_time) + (
-                    step * time_difference / (num_steps - 1))
-
-            # Get the source and destination node coordinates at the current time step
-            src_x, src_y, src_z = (from_node.loc_x, from_node.loc_y, from_node.loc_z)
-
-            if to_node is None:
-                drop_packet_constant = (5 * step)
-                dst_x, dst_y, dst_z = (src_x + drop_packet_constant, src_y + drop_packet_constant, src_z + drop_packet_constant)
-            else:
-                dst_x, dst_y, dst_z = (to_node.loc_x, to_node.loc_y, to_node.loc_z)
-
-            # Interpolate the 3D coordinates between the source and destination nodes
-            x, y, z = interpolate_coordinates_3D((float(src_x), float(src_y), float(src_z)),
-                                                 (float(dst_x), float(dst_y), float(dst_z)), step, num_steps)
-
-            if is_wired:
-                # Create a WiredPacketStep object for this substep
-                data = WiredPacketStep(time_step, packet_id, from_node.id, to_id,
-                                       float(start_time), float(end_time),
-                                       meta_info, step, x, y, z)
-            else:
-                # Create a WiredPacketStep object for this substep
-                data = WirelessPacketReceptionStep(time_step, packet_id, from_node.id, to_id,
-                                                   float(start_time), float(end_time),
-                                                   step, x, y, z, meta_info)
+            # Interpolate the time and the 3D coordinates between the source and destination nodes
+            data = packet_substep(is_wired, num_steps, step, packet_id, from_id, to_id, start_time, end_time,
+                                  meta_info, src, dst)
 
             # Append the WiredPacketStep object to the list of substeps
             if data.from_id != data.to_id and is_wired:
@@ -238,20 +376,59 @@ class StepProcessor(QThread):
             elif data.from_id != data.to_id:
                 self.substeps[StepType.WIRELESS_PACKET_RECEPTION].append(data)
 
+    def add_packet_row(self, packet):
+        """Same as generate_wired_packet_substeps, only the packet is kept until save_packet_rows (see packet_row)."""
+        row = packet_row(packet, self.node_timeline)
+        if row is None:
+            return
+        self.packet_rows.append(row)
+        self.packet_rows_length += row_length(row, self.packet_steps(), self.interpolate_packets)
+
+    def save_packet_rows(self):
+        if not self.packet_rows:
+            return
+        save_packet_rows(self.packet_rows, self.node_timeline, self.packet_steps(), self.interpolate_packets)
+        self.packet_rows = []
+        self.packet_rows_length = 0
+
+    def publish_committed_steps(self, last_event):
+        """
+        Emits the number of steps before the watermark after the steps of last_event were committed.
+
+        Events are processed in the order of their time (reception time of packets), so substeps of the remaining
+        packets start at least the longest packet duration before the time of last_event, never earlier.
+        """
+        if not self.progressive:
+            return
+        event_time = last_event.time if isinstance(last_event, NodeUpdate) else last_event.first_byte_received_time
+        self.steps_committed.emit(count_steps_before(event_time - self.longest_event_duration, self.packet_steps()))
+
+    def output_settings(self):
+        """Settings changing the processed steps, they identify the steps of a trace in DatabaseCatalog."""
+        settings = {'interpolate_packets': self.interpolate_packets}
+        if not self.interpolate_packets:
+            settings['num_steps_wired_packet_animation'] = self.num_steps_wired_packet_animation
+            settings['num_steps_wireless_packet_reception'] = self.num_steps_wireless_packet_reception
+        return settings
+
+    def packet_steps(self):
+        """Step type -> number of substeps of its packets."""
+        return {1: self.num_steps_wired_packet_animation, 3: self.num_steps_wireless_packet_reception}
+
     def update_node_position(self, item):
         """
-        Updates the position of a node_object in updated_node_data and adds a NodeUpdateStep to the substeps.
+        Adds a NodeUpdateStep to the substeps, positions of the nodes are kept in the NodeTimeline of
+        generate_substeps.
 
         Args:
         - item: an object representing the updated node_object position
-        - updated_node_data: a dictionary containing updated node_object data
 
         Returns:
         - None
         """
 
         # Create a NodeUpdateStep object for this update
-        node_update = NodeUpdateStep(time=float(item.time), update_type=NodeUpdateType[item.p.upper()], node_id=item.id,
+        node_update = NodeUpdateStep(time=item.time, update_type=NodeUpdateType[item.p.upper()], node_id=item.id,
                                      red=item.r, green=item.g, blue=item.b,
                                      width=item.w, height=item.h,
                                      loc_x=item.x, loc_y=item.y, loc_z=item.z, description=item.descr)
@@ -261,7 +438,8 @@ class StepProcessor(QThread):
 
     def update_constants(self, batch_size, database_batch_size, num_steps_wired_packet_animation,
                          num_steps_broadcast_transmission,
-                         num_steps_wireless_packet_reception, radius_constant, end_time_constant, optimized_parser):
+                         num_steps_wireless_packet_reception, radius_constant, end_time_constant, optimized_parser,
+                         interpolate_packets=False, progressive=False, workers=1):
         self.batch_size = batch_size
         self.database_batch_size = database_batch_size
         self.num_steps_wired_packet_animation = num_steps_wired_packet_animation
@@ -270,12 +448,20 @@ class StepProcessor(QThread):
         self.radius_constant = radius_constant
         self.end_time_constant = end_time_constant
         self.optimized_parser = optimized_parser
+        self.interpolate_packets = interpolate_packets
+        self.progressive = progressive
+        self.workers = workers
 
     def process_node_update(self):
         self.bottom_dock_widget.log("Process of nodes update started.")
         insert_node_updates_to_steps()
         self.bottom_dock_widget.log("Process of node update ended.")
 
+    def order_steps(self):
+        self.bottom_dock_widget.log("Ordering of steps by time started.")
+        order_steps()
+        self.bottom_dock_widget.log("Ordering of steps by time ended.")
+
     def update_wireless_packet_reception(self):
         self.bottom_dock_widget.log("Process of updating wireless packet reception started.")
         update_wireless_packet_reception_fb_tx()
@@ -283,78 +469,130 @@ class StepProcessor(QThread):
 
 
     def process_data(self, data):
+        # Node updates are in node_timeline, positions of the packets are resolved when they are saved
         match data:
-            case NodeUpdate():
-                if data.p == 'p':
-                    self.node_dict.get(data.id).set_coordinates(data.x, data.y, data.z)
-            case WiredPacket():
-                self.generate_wired_packet_substeps(self.num_steps_wired_packet_animation,
-                                                    data.first_byte_transmission_time, data.first_byte_received_time,
-                                                    self.node_dict.get(data.from_id), self.node_dict.get(data.to_id),
-                                                    data.meta_info, True)
-            case WirelessPacketReception():
-                self.generate_wired_packet_substeps(self.num_steps_wireless_packet_reception,
-                                                    data.first_byte_transmission_time,
-                                                    data.first_byte_received_time, self.node_dict.get(data.from_id),
-                                                    self.node_dict.get(data.to_id), data.meta_info)
+            case WiredPacket() | WirelessPacketReception():
+                self.add_packet_row(data)
+
 
+    def start_following(self):
+        # Steps tables are created with the first appended elements, once the parser cleared the followed database
+        self.following_steps_created = False
+        self.node_timeline = NodeTimeline()
+        self.broadcasts = BroadcastJoin()
+        self.packet_rows = []
+        self.packet_rows_length = 0
+
+    def process_appended_elements(self, items):
+        """
+        Generates steps only for elements appended to a followed file and adds them to the steps table.
+
+        Called in the parser thread after the elements are saved. Node positions and recent broadcasts are kept
+        from previous calls, so earlier content is not read again.
+        """
+        if not self.following_steps_created:
+            clear_steps(self.interpolate_packets)
+            self.following_steps_created = True
+        node_updates = []
+        for item in items:
+            match item:
+                case Node():
+                    self.node_timeline.add_nodes([(item.id, item.loc_x, item.loc_y, item.loc_z)])
+                case NodeUpdate():
+                    node_updates.append(item)
+                case WiredPacket():
+                    self.process_data(item)
+                case Broadcaster():
+                    self.broadcasts.add([item])
+                case WirelessPacketReception():
+                    if complete_reception(item, self.broadcasts):
+                        self.process_data(item)
+
+        if node_updates:
+            insert_node_update_steps(node_updates)
+            self.node_timeline.add_updates((item.time, item.id, item.x, item.y, item.z)
+                                           for item in node_updates if item.p == 'p')
+        self.save_packet_rows()
+        self.steps_appended.emit(get_animation_length(self.packet_steps()))
 
     def process_optimised_data(self):
-        self.node_dict = {node.id: node for node in get_all_nodes()}
+        self.node_timeline = NodeTimeline.from_rows(((node.id, node.loc_x, node.loc_y, node.loc_z)
+                                                     for node in get_all_nodes()), get_node_position_updates())
         length = get_data_length()
-        offset = 0
+        if self.progressive:
+            self.longest_event_duration = get_longest_event_duration()
+        if self.workers > 1:
+            self.process_partitions()
+            return
 
-        # Initialize substeps dictionary
-        substeps = {
-            StepType.WIRED_PACKET: [],
-            StepType.WIRELESS_PACKET_RECEPTION: []
-        }
         t1_start = time.perf_counter()
-        while offset < length:
-            merged_data = get_data(offset, self.batch_size)
-            data_length = len(merged_data)
-
-            substeps_length = 0
-
-            for idx, data in enumerate(tqdm(merged_data, total=data_length)):
-                self.process_data(data)
-                time_elapsed = float(time.perf_counter() - t1_start)
+        # Events of all tables are read once, merged in time order
+        for idx, data in enumerate(tqdm(merge_events(self.batch_size), total=length)):
+            self.process_data(data)
+            # Save packets (or their substeps) to the database when the desired length is reached
+            if self.packet_rows_length >= self.batch_size:
+                self.save_packet_rows()
+                self.publish_committed_steps(data)
+            time_elapsed = float(time.perf_counter() - t1_start)
 
-                self.update_status.emit(offset + idx + 1, length, time_elapsed, "Step processing:")
+            self.update_status.emit(idx + 1, length, time_elapsed, "Step processing:")
 
-                # Check if any substeps were generated during the processing
-                for step_type in substeps:
-                    substeps[step_type].extend(self.substeps[step_type])
-                    substeps_length += len(self.substeps[step_type])
-                    self.substeps[step_type] = []
+        # Save any remaining data to the database
+        self.save_packet_rows()
 
-                # Save data to the database and clear the list when the desired length is reached
-                if substeps_length >= self.batch_size:
-                    for step_type in substeps:
-                        if len(substeps[step_type]) != 0:
-                            insert_steps_to_database(substeps[step_type],
-                                                     1 if step_type == StepType.WIRED_PACKET else 3, self.database_batch_size)
-                            substeps[step_type] = []
-                    substeps_length = 0
+        self.bottom_dock_widget.log("Processing finished.")
 
-            # Update the offset
-            offset += data_length
+    def process_partitions(self):
+        """
+        Generates steps of packets cut into parts by their reception time in worker processes, one database file
+        per part, and appends the files in time order.
+        """
+        cuts = get_packet_time_cuts(self.workers)
+        bounds = [float('-inf'), *cuts, float('inf')]
+        time_ranges = list(zip(bounds[:-1], bounds[1:]))
+        partition_paths = [f"{get_database_path()}.part{index}" for index in range(len(time_ranges))]
+        self.bottom_dock_widget.log(f"Processing {len(time_ranges)} parts of steps on {self.workers} workers.")
 
-        # Save any remaining data to the database
-        for step_type in substeps:
-            if len(substeps[step_type]) != 0:
-                insert_steps_to_database(substeps[step_type], 1 if step_type == StepType.WIRED_PACKET else 3, self.database_batch_size)
+        t1_start = time.perf_counter()
+        try:
+            for path in partition_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            # Workers open the database themselves, they do not inherit connections of this process
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(generate_partition, get_elements_path(), path, time_range,
+                                           self.node_timeline.nodes_at(time_range[0]), self.packet_steps(),
+                                           self.interpolate_packets, self.batch_size)
+                           for path, time_range in zip(partition_paths, time_ranges)]
+                for index, future in enumerate(futures):
+                    future.result()
+                    self.update_status.emit(index + 1, 2 * len(futures), time.perf_counter() - t1_start,
+                                            "Step processing:")
+
+            for index, (path, (_, end_time)) in enumerate(zip(partition_paths, time_ranges)):
+                append_partition_steps(path)
+                os.remove(path)
+                if self.progressive:
+                    self.steps_committed.emit(count_steps_before(end_time - self.longest_event_duration,
+                                                                 self.packet_steps()))
+                self.update_status.emit(len(futures) + index + 1, 2 * len(futures), time.perf_counter() - t1_start,
+                                        "Step processing:")
+        finally:
+            for path in partition_paths:
+                if os.path.exists(path):
+                    os.remove(path)
 
         self.bottom_dock_widget.log("Processing finished.")
 
 
 def sorting_key(x):
     if hasattr(x, 'time') and x.time is not None:
-        return float(x.time)
+        return x.time
     elif hasattr(x, 'first_byte_transmission_time') and x.first_byte_transmission_time is not None:
-        return float(x.first_byte_transmission_time)
+        return x.first_byte_transmission_time
     elif x.first_byte_received_time is not None:
-        return float(x.first_byte_received_time)
+        return x.first_byte_received_time
     else:
         return 0
 
@@ -1,7 +1,17 @@
+import bz2
+import gzip
 import json
+import lzma
 
 import xmltodict
 
+# Compressed traces are decompressed while they are read, without temporary file
+compressed_file_openers = {
+    'gz': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
 
 def xml_convert_to_json(path):
     with open(path) as xml_file:
@@ -16,3 +26,22 @@ def get_file_extension(filename):
 
 def get_file_name(filename):
     return filename.rsplit('.', 1)[0]
+
+
+def get_compression(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return extension if extension in compressed_file_openers else None
+
+
+def strip_compression(filename):
+    return get_file_name(filename) if get_compression(filename) else filename
+
+
+def open_trace(path, mode='rb'):
+    """Opens plain or compressed (.gz, .bz2, .xz) trace, mode is 'rb' or 'r' for text."""
+    compression = get_compression(path)
+    if compression is None:
+        return open(path, mode)
+    if mode == 'r':
+        mode = 'rt'
+    return compressed_file_openers[compression](path, mode)
@@ -1,4 +1,9 @@
+from network_elements.trace import ColumnarTrace
+
+
 def get_objects_by_type(objects, object_type):
+    if isinstance(objects, ColumnarTrace):
+        return objects.get_objects(object_type)
     return [item for item in objects if isinstance(item, object_type)]
 
 
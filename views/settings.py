@@ -13,6 +13,7 @@ class SettingsView(QFrame):
         super(SettingsView, self).__init__(parent)
 
         self.parser_batch_size_callback = None
+        self.parser_queue_depth_callback = None
         self.processor_settings_callback = None
         self.animation_api_callback = None
         self.parser_change_callback = None
@@ -21,7 +22,9 @@ class SettingsView(QFrame):
         layout.addWidget(QLabel("Settings view"))
 
         # Create the checkbox with a label
-        self.use_optimized_parser = QCheckBox("Use database (Needs to be checked when using ElementTreeXmlParser)")
+        self.use_optimized_parser = QCheckBox("Use database (Needs to be checked when using ElementTreeXmlParser, "
+                                              "ParallelElementTreeXmlParser, LineTokenizerXmlParser or "
+                                              "StreamingJsonParser)")
 
         # Add the checkbox to the layout
         layout.addWidget(self.use_optimized_parser)
@@ -29,11 +32,19 @@ class SettingsView(QFrame):
         # Create the combo box
         self.select_field = QComboBox()
         self.select_field.addItem("ElementTreeXmlParser")
+        self.select_field.addItem("ParallelElementTreeXmlParser")
+        self.select_field.addItem("LineTokenizerXmlParser")
         self.select_field.addItem("DomXmlParser")
 
         # Add the combo box to the layout
         layout.addWidget(self.select_field)
 
+        # Create the combo box for json parsers
+        self.json_select_field = QComboBox()
+        self.json_select_field.addItem("JsonParser")
+        self.json_select_field.addItem("StreamingJsonParser")
+        layout.addWidget(self.json_select_field)
+
         self.parser_batch_size_label = QLabel("Batch size for parser:")
         self.parser_batch_size_spinbox = QSpinBox()
         self.parser_batch_size_spinbox.setMinimum(1)
@@ -42,6 +53,14 @@ class SettingsView(QFrame):
         layout.addWidget(self.parser_batch_size_label)
         layout.addWidget(self.parser_batch_size_spinbox)
 
+        self.parser_queue_depth_label = QLabel("Maximum parsed batches waiting for database:")
+        self.parser_queue_depth_spinbox = QSpinBox()
+        self.parser_queue_depth_spinbox.setMinimum(1)
+        self.parser_queue_depth_spinbox.setMaximum(1000)
+        self.parser_queue_depth_spinbox.setValue(4)
+        layout.addWidget(self.parser_queue_depth_label)
+        layout.addWidget(self.parser_queue_depth_spinbox)
+
         self.processor_batch_size_label = QLabel("Batch size for processing:")
         self.processor_batch_size_spinbox = QSpinBox()
         self.processor_batch_size_spinbox.setMinimum(1)
@@ -82,6 +101,21 @@ class SettingsView(QFrame):
         layout.addWidget(self.wireless_packet_label)
         layout.addWidget(self.wireless_packet_spinbox)
 
+        self.interpolate_packets = QCheckBox("Store one database row per packet (packet steps are interpolated during "
+                                             "animation, steps per packet can be changed without processing again)")
+        layout.addWidget(self.interpolate_packets)
+
+        self.progressive_playback = QCheckBox("Play steps while they are processed (database is read during writes)")
+        layout.addWidget(self.progressive_playback)
+
+        self.processor_workers_label = QLabel("Processes generating steps (1 generates them in one thread):")
+        self.processor_workers_spinbox = QSpinBox()
+        self.processor_workers_spinbox.setMinimum(1)
+        self.processor_workers_spinbox.setMaximum(256)
+        self.processor_workers_spinbox.setValue(1)
+        layout.addWidget(self.processor_workers_label)
+        layout.addWidget(self.processor_workers_spinbox)
+
         self.num_steps_broadcast_transmission_label = QLabel("Steps per wireless transmission animation:")
         self.num_steps_broadcast_transmission_spinbox = QSpinBox()
         self.num_steps_broadcast_transmission_spinbox.setMinimum(2)
@@ -118,7 +152,9 @@ class SettingsView(QFrame):
         self.processor_settings_callback(
             self.processor_batch_size_spinbox.value(), self.processor_database_batch_size_spinbox.value(), self.wired_packet_spinbox.value(),
             self.num_steps_broadcast_transmission_spinbox.value(), self.wireless_packet_spinbox.value(),
-            self.radius_constant_spinbox.value(), self.end_time_constant_spinbox.value(), self.use_optimized_parser.isChecked()
+            self.radius_constant_spinbox.value(), self.end_time_constant_spinbox.value(), self.use_optimized_parser.isChecked(),
+            self.interpolate_packets.isChecked(), self.progressive_playback.isChecked(),
+            self.processor_workers_spinbox.value()
         )
         self.animation_api_callback(
             self.wired_packet_spinbox.value(),
@@ -129,7 +165,9 @@ class SettingsView(QFrame):
 
         )
         self.parser_change_callback("xml", self.select_field.currentText())
+        self.parser_change_callback("json", self.json_select_field.currentText())
         self.parser_batch_size_callback(self.parser_batch_size_spinbox.value())
+        self.parser_queue_depth_callback(self.parser_queue_depth_spinbox.value())
         self.bottom_dock_widget.log("Settings were saved.")
 
     def set_processor_settings_callback(self, callback):
@@ -143,3 +181,6 @@ class SettingsView(QFrame):
 
     def set_parser_batch_size_callback(self, callback):
         self.parser_batch_size_callback = callback
+
+    def set_parser_queue_depth_callback(self, callback):
+        self.parser_queue_depth_callback = callback